@@ -0,0 +1,128 @@
+import operator
+import typing as t
+
+import numpy as np
+import pandas as pd
+
+from risc_tool.data.models.enums import ComparisonOperation
+
+# Side of the sorted values a threshold is inserted at, and the comparison itself
+_COUNT_SIDES: dict[
+    ComparisonOperation, tuple[t.Literal["left", "right"], t.Callable]
+] = {
+    ComparisonOperation.GT: ("right", operator.gt),
+    ComparisonOperation.GE: ("left", operator.ge),
+    ComparisonOperation.LT: ("left", operator.lt),
+    ComparisonOperation.LE: ("right", operator.le),
+}
+
+
+class ColumnSummary:
+    """
+    The sorted non-missing values and the mode of a numeric column, computed once
+    and shared by everything that needs order statistics of the column (outlier
+    rules in particular). Any quantile is then a lookup of two values, with or
+    without the values equal to the mode, instead of a pass over the column.
+
+    Quantiles use the linear interpolation of `pd.Series.quantile`. Quantiles and
+    counts of values beyond thresholds are vectorised, so that e.g. every
+    percentile option of an outlier rule is resolved in one call.
+    """
+
+    def __init__(self, column: pd.Series):
+        self.name: str = str(column.name)
+        self.is_integer: bool = pd.api.types.is_integer_dtype(column.dtype)
+        self.sorted_values: np.ndarray = np.sort(
+            column.to_numpy(dtype="float64", na_value=np.nan)
+        )
+
+        # Missing values are sorted to the end
+        self.sorted_values = self.sorted_values[
+            : np.searchsorted(self.sorted_values, np.nan)
+        ]
+
+        if len(self.sorted_values) == 0:
+            raise ValueError(f"Column `{self.name}` has no values.")
+
+        # The most frequent value, the smallest one on ties (as `pd.Series.mode`)
+        values, starts, counts = np.unique(
+            self.sorted_values, return_index=True, return_counts=True
+        )
+        most_frequent = int(np.argmax(counts))
+
+        self.__mode: float = float(values[most_frequent])
+        self.__mode_start: int = int(starts[most_frequent])
+        self.__mode_count: int = int(counts[most_frequent])
+
+    def __len__(self) -> int:
+        return len(self.sorted_values)
+
+    @property
+    def mode(self) -> int | float:
+        return int(self.__mode) if self.is_integer else self.__mode
+
+    def __values_at(self, positions: np.ndarray, exclude_mode: bool) -> np.ndarray:
+        if exclude_mode:
+            positions = np.where(
+                positions >= self.__mode_start, positions + self.__mode_count, positions
+            )
+
+        return self.sorted_values[positions]
+
+    def quantiles(
+        self, qs: t.Sequence[float], exclude_mode: bool = False
+    ) -> np.ndarray:
+        """The `qs` quantiles of the values, optionally leaving out the mode."""
+
+        qs = np.asarray(qs, dtype="float64")
+        n_values = len(self) - (self.__mode_count if exclude_mode else 0)
+
+        if n_values == 0:
+            return np.full(len(qs), np.nan)
+
+        # Same virtual index and interpolation as `np.percentile(..., "linear")`
+        virtual_index = qs * (n_values - 1)
+        lower = np.minimum(np.floor(virtual_index).astype(np.int64), n_values - 1)
+        upper = np.minimum(lower + 1, n_values - 1)
+        fraction = virtual_index - lower
+
+        lower_value = self.__values_at(lower, exclude_mode)
+        upper_value = self.__values_at(upper, exclude_mode)
+        difference = upper_value - lower_value
+
+        return np.where(
+            fraction >= 0.5,
+            upper_value - difference * (1 - fraction),
+            lower_value + difference * fraction,
+        )
+
+    def quantile(self, q: float, exclude_mode: bool = False) -> float:
+        return float(self.quantiles([q], exclude_mode)[0])
+
+    def count(
+        self,
+        comparison_op: ComparisonOperation,
+        thresholds: t.Sequence[float],
+        exclude_mode: bool = False,
+    ) -> np.ndarray:
+        """
+        Number of values `<comparison_op>` each of `thresholds`, optionally leaving
+        out the mode. Missing thresholds match no value.
+        """
+
+        thresholds = np.asarray(thresholds, dtype="float64")
+        side, compare = _COUNT_SIDES[comparison_op]
+        below = np.searchsorted(self.sorted_values, thresholds, side=side)
+
+        if comparison_op in (ComparisonOperation.GT, ComparisonOperation.GE):
+            counts = len(self) - below
+        else:
+            counts = below
+
+        if exclude_mode:
+            counts -= np.where(compare(self.__mode, thresholds), self.__mode_count, 0)
+
+        return np.where(np.isnan(thresholds), 0, counts)
+
+
+__all__ = ["ColumnSummary"]
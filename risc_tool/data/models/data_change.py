@@ -0,0 +1,51 @@
+import typing as t
+
+from risc_tool.data.models.enums import DataChangeType
+from risc_tool.data.models.types import DataSourceID
+
+
+class DataChange:
+    """
+    Describes what a `DataRepository` notification changed: the data sources
+    whose rows changed and the columns affected in them (`None` for all).
+    Subscribers use it to recompute only what depends on the change.
+    """
+
+    def __init__(
+        self,
+        change_type: DataChangeType,
+        data_source_ids: t.Iterable[DataSourceID],
+        columns: t.Iterable[str] | None = None,
+    ):
+        self.change_type: DataChangeType = change_type
+        self.data_source_ids: frozenset[DataSourceID] = frozenset(data_source_ids)
+
+        if change_type == DataChangeType.RELABELED:
+            # Only the metadata of the sources changed, no values
+            columns = ()
+
+        self.columns: frozenset[str] | None = (
+            None if columns is None else frozenset(columns)
+        )
+
+    def touches(self, columns: t.Iterable[str]) -> bool:
+        """Whether values of any of `columns` may have changed."""
+
+        if self.change_type in (DataChangeType.ADDED, DataChangeType.REMOVED):
+            # The rows of the source appear or disappear in every column
+            return True
+
+        if self.columns is None:
+            return True
+
+        return not self.columns.isdisjoint(columns)
+
+    def __repr__(self) -> str:
+        return (
+            f"DataChange({self.change_type}, "
+            f"data_source_ids={sorted(self.data_source_ids)}, "
+            f"columns={None if self.columns is None else sorted(self.columns)})"
+        )
+
+
+__all__ = ["DataChange"]
@@ -63,4 +63,5 @@ class DefaultOptions(Singleton):
             current_filter_ids=[],
             show_prev_iter_details=True,
             remove_outliers=True,
+            confidence_intervals=False,
         )
@@ -162,12 +162,24 @@ class SummaryPageTabName(StrEnum, metaclass=StrEnumMeta):
     PIVOT = "Pivot"
 
 
+class PivotDimension(StrEnum, metaclass=StrEnumMeta):
+    RISK_SEGMENT = RSDetCol.RISK_SEGMENT
+    DATA_SOURCE = "Data Source"
+
+
 class ExportTabName(StrEnum, metaclass=StrEnumMeta):
     SESSION_ARCHIVE = "Session Archive"
     PYTHON_CODE = "Python Code"
     SAS_CODE = "SAS Code"
 
 
+class DataChangeType(StrEnum):
+    ADDED = "ADDED"
+    MODIFIED = "MODIFIED"
+    REMOVED = "REMOVED"
+    RELABELED = "RELABELED"
+
+
 class Signature(StrEnum):
     # base
     CHANGE_TRACKER = "CHANGE_TRACKER"
@@ -196,6 +208,7 @@ class Signature(StrEnum):
 
 
 __all__ = [
+    "DataChangeType",
     "DefaultMetricNames",
     "GridColumn",
     "IterationType",
@@ -205,6 +218,7 @@ __all__ = [
     "VariableType",
     "ScalarTableColumn",
     "DataExplorerTabName",
+    "PivotDimension",
     "RowIndex",
     "Signature",
 ]
@@ -4,9 +4,18 @@ import typing as t
 
 import pandas as pd
 
+from risc_tool.data.models.column_summary import ColumnSummary
 from risc_tool.data.models.exceptions import InvalidFilterError
+from risc_tool.data.models.filter_kernel import UnsupportedFilterExpression
+from risc_tool.data.models.filter_plan import (
+    FilterPlan,
+    PredicateCache,
+    compile_plan,
+)
 from risc_tool.data.models.json_models import FilterJSON
+from risc_tool.data.models.packed_mask import PackedMask
 from risc_tool.data.models.types import FilterID
+from risc_tool.data.models.zone_map import ZoneMap
 
 
 class FilterQueryValidator(ast.NodeVisitor):
@@ -67,12 +76,19 @@ class Filter:
         self.name: str = name
         self.query: str = query
         self.used_columns: list[str] = []
-        self.mask: pd.Series | None = None
+        self.mask: PackedMask | None = None
+        self.plan: FilterPlan | None = None
 
     @property
     def pretty_name(self):
         return self.name
 
+    @property
+    def is_row_wise(self) -> bool:
+        """Whether the mask of a subset of the rows can be evaluated on its own."""
+
+        return self.plan is not None and self.plan.is_row_wise
+
     def to_dict(self) -> FilterJSON:
         """
         Converts the Filter instance to a dictionary.
@@ -86,7 +102,9 @@ class Filter:
         )
 
     @classmethod
-    def from_dict(cls, data: FilterJSON, variable: pd.Series | None = None) -> "Filter":
+    def from_dict(
+        cls, data: FilterJSON, summary: ColumnSummary | None = None
+    ) -> "Filter":
         """
         Creates a Filter instance from a dictionary.
         Validates the input type and restores the object.
@@ -179,6 +197,9 @@ class Filter:
         finder.visit(expr_node)
         self.used_columns = sorted(list(finder.found_columns))
 
+        # Compiled once, so that masks can be rebuilt without `DataFrame.eval`.
+        self.plan = compile_plan(processed_expression, backticked_map)
+
         # --- 5. Optionally Check Against List of Available Columns ---
         if available_columns is not None:
             available_set = set(available_columns)
@@ -190,14 +211,26 @@ class Filter:
                     f"Following columns are not found in the data: {', '.join(missing_columns)}",
                 )
 
-    def create_mask(
-        self, data: pd.DataFrame, fillna: bool = False, na_value: t.Any = None
-    ) -> None:
-        # if self.mask is not None:
-        #     return
+    def evaluate(
+        self,
+        data: pd.DataFrame,
+        predicate_cache: PredicateCache | None = None,
+        zone_maps: dict[str, ZoneMap] | None = None,
+    ) -> pd.Series:
+        """Evaluates the query on `data`, without storing the result as the mask."""
+
+        mask = None
 
-        data_copy = data.copy()
-        mask = data_copy.eval(self.query.replace("\n", " "), inplace=False)
+        if self.plan is not None:
+            try:
+                mask = self.plan.evaluate(data, predicate_cache, zone_maps)
+            except (UnsupportedFilterExpression, KeyError, TypeError, ValueError):
+                # The whole query is evaluated again below, which reports the error
+                mask = None
+
+        if mask is None:
+            data_copy = data.copy()
+            mask = data_copy.eval(self.query.replace("\n", " "), inplace=False)
 
         if isinstance(mask, pd.DataFrame) and mask.shape[1] == 1:
             # Converting dataframe with a single column to a series
@@ -218,10 +251,25 @@ class Filter:
                 f"Length Mismatch: len(mask) != len(data) ({len(mask)} != {len(data)}). The query is not applicable to the data."
             )
 
+        return mask
+
+    def create_mask(
+        self,
+        data: pd.DataFrame,
+        fillna: bool = False,
+        na_value: t.Any = None,
+        predicate_cache: PredicateCache | None = None,
+        zone_maps: dict[str, ZoneMap] | None = None,
+    ) -> None:
+        # if self.mask is not None:
+        #     return
+
+        mask = self.evaluate(data, predicate_cache, zone_maps)
+
         if fillna:
             mask = mask.fillna(na_value)
 
-        self.mask = mask
+        self.mask = PackedMask.from_series(mask)
 
     def duplicate(self, uid: FilterID | None = None, name: str | None = None):
         if uid is None:
@@ -236,7 +284,9 @@ class Filter:
         )
 
         new_instance.used_columns = self.used_columns.copy()
-        new_instance.mask = self.mask.copy() if self.mask is not None else None
+        # Packed masks are never modified in place, so copies can share them.
+        new_instance.mask = self.mask
+        new_instance.plan = self.plan
 
         return new_instance
 
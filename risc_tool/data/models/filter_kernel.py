@@ -0,0 +1,420 @@
+import ast
+import io
+import operator
+import tokenize
+import typing as t
+
+import numpy as np
+import pandas as pd
+
+# Values of an expression, with the mask of its missing values if the expression
+# involves a nullable column (pandas then returns a nullable `boolean` result).
+MaskedValues = tuple[t.Any, np.ndarray | None]
+
+
+class UnsupportedFilterExpression(Exception):
+    """Raised when a filter expression can not be compiled into a kernel."""
+
+
+class _Columns:
+    """Reads each used column once per evaluation, without copying the frame."""
+
+    def __init__(self, data: pd.DataFrame):
+        self.data = data
+        self.__cache: dict[str, MaskedValues] = {}
+
+    def series(self, column: str) -> pd.Series:
+        return self.data[column]
+
+    def __getitem__(self, column: str) -> MaskedValues:
+        if column not in self.__cache:
+            self.__cache[column] = _column_values(self.data[column])
+
+        return self.__cache[column]
+
+
+def _column_values(series: pd.Series) -> MaskedValues:
+    dtype = series.dtype
+
+    if not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        # Dates and the like are compared to strings differently by pandas.
+        if dtype.kind not in "biufO":
+            raise UnsupportedFilterExpression(f"Unsupported column type: {dtype}")
+
+        return series.to_numpy(), None
+
+    mask = series.isna().to_numpy(dtype=bool)
+
+    if pd.api.types.is_bool_dtype(dtype):
+        return series.to_numpy(dtype=bool, na_value=False), mask
+
+    if pd.api.types.is_integer_dtype(dtype):
+        return series.to_numpy(dtype="int64", na_value=0), mask
+
+    if pd.api.types.is_float_dtype(dtype):
+        return series.to_numpy(dtype="float64", na_value=0.0), mask
+
+    if pd.api.types.is_string_dtype(dtype):
+        return series.to_numpy(dtype=object, na_value=""), mask
+
+    raise UnsupportedFilterExpression(f"Unsupported column type: {dtype}")
+
+
+def _union(*masks: np.ndarray | None) -> np.ndarray | None:
+    present = [mask for mask in masks if mask is not None]
+
+    if not present:
+        return None
+
+    return np.logical_or.reduce(present) if len(present) > 1 else present[0]
+
+
+def _as_bool(values: t.Any) -> np.ndarray:
+    values = np.asarray(values)
+
+    if values.dtype != bool:
+        raise UnsupportedFilterExpression("Logical operands must be boolean.")
+
+    return values
+
+
+def _logical_and(left: MaskedValues, right: MaskedValues) -> MaskedValues:
+    left_values, left_mask = _as_bool(left[0]), left[1]
+    right_values, right_mask = _as_bool(right[0]), right[1]
+
+    if left_mask is None and right_mask is None:
+        return left_values & right_values, None
+
+    # Kleene logic: a known False wins over a missing value.
+    left_false = ~left_values if left_mask is None else ~left_values & ~left_mask
+    right_false = ~right_values if right_mask is None else ~right_values & ~right_mask
+    mask = t.cast(np.ndarray, _union(left_mask, right_mask)) & ~(
+        left_false | right_false
+    )
+
+    return ~(left_false | right_false) & ~mask, mask
+
+
+def _logical_or(left: MaskedValues, right: MaskedValues) -> MaskedValues:
+    left_values, left_mask = _as_bool(left[0]), left[1]
+    right_values, right_mask = _as_bool(right[0]), right[1]
+
+    if left_mask is None and right_mask is None:
+        return left_values | right_values, None
+
+    # Kleene logic: a known True wins over a missing value.
+    left_true = left_values if left_mask is None else left_values & ~left_mask
+    right_true = right_values if right_mask is None else right_values & ~right_mask
+    mask = t.cast(np.ndarray, _union(left_mask, right_mask)) & ~(left_true | right_true)
+
+    return left_true | right_true, mask
+
+
+def _logical_not(operand: MaskedValues) -> MaskedValues:
+    return ~_as_bool(operand[0]), operand[1]
+
+
+_ARITHMETIC_OPERATORS: dict[type[ast.operator], t.Callable] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+_LOGICAL_OPERATORS: dict[type[ast.AST], t.Callable] = {
+    ast.BitAnd: _logical_and,
+    ast.BitOr: _logical_or,
+    ast.And: _logical_and,
+    ast.Or: _logical_or,
+}
+
+_COMPARISON_OPERATORS: dict[type[ast.cmpop], t.Callable] = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+# `a < b` is `b > a`
+FLIPPED_COMPARISONS: dict[type[ast.cmpop], type[ast.cmpop]] = {
+    ast.Lt: ast.Gt,
+    ast.LtE: ast.GtE,
+    ast.Gt: ast.Lt,
+    ast.GtE: ast.LtE,
+    ast.Eq: ast.Eq,
+    ast.NotEq: ast.NotEq,
+}
+
+_MISSING_METHODS = {
+    "isna": False,
+    "isnull": False,
+    "notna": True,
+    "notnull": True,
+}
+
+Kernel = t.Callable[[_Columns], MaskedValues]
+
+
+def _is_text_or_list(node: ast.expr) -> bool:
+    return isinstance(node, (ast.List, ast.Tuple, ast.Set)) or (
+        isinstance(node, ast.Constant) and isinstance(node.value, str)
+    )
+
+
+class FilterKernel:
+    """
+    A validated filter expression compiled into a tree of vectorized NumPy
+    operations, equivalent to `DataFrame.eval` on the subset of the query
+    language it supports: columns, constants, arithmetic, comparisons (also
+    chained), `&`, `|`, `~`, `and`, `or`, `not`, `in` / `not in` with a
+    constant list and `.isna()` / `.notna()`. As in `DataFrame.eval`, `==` and
+    `!=` with text or a list are membership tests.
+
+    Columns are read straight from the frame, once per evaluation; missing values
+    of nullable columns are tracked in a separate mask and combined with Kleene
+    logic, like pandas does.
+    """
+
+    def __init__(self, expression: ast.expr, placeholder_map: dict[str, str]):
+        self.__placeholder_map = placeholder_map
+        self.__kernel: Kernel = self.__compile(expression)
+
+    def __column_name(self, node: ast.expr) -> str:
+        if not isinstance(node, ast.Name) or node.id.startswith("@"):
+            raise UnsupportedFilterExpression(f"Not a column: {ast.dump(node)}")
+
+        return self.__placeholder_map.get(node.id, node.id)
+
+    def __compile(self, node: ast.expr) -> Kernel:
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, (bool, int, float, str)):
+                value = node.value
+                return lambda columns: (value, None)
+
+        elif isinstance(node, ast.Name):
+            column = self.__column_name(node)
+            return lambda columns: columns[column]
+
+        elif isinstance(node, ast.UnaryOp):
+            operand = self.__compile(node.operand)
+
+            if isinstance(node.op, (ast.Not, ast.Invert)):
+                return lambda columns: _logical_not(operand(columns))
+
+            if isinstance(node.op, ast.USub):
+
+                def negative(columns: _Columns) -> MaskedValues:
+                    values, mask = operand(columns)
+                    return -values, mask
+
+                return negative
+
+            if isinstance(node.op, ast.UAdd):
+                return operand
+
+        elif isinstance(node, ast.BoolOp):
+            return self.__compile_logical(type(node.op), node.values)
+
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) in _LOGICAL_OPERATORS:
+                return self.__compile_logical(type(node.op), [node.left, node.right])
+
+            if type(node.op) in _ARITHMETIC_OPERATORS:
+                function = _ARITHMETIC_OPERATORS[type(node.op)]
+                left = self.__compile(node.left)
+                right = self.__compile(node.right)
+
+                def arithmetic(columns: _Columns) -> MaskedValues:
+                    left_values, left_mask = left(columns)
+                    right_values, right_mask = right(columns)
+
+                    if np.asarray(left_values).dtype == object or (
+                        np.asarray(right_values).dtype == object
+                    ):
+                        raise UnsupportedFilterExpression("Arithmetic on text.")
+
+                    return (
+                        function(left_values, right_values),
+                        _union(left_mask, right_mask),
+                    )
+
+                return arithmetic
+
+        elif isinstance(node, ast.Compare):
+            return self.__compile_compare(node)
+
+        elif isinstance(node, ast.Call):
+            return self.__compile_call(node)
+
+        raise UnsupportedFilterExpression(f"Unsupported node: {ast.dump(node)}")
+
+    def __compile_logical(self, op: type[ast.AST], operands: list[ast.expr]) -> Kernel:
+        function = _LOGICAL_OPERATORS[op]
+        kernels = [self.__compile(operand) for operand in operands]
+
+        def logical(columns: _Columns) -> MaskedValues:
+            result = kernels[0](columns)
+
+            for kernel in kernels[1:]:
+                result = function(result, kernel(columns))
+
+            return result
+
+        return logical
+
+    def __compile_membership(
+        self, left: ast.expr, op: ast.cmpop, right: ast.expr
+    ) -> Kernel:
+        column = self.__column_name(left)
+
+        if isinstance(right, ast.Constant) and isinstance(right.value, str):
+            values = [right.value]
+        elif isinstance(right, (ast.List, ast.Tuple, ast.Set)) and all(
+            isinstance(element, ast.Constant) for element in right.elts
+        ):
+            values = [t.cast(ast.Constant, element).value for element in right.elts]
+        else:
+            raise UnsupportedFilterExpression("`in` needs a list of constants.")
+
+        negate = isinstance(op, (ast.NotIn, ast.NotEq))
+
+        # `isin` never yields missing values, but keeps the nullable dtype.
+        def membership(columns: _Columns) -> MaskedValues:
+            result, mask = _column_values(columns.series(column).isin(values))
+            return (~result if negate else result), mask
+
+        return membership
+
+    def __compile_compare(self, node: ast.Compare) -> Kernel:
+        operands = [node.left, *node.comparators]
+        comparisons: list[Kernel] = []
+
+        for op, left, right in zip(node.ops, operands[:-1], operands[1:]):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                comparisons.append(self.__compile_membership(left, op, right))
+                continue
+
+            # Like `DataFrame.eval`, `==` and `!=` with text or a list test membership.
+            if isinstance(op, (ast.Eq, ast.NotEq)) and any(
+                _is_text_or_list(operand) for operand in (left, right)
+            ):
+                if _is_text_or_list(left):
+                    raise UnsupportedFilterExpression("Text on the left hand side.")
+
+                comparisons.append(self.__compile_membership(left, op, right))
+                continue
+
+            if type(op) not in _COMPARISON_OPERATORS:
+                raise UnsupportedFilterExpression(f"Unsupported comparison: {op}")
+
+            function = _COMPARISON_OPERATORS[type(op)]
+            left_kernel = self.__compile(left)
+            right_kernel = self.__compile(right)
+
+            def compare(
+                columns: _Columns,
+                function=function,
+                left_kernel=left_kernel,
+                right_kernel=right_kernel,
+            ) -> MaskedValues:
+                left_values, left_mask = left_kernel(columns)
+                right_values, right_mask = right_kernel(columns)
+
+                # Missing values of object columns are not masked, so pandas
+                # alone knows which pairs of them compare to a missing value
+                if all(
+                    np.ndim(values) and np.asarray(values).dtype == object
+                    for values in (left_values, right_values)
+                ):
+                    raise UnsupportedFilterExpression("Comparison of two text columns.")
+
+                result = np.asarray(function(left_values, right_values))
+                if result.dtype != bool:
+                    raise UnsupportedFilterExpression("Comparison is not elementwise.")
+
+                return result, _union(left_mask, right_mask)
+
+            comparisons.append(compare)
+
+        # `a < b < c` is `(a < b) & (b < c)`.
+        def chain(columns: _Columns) -> MaskedValues:
+            result = comparisons[0](columns)
+
+            for comparison in comparisons[1:]:
+                result = _logical_and(result, comparison(columns))
+
+            return result
+
+        return chain
+
+    def __compile_call(self, node: ast.Call) -> Kernel:
+        if (
+            isinstance(node.func, ast.Attribute)
+            and node.func.attr in _MISSING_METHODS
+            and not node.args
+            and not node.keywords
+        ):
+            column = self.__column_name(node.func.value)
+            present = _MISSING_METHODS[node.func.attr]
+
+            def missing(columns: _Columns) -> MaskedValues:
+                result = columns.series(column).isna().to_numpy(dtype=bool)
+                return (~result if present else result), None
+
+            return missing
+
+        raise UnsupportedFilterExpression(f"Unsupported call: {ast.dump(node)}")
+
+    def evaluate(self, data: pd.DataFrame) -> pd.Series:
+        """
+        Evaluates the expression on the columns of `data`. Raises
+        `UnsupportedFilterExpression` if the result is not boolean or the column
+        types are not supported, in which case `DataFrame.eval` should be used.
+        """
+
+        with np.errstate(all="ignore"):
+            values, mask = self.__kernel(_Columns(data))
+
+        values = np.broadcast_to(np.asarray(values), (len(data),))
+
+        if values.dtype != bool:
+            raise UnsupportedFilterExpression("Result is not boolean.")
+
+        if mask is None:
+            return pd.Series(values.copy(), index=data.index)
+
+        mask = np.broadcast_to(mask, (len(data),))
+
+        return pd.Series(
+            pd.arrays.BooleanArray(values & ~mask, mask.copy()), index=data.index
+        )
+
+
+def parse_expression(expression: str) -> ast.expr:
+    """
+    Parses a filter expression the way `DataFrame.eval` does: `&` and `|` are read
+    as `and` and `or`, so they bind more loosely than comparisons
+    (`a > 1 & b < 2` is `(a > 1) & (b < 2)`).
+    """
+
+    tokens = [
+        (tokenize.NAME, {"&": "and", "|": "or"}[token.string])
+        if token.type == tokenize.OP and token.string in ("&", "|")
+        else (token.type, token.string)
+        for token in tokenize.generate_tokens(io.StringIO(expression).readline)
+    ]
+
+    return ast.parse(tokenize.untokenize(tokens).strip(), mode="eval").body
+
+
+__all__ = [
+    "FLIPPED_COMPARISONS",
+    "FilterKernel",
+    "UnsupportedFilterExpression",
+    "parse_expression",
+]
@@ -0,0 +1,484 @@
+import ast
+import copy
+import re
+import tokenize
+import typing as t
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from risc_tool.data.models.filter_kernel import (
+    FLIPPED_COMPARISONS,
+    FilterKernel,
+    UnsupportedFilterExpression,
+    parse_expression,
+)
+from risc_tool.data.models.packed_mask import PackedMask
+from risc_tool.data.models.zone_map import (
+    ZoneMap,
+    ZonePredicate,
+    compile_zone_predicate,
+)
+
+_PLACEHOLDER_PATTERN = re.compile(r"__BACKTICKED__\d+__")
+
+# Relative cost of an operation evaluated by a kernel or by `DataFrame.eval`; text
+# methods (`.str.contains` and the like) work element by element in Python.
+_KERNEL_COST = 1.0
+_EVAL_COST = 10.0
+_TEXT_METHOD_COST = 50.0
+
+
+def _split_conjuncts(node: ast.expr) -> list[ast.expr]:
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        return [
+            conjunct for value in node.values for conjunct in _split_conjuncts(value)
+        ]
+
+    return [node]
+
+
+def _estimate_cost(node: ast.expr, compiled: bool) -> float:
+    cost = 0.0
+
+    for child in ast.walk(node):
+        if isinstance(child, ast.Attribute) and child.attr == "str":
+            cost += _TEXT_METHOD_COST
+        elif isinstance(child, (ast.Compare, ast.BinOp, ast.UnaryOp, ast.Call)):
+            cost += _KERNEL_COST if compiled else _EVAL_COST
+
+    return max(cost, _KERNEL_COST)
+
+
+# Calls whose result for a row depends on that row only, besides the `.str` methods
+# and the elementwise math functions of `DataFrame.eval` (`abs(x)`, `log(x)`, ...)
+_ROW_WISE_METHODS = {"isna", "isnull", "notna", "notnull"}
+
+
+def _is_str_accessor(node: ast.expr) -> bool:
+    return isinstance(node, ast.Attribute) and node.attr == "str"
+
+
+def _is_row_wise(node: ast.expr) -> bool:
+    """
+    Whether the condition can be evaluated on a subset of the rows. Aggregates
+    such as `x.mean()` or `x.quantile(0.9)` depend on all the rows; any method or
+    attribute not known to be elementwise is assumed to be one.
+    """
+
+    allowed: set[int] = set()
+
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute):
+            if child.func.attr in _ROW_WISE_METHODS or _is_str_accessor(
+                child.func.value
+            ):
+                allowed.update((id(child.func), id(child.func.value)))
+        elif isinstance(child, ast.Subscript) and _is_str_accessor(child.value):
+            allowed.update((id(child), id(child.value)))
+
+    return not any(
+        isinstance(child, (ast.Attribute, ast.Subscript)) and id(child) not in allowed
+        for child in ast.walk(node)
+    )
+
+
+def _as_mask(result: pd.Series | pd.DataFrame, query: str) -> pd.Series:
+    if isinstance(result, pd.DataFrame) and result.shape[1] == 1:
+        result = result.iloc[:, 0]
+
+    if not isinstance(result, pd.Series) or not pd.api.types.is_bool_dtype(result):
+        raise ValueError(f"Invalid query used: {query}. Result is not boolean.")
+
+    return result
+
+
+class _Canonicalizer(ast.NodeTransformer):
+    """
+    Rewrites a condition so that spellings of the same condition compare equal:
+    placeholders become column names, numbers move to the right hand side of
+    comparisons and the operands of `and` / `or` are sorted.
+    """
+
+    def __init__(self, placeholder_map: dict[str, str]):
+        self.placeholder_map = placeholder_map
+
+    def visit_Name(self, node: ast.Name) -> ast.Name:
+        return ast.Name(id=self.placeholder_map.get(node.id, node.id))
+
+    def visit_Compare(self, node: ast.Compare) -> ast.Compare:
+        node = t.cast(ast.Compare, self.generic_visit(node))
+
+        if (
+            len(node.ops) == 1
+            and type(node.ops[0]) in FLIPPED_COMPARISONS
+            and isinstance(node.left, ast.Constant)
+            and isinstance(node.left.value, (int, float))
+            and not isinstance(node.comparators[0], ast.Constant)
+        ):
+            return ast.Compare(
+                left=node.comparators[0],
+                ops=[FLIPPED_COMPARISONS[type(node.ops[0])]()],
+                comparators=[node.left],
+            )
+
+        return node
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> ast.BoolOp:
+        node = t.cast(ast.BoolOp, self.generic_visit(node))
+
+        return ast.BoolOp(op=node.op, values=sorted(node.values, key=ast.dump))
+
+
+def _used_columns(node: ast.expr, placeholder_map: dict[str, str]) -> frozenset[str]:
+    functions = {
+        id(child.func) for child in ast.walk(node) if isinstance(child, ast.Call)
+    }
+
+    return frozenset(
+        placeholder_map.get(child.id, child.id)
+        for child in ast.walk(node)
+        if isinstance(child, ast.Name) and id(child) not in functions
+    )
+
+
+class FilterConjunct:
+    """One of the `&`-ed conditions of a filter query."""
+
+    def __init__(self, node: ast.expr, placeholder_map: dict[str, str]):
+        self.query: str = _PLACEHOLDER_PATTERN.sub(
+            lambda match: f"`{placeholder_map[match.group(0)]}`", ast.unparse(node)
+        )
+        self.canonical: str = ast.dump(
+            _Canonicalizer(placeholder_map).visit(copy.deepcopy(node))
+        )
+        self.columns: frozenset[str] = _used_columns(node, placeholder_map)
+        self.kernel: FilterKernel | None = None
+
+        try:
+            self.kernel = FilterKernel(node, placeholder_map)
+        except UnsupportedFilterExpression:
+            pass
+
+        # Kernels only compile elementwise operations
+        self.is_row_wise: bool = self.kernel is not None or _is_row_wise(node)
+
+        self.cost: float = _estimate_cost(node, self.kernel is not None)
+        self.zone_predicate: ZonePredicate | None = None
+
+        compiled_zone_predicate = compile_zone_predicate(node, placeholder_map)
+        if compiled_zone_predicate is not None:
+            self.zone_predicate = compiled_zone_predicate[0]
+
+    def __evaluate(self, data: pd.DataFrame) -> pd.Series:
+        if self.kernel is not None:
+            try:
+                return self.kernel.evaluate(data)
+            except (UnsupportedFilterExpression, KeyError, TypeError, ValueError):
+                pass
+
+        return _as_mask(data.eval(self.query, inplace=False), self.query)
+
+    def __block_states(
+        self, data: pd.DataFrame, zone_maps: dict[str, ZoneMap] | None
+    ) -> tuple[np.ndarray, np.ndarray, int] | None:
+        if self.zone_predicate is None or not zone_maps:
+            return None
+
+        if any(
+            column not in zone_maps or zone_maps[column].n_rows != len(data)
+            for column in self.columns
+        ):
+            return None
+
+        block_size = zone_maps[next(iter(self.columns))].block_size
+        all_true, all_false = self.zone_predicate(zone_maps)
+
+        if not (all_true.any() or all_false.any()):
+            return None
+
+        return all_true, all_false, block_size
+
+    def evaluate(
+        self,
+        data: pd.DataFrame,
+        positions: np.ndarray | None = None,
+        zone_maps: dict[str, ZoneMap] | None = None,
+    ) -> pd.Series:
+        """
+        Evaluates the condition on the rows at `positions` (all by default), which
+        must be all the rows unless the condition `is_row_wise`. With the zone maps
+        of its columns, the rows of blocks the zone maps decide are filled in
+        without being read.
+        """
+
+        block_states = self.__block_states(data, zone_maps)
+
+        if block_states is None:
+            return self.__evaluate(data if positions is None else data.iloc[positions])
+
+        all_true, all_false, block_size = block_states
+
+        undecided_blocks = ~(all_true | all_false)
+
+        if positions is None:
+            # Whole blocks, without materialising a position for every row
+            values = np.repeat(all_true, block_size)[: len(data)]
+            undecided = np.repeat(undecided_blocks, block_size)[: len(data)]
+            rows = np.flatnonzero(undecided)
+            index = data.index
+        else:
+            blocks = positions // block_size
+            values = all_true[blocks]
+            undecided = undecided_blocks[blocks]
+            rows = positions[undecided]
+            index = data.index[positions]
+
+        missing = np.zeros(len(values), dtype=bool)
+        nullable = False
+
+        if len(rows):
+            result = self.__evaluate(data.iloc[rows])
+            nullable = isinstance(result.dtype, pd.BooleanDtype)
+
+            values[undecided] = result.to_numpy(dtype=bool, na_value=False)
+            missing[undecided] = result.isna().to_numpy(dtype=bool)
+
+        if not nullable:
+            return pd.Series(values, index=index)
+
+        return pd.Series(pd.arrays.BooleanArray(values, missing), index=index)
+
+
+class PredicateCache:
+    """
+    Masks of filter conditions over all rows, shared by every filter. A condition
+    is looked up by its canonical form and the versions of the columns it reads, so
+    filters that share a condition (e.g. `` `product` == 'CARD' `` with different
+    score ranges) evaluate it once and only combine the cached masks.
+
+    `invalidate` bumps the versions of changed columns. The least recently used
+    masks are dropped once the cache holds more than `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20):
+        self.max_bytes: int = max_bytes
+        self.__masks: OrderedDict[tuple, PackedMask] = OrderedDict()
+        self.__epoch: int = 0
+        self.__column_versions: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.__masks)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(mask.nbytes for mask in self.__masks.values())
+
+    def __key(self, conjunct: FilterConjunct, n_rows: int) -> tuple:
+        column_versions = tuple(
+            (column, self.__column_versions.get(column, 0))
+            for column in sorted(conjunct.columns)
+        )
+
+        return (conjunct.canonical, n_rows, self.__epoch, column_versions)
+
+    def get(self, conjunct: FilterConjunct, n_rows: int) -> PackedMask | None:
+        key = self.__key(conjunct, n_rows)
+
+        if key not in self.__masks:
+            return None
+
+        self.__masks.move_to_end(key)
+
+        return self.__masks[key]
+
+    def put(self, conjunct: FilterConjunct, mask: PackedMask) -> None:
+        self.__masks[self.__key(conjunct, len(mask))] = mask
+
+        nbytes = self.nbytes
+        while nbytes > self.max_bytes and self.__masks:
+            _, evicted = self.__masks.popitem(last=False)
+            nbytes -= evicted.nbytes
+
+    def invalidate(self, columns: t.Iterable[str] | None = None) -> None:
+        """Forgets the masks that read `columns`, or all masks."""
+
+        if columns is None:
+            self.__epoch += 1
+            self.__masks.clear()
+            return
+
+        columns = set(columns)
+
+        for column in columns:
+            self.__column_versions[column] = self.__column_versions.get(column, 0) + 1
+
+        for key in list(self.__masks):
+            if any(column in columns for column, _ in key[3]):
+                del self.__masks[key]
+
+
+class FilterPlan:
+    """
+    Evaluates a filter query of several `&`-ed conditions one condition at a time,
+    cheapest and most selective first. Each condition is evaluated only on the rows
+    that no earlier condition has ruled out, so that expensive conditions (text
+    methods in particular) run on a small subset of the rows. Conditions that are
+    not row-wise (aggregates such as `x > x.mean()`) are evaluated on all the rows.
+
+    Selectivity is estimated on an evenly spaced sample of the rows once the data
+    has `sample_min_rows` rows; smaller data is only ordered by cost. Missing values
+    follow the Kleene logic of `DataFrame.eval`: a row is only ruled out by a known
+    False.
+
+    With a `PredicateCache`, cached conditions are combined first without being
+    evaluated. Compiled conditions are then evaluated on all rows so that they can
+    be cached as well, as is any condition evaluated before rows are ruled out.
+
+    With zone maps of the numeric columns, range conditions skip the blocks of rows
+    that the minimum and maximum of the block already decide.
+    """
+
+    sample_size: int = 2048
+    sample_min_rows: int = 50_000
+
+    def __init__(self, expression: ast.expr, placeholder_map: dict[str, str]):
+        self.conjuncts: list[FilterConjunct] = [
+            FilterConjunct(node, placeholder_map)
+            for node in _split_conjuncts(expression)
+        ]
+
+    @property
+    def is_row_wise(self) -> bool:
+        """Whether the query can be evaluated on a subset of the rows."""
+
+        return all(conjunct.is_row_wise for conjunct in self.conjuncts)
+
+    def __pass_rate(self, conjunct: FilterConjunct, sample: pd.DataFrame) -> float:
+        try:
+            result = conjunct.evaluate(sample)
+        except (UnsupportedFilterExpression, KeyError, TypeError, ValueError):
+            # Errors are reported when the condition is evaluated on all the rows
+            return 1.0
+
+        known_false = ~result.to_numpy(dtype=bool, na_value=True)
+
+        return 1.0 - known_false.sum() / max(len(sample), 1)
+
+    def order(
+        self, data: pd.DataFrame, conjuncts: list[FilterConjunct] | None = None
+    ) -> list[FilterConjunct]:
+        """The conditions (all by default) in the order they are evaluated on `data`."""
+
+        if conjuncts is None:
+            conjuncts = self.conjuncts
+
+        if len(conjuncts) < 2 or len(data) < self.sample_min_rows:
+            return sorted(conjuncts, key=lambda conjunct: conjunct.cost)
+
+        positions = np.unique(
+            np.linspace(0, len(data) - 1, self.sample_size).astype(np.int64)
+        )
+        sample = data.iloc[positions]
+
+        # Cost per row ruled out, the classic ordering for independent conditions
+        rank = {
+            id(conjunct): conjunct.cost
+            / max(1.0 - self.__pass_rate(conjunct, sample), 1e-3)
+            for conjunct in conjuncts
+        }
+
+        return sorted(conjuncts, key=lambda conjunct: rank[id(conjunct)])
+
+    def evaluate(
+        self,
+        data: pd.DataFrame,
+        predicate_cache: PredicateCache | None = None,
+        zone_maps: dict[str, ZoneMap] | None = None,
+    ) -> pd.Series:
+        n_rows = len(data)
+        ruled_out = np.zeros(n_rows, dtype=bool)
+        missing = np.zeros(n_rows, dtype=bool)
+        nullable = False
+
+        remaining = self.conjuncts
+
+        if predicate_cache is not None:
+            remaining = []
+
+            for conjunct in self.conjuncts:
+                cached = predicate_cache.get(conjunct, n_rows)
+
+                if cached is None:
+                    remaining.append(conjunct)
+                    continue
+
+                values = cached.to_numpy()
+                cached_missing = cached.to_numpy(na_value=True) & ~values
+
+                ruled_out |= ~values & ~cached_missing
+                missing |= cached_missing
+                nullable = nullable or cached.has_na
+
+        # Positions of the rows that are True or missing so far
+        alive = np.flatnonzero(~ruled_out)
+
+        for conjunct in self.order(data, remaining):
+            if len(alive) == 0:
+                break
+
+            all_rows = (
+                len(alive) == n_rows
+                or not conjunct.is_row_wise
+                or (predicate_cache is not None and conjunct.kernel is not None)
+            )
+
+            result = conjunct.evaluate(data, None if all_rows else alive, zone_maps)
+            nullable = nullable or isinstance(result.dtype, pd.BooleanDtype)
+
+            if all_rows and predicate_cache is not None:
+                predicate_cache.put(conjunct, PackedMask.from_series(result))
+
+            values = result.to_numpy(dtype=bool, na_value=False)
+            result_missing = result.isna().to_numpy(dtype=bool)
+
+            known_false = ~values & ~result_missing
+
+            if len(alive) == n_rows:
+                ruled_out |= known_false
+                missing |= result_missing
+                alive = np.flatnonzero(~ruled_out)
+                continue
+
+            if all_rows:
+                known_false, result_missing = known_false[alive], result_missing[alive]
+
+            ruled_out[alive[known_false]] = True
+            missing[alive[result_missing]] = True
+
+            alive = alive[~known_false]
+
+        missing &= ~ruled_out
+
+        if not nullable:
+            return pd.Series(~ruled_out, index=data.index)
+
+        return pd.Series(
+            pd.arrays.BooleanArray(~ruled_out & ~missing, missing), index=data.index
+        )
+
+
+def compile_plan(expression: str, placeholder_map: dict[str, str]) -> FilterPlan | None:
+    """
+    Plans a filter expression (with backticked names already replaced by the
+    placeholders of `placeholder_map`), or returns `None` if it can not be parsed.
+    """
+
+    try:
+        return FilterPlan(parse_expression(expression), placeholder_map)
+    except (SyntaxError, tokenize.TokenError):
+        return None
+
+
+__all__ = ["FilterConjunct", "FilterPlan", "PredicateCache", "compile_plan"]
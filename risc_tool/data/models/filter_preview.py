@@ -0,0 +1,159 @@
+import math
+import threading
+import time
+from concurrent.futures import Executor, Future
+
+import numpy as np
+import pandas as pd
+
+from risc_tool.data.models.filter import Filter
+from risc_tool.data.models.types import DataSourceID
+
+
+class FilterPreview:
+    """
+    Counts of the rows that pass a draft filter, per data source, refined chunk by
+    chunk. Chunk `k` holds every `n_chunks`-th row starting at row `k`, so that the
+    counts scaled up from the chunks evaluated so far are an estimate over all the
+    rows, even when the data is sorted. A filter that is not row-wise (with an
+    aggregate such as `x > x.mean()`) is evaluated on all the rows in one chunk.
+
+    `refine` evaluates chunks until its time budget is spent, or until every chunk
+    is evaluated and the counts are exact. It can run in a background thread while
+    the estimate is shown; `future` is then the background run.
+    """
+
+    chunk_size: int = 65_536
+
+    def __init__(self, filter_obj: Filter, data: pd.DataFrame):
+        self.filter: Filter = filter_obj
+        self.future: Future | None = None
+        self.error: Exception | None = None
+
+        self.__data = data
+        self.__n_chunks = (
+            max(1, math.ceil(len(data) / self.chunk_size))
+            if filter_obj.is_row_wise
+            else 1
+        )
+
+        # Rows are grouped by the data source level of the index
+        source_codes, data_source_ids = pd.factorize(data.index.get_level_values(0))
+        self.__source_codes: np.ndarray = source_codes
+        self.data_source_ids: list[DataSourceID] = list(data_source_ids)
+
+        n_sources = len(self.data_source_ids)
+        self.__rows = np.bincount(source_codes, minlength=n_sources)
+        self.__evaluated = np.zeros(n_sources, dtype=np.int64)
+        self.__passed = np.zeros(n_sources, dtype=np.int64)
+
+        self.__next_chunk = 0
+        self.__done_chunks = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def is_exact(self) -> bool:
+        return self.__done_chunks == self.__n_chunks
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the rows evaluated."""
+
+        return self.__done_chunks / self.__n_chunks
+
+    def __claim_chunk(self) -> int | None:
+        with self.__lock:
+            if self.__next_chunk == self.__n_chunks:
+                return None
+
+            self.__next_chunk += 1
+
+            return self.__next_chunk - 1
+
+    def refine(self, time_budget: float | None = None) -> None:
+        """
+        Evaluates chunks until `time_budget` seconds have passed (at least one
+        chunk), or until every chunk is evaluated.
+        """
+
+        start = time.perf_counter()
+
+        while (chunk := self.__claim_chunk()) is not None:
+            if self.__n_chunks == 1:
+                mask = self.filter.evaluate(self.__data)
+                source_codes = self.__source_codes
+            else:
+                positions = np.arange(chunk, len(self.__data), self.__n_chunks)
+                mask = self.filter.evaluate(self.__data.iloc[positions])
+                source_codes = self.__source_codes[positions]
+
+            n_sources = len(self.data_source_ids)
+            evaluated = np.bincount(source_codes, minlength=n_sources)
+            passed = np.bincount(
+                source_codes[mask.to_numpy(dtype=bool, na_value=False)],
+                minlength=n_sources,
+            )
+
+            with self.__lock:
+                self.__evaluated += evaluated
+                self.__passed += passed
+                self.__done_chunks += 1
+
+            if time_budget is not None and time.perf_counter() - start >= time_budget:
+                return
+
+    def refine_in_background(self, executor: Executor) -> None:
+        """Completes the counts on `executor`, recording any error."""
+
+        def run() -> None:
+            try:
+                self.refine()
+            except Exception as error:
+                self.error = error
+
+        self.future = executor.submit(run)
+
+    def cancel(self) -> None:
+        """Stops refining after the chunk being evaluated."""
+
+        with self.__lock:
+            self.__next_chunk = self.__n_chunks
+
+    @property
+    def counts(self) -> pd.DataFrame:
+        """
+        Per data source: the number of rows, the rows evaluated so far and the
+        (estimated, until `is_exact`) number of rows that pass the filter.
+        """
+
+        with self.__lock:
+            evaluated = self.__evaluated.copy()
+            passed = self.__passed.copy()
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            estimated = np.where(
+                evaluated > 0, passed / evaluated * self.__rows, np.nan
+            )
+
+        return pd.DataFrame(
+            {
+                "rows": self.__rows,
+                "evaluated_rows": evaluated,
+                "passed_rows": np.where(evaluated == self.__rows, passed, estimated),
+            },
+            index=pd.Index(self.data_source_ids, name="data_source_id"),
+        )
+
+    @property
+    def pass_rate(self) -> float:
+        """(Estimated) fraction of all the rows that pass the filter."""
+
+        counts = self.counts
+
+        if counts["rows"].sum() == 0:
+            return np.nan
+
+        return float(counts["passed_rows"].sum() / counts["rows"].sum())
+
+
+__all__ = ["FilterPreview"]
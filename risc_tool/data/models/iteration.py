@@ -21,6 +21,18 @@ from risc_tool.data.models.types import IterationID
 from risc_tool.utils.wrap_text import TAB, wrap_text
 
 
+def _code_dtype(n_categories: int) -> type[np.signedinteger]:
+    """Smallest integer type for the codes of `n_categories` categories and -1."""
+
+    if n_categories < np.iinfo(np.int8).max:
+        return np.int8
+
+    if n_categories < np.iinfo(np.int16).max:
+        return np.int16
+
+    return np.int32
+
+
 class IterationBase(ABC):
     var_type: VariableType
     iter_type: IterationType
@@ -74,10 +86,73 @@ class IterationBase(ABC):
         self._groups = default_groups.copy()
 
     @abstractmethod
+    def _segment_lookup(
+        self, previous_categories: pd.Index, default: bool
+    ) -> tuple[np.ndarray, pd.Index]:
+        """
+        The risk segment categories, and the code of the risk segment of every
+        (group code, previous risk segment code) pair. The last row and column
+        are -1, so that a missing code (-1) looks up a missing segment.
+        """
+        raise NotImplementedError()
+
+    def get_segment_codes(
+        self,
+        previous_codes: np.ndarray | None,
+        previous_categories: pd.Index | None,
+        default: bool,
+    ) -> tuple[list[str], list[str], list, np.ndarray, pd.Index]:
+        """
+        Warnings, errors, invalid groups, the risk segment code of every row (-1
+        for none) and the risk segment categories, from the codes of the previous
+        risk segments. Rows are mapped to their segments with a single gather.
+        """
+
+        warnings, errors, invalid_groups, group_codes = self._assign_groups(default)
+
+        if previous_categories is None:
+            previous_categories = pd.Index([])
+
+        lookup, categories = self._segment_lookup(previous_categories, default)
+        codes = lookup[group_codes, -1 if previous_codes is None else previous_codes]
+
+        return warnings, errors, invalid_groups, codes, categories
+
     def get_risk_segments(
         self, previous_risk_segments: pd.Series | None, default: bool
     ) -> IterationOutput:
-        raise NotImplementedError()
+        previous_codes = previous_categories = None
+
+        if previous_risk_segments is not None:
+            previous_risk_segments = previous_risk_segments.astype("category")
+            previous_codes = previous_risk_segments.cat.codes.to_numpy()
+            previous_categories = previous_risk_segments.cat.categories
+
+        return self.get_risk_segments_from_codes(
+            previous_codes, previous_categories, default
+        )
+
+    def get_risk_segments_from_codes(
+        self,
+        previous_codes: np.ndarray | None,
+        previous_categories: pd.Index | None,
+        default: bool,
+    ) -> IterationOutput:
+        warnings, errors, invalid_groups, codes, categories = self.get_segment_codes(
+            previous_codes, previous_categories, default
+        )
+
+        return IterationOutput(
+            risk_segment_column=pd.Series(
+                pd.Categorical.from_codes(
+                    codes, dtype=pd.CategoricalDtype(categories=categories)
+                ),
+                index=self.variable.index,
+            ),
+            errors=errors,
+            warnings=warnings,
+            invalid_groups=invalid_groups,
+        )
 
     @abstractmethod
     def set_group(
@@ -94,9 +169,35 @@ class IterationBase(ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    def get_group_mapping(self, default: bool) -> IterationOutput:
+    def _assign_groups(
+        self, default: bool
+    ) -> tuple[list[str], list[str], list, np.ndarray]:
+        """
+        Warnings, errors, invalid groups and the position in `groups.index` of the
+        group of every row (-1 for none). Rows are only assigned without errors.
+        """
         raise NotImplementedError()
 
+    def get_group_mapping(self, default: bool) -> IterationOutput:
+        warnings, errors, invalid_groups, codes = self._assign_groups(default)
+
+        groups = self.default_groups if default else self.groups
+
+        group_indices = pd.Series(
+            pd.Categorical.from_codes(
+                codes, dtype=pd.CategoricalDtype(categories=groups.index)
+            ),
+            index=self.variable.index,
+            name=GridColumn.GROUP_INDEX,
+        )
+
+        return IterationOutput(
+            risk_segment_column=group_indices,
+            errors=errors,
+            warnings=warnings,
+            invalid_groups=invalid_groups,
+        )
+
     def _check_group_index(self, group_index: int) -> None:
         num_groups = len(self._groups)
 
@@ -219,16 +320,21 @@ class SingleVarIteration(IterationBase):
         else:
             raise ValueError(f"Invalid color type: {color_type}")
 
-    def get_risk_segments(
-        self, previous_risk_segments: pd.Series | None, default: bool
-    ) -> IterationOutput:
-        output = self.get_group_mapping(default=default)
-
-        output.risk_segment_column = output.risk_segment_column.astype(
-            pd.CategoricalDtype(categories=self.risk_segment_details.index)
+    def _segment_lookup(
+        self, previous_categories: pd.Index, default: bool
+    ) -> tuple[np.ndarray, pd.Index]:
+        groups = self.default_groups if default else self.groups
+        categories = self.risk_segment_details.index
+
+        # Every group is the risk segment of the same index, whatever came before
+        segments = np.append(categories.get_indexer(groups.index), -1)
+        lookup = np.repeat(
+            segments.astype(_code_dtype(len(categories)))[:, np.newaxis],
+            len(previous_categories) + 1,
+            axis=1,
         )
 
-        return output
+        return lookup, categories
 
     def to_dict(self) -> IterationJSON:
         dict_data = super().to_dict()
@@ -376,34 +482,33 @@ class DoubleVarIteration(IterationBase):
         else:
             raise ValueError("Can not remove the last group.")
 
-    def get_risk_segments(
-        self, previous_risk_segments: pd.Series | None, default: bool
-    ) -> IterationOutput:
-        iteration_output = self.get_group_mapping(default=default)
-        risk_segment_column = pd.Series(index=self.variable.index)
-
-        if not iteration_output.errors:
-            risk_segment_grid = (
-                self.default_risk_segment_grid if default else self.risk_segment_grid
-            )
-
-            for prev_rs in risk_segment_grid.columns:
-                for curr_rs in risk_segment_grid.index:
-                    mask = (previous_risk_segments == prev_rs) & (
-                        iteration_output.risk_segment_column == curr_rs
-                    )
-
-                    risk_segment_column.loc[mask] = risk_segment_grid.loc[
-                        curr_rs, prev_rs
-                    ]
-
-        risk_segment_column = risk_segment_column.astype(
-            pd.CategoricalDtype(categories=self.risk_segment_grid.columns)
+    def _segment_lookup(
+        self, previous_categories: pd.Index, default: bool
+    ) -> tuple[np.ndarray, pd.Index]:
+        groups = self.default_groups if default else self.groups
+        risk_segment_grid = (
+            self.default_risk_segment_grid if default else self.risk_segment_grid
         )
+        categories = self.risk_segment_grid.columns
 
-        iteration_output.risk_segment_column = risk_segment_column
+        # Output code of every cell of the grid, padded with a missing row and column
+        code_grid = np.full(
+            (risk_segment_grid.shape[0] + 1, risk_segment_grid.shape[1] + 1),
+            -1,
+            dtype=_code_dtype(len(categories)),
+        )
+        code_grid[:-1, :-1] = categories.get_indexer(
+            risk_segment_grid.to_numpy().ravel()
+        ).reshape(risk_segment_grid.shape)
+
+        # Rows in the order of the groups, columns in the order of the previous
+        # risk segments; the ones not in the grid look up the padding
+        rows = np.append(risk_segment_grid.index.get_indexer(groups.index), -1)
+        columns = np.append(
+            risk_segment_grid.columns.get_indexer(previous_categories), -1
+        )
 
-        return iteration_output
+        return code_grid[np.ix_(rows, columns)], categories
 
     def to_dict(self):
         dict_data = super().to_dict()
@@ -544,12 +649,31 @@ class NumericalIteration(IterationBase):
             self._groups[group_index] = (lower_bound, upper_bound)
 
     def _validate(self, default: bool) -> tuple[list[str], list[str], list]:
+        warnings, errors, invalid_groups, _ = self._assign_groups(default)
+
+        return warnings, errors, invalid_groups
+
+    def _assign_groups(
+        self, default: bool
+    ) -> tuple[list[str], list[str], list, np.ndarray]:
+        """
+        Validates the groups and finds the group of every row in a single pass.
+
+        The valid groups are sorted by lower bound once. Every value is then
+        located among the lower bounds with a binary search; it belongs to the
+        group found if it is not above that group's upper bound. Overlaps are
+        checked between neighbouring sorted groups. A value is covered when it is
+        not above the running maximum of the upper bounds up to its position.
+
+        Returns the positions of the rows' groups in `groups.index` (-1 for none),
+        which are only assigned when there are no errors.
+        """
+
         invalid_groups = []
         warnings = []
         errors = []
         intervals = []
 
-        mask = pd.Series(False, index=self.variable.index)
         groups = self.default_groups if default else self.groups
 
         for group_index, (lower_bound, upper_bound) in groups.items():
@@ -581,20 +705,21 @@ class NumericalIteration(IterationBase):
                     group_index,
                     pd.Interval(lower_bound, upper_bound, closed="right"),
                 ))
-                mask |= (self.variable > lower_bound) & (self.variable <= upper_bound)
 
         lbs = pd.Series([i[1].left for i in intervals])
         ubs = pd.Series([i[1].right for i in intervals])
 
         intervals.sort(key=lambda t: t[1].left)
 
-        overlaps = []
-        for i in range(len(intervals) - 1):
-            if intervals[i][1].overlaps(intervals[i + 1][1]):
-                overlaps.append(
-                    f"{intervals[i][0]}. {intervals[i][1]} "
-                    f"and {intervals[i + 1][0]}. {intervals[i + 1][1]}"
-                )
+        lower_bounds = np.array([i[1].left for i in intervals], dtype="float64")
+        upper_bounds = np.array([i[1].right for i in intervals], dtype="float64")
+
+        # Sorted by lower bound, a group can only overlap the group right after it
+        overlaps = [
+            f"{intervals[i][0]}. {intervals[i][1]} "
+            f"and {intervals[i + 1][0]}. {intervals[i + 1][1]}"
+            for i in np.flatnonzero(lower_bounds[1:] < upper_bounds[:-1])
+        ]
 
         if not lbs.is_monotonic_decreasing and not lbs.is_monotonic_increasing:
             warnings.append(
@@ -611,42 +736,39 @@ class NumericalIteration(IterationBase):
         if overlaps:
             errors.append(f"Following intervals overlap: {overlaps}")
 
-        if not mask.all():
-            warnings.append(
-                f"Some values in the variable are not covered by any group: "
-                f"{self.variable[~mask].drop_duplicates().sort_values().tolist()}"
-            )
+        values = self.variable.to_numpy(dtype="float64", na_value=np.nan)
 
-        warnings = [f"Iteration {self.uid}: {warning}" for warning in warnings]
-        errors = [f"Iteration {self.uid}: {error}" for error in errors]
+        # Last group with a lower bound below the value; missing values find none
+        positions = np.searchsorted(lower_bounds, values, side="left") - 1
+        positions[np.isnan(values)] = -1
+        located = np.maximum(positions, 0)
 
-        return warnings, errors, invalid_groups
+        if len(intervals):
+            covered = (positions >= 0) & (
+                values <= np.maximum.accumulate(upper_bounds)[located]
+            )
+        else:
+            covered = np.zeros(len(values), dtype=bool)
 
-    def get_group_mapping(self, default: bool) -> IterationOutput:
-        warnings, error, invalid_groups = self._validate(default=default)
-        group_indices = pd.Series(
-            index=self.variable.index, name=GridColumn.GROUP_INDEX
-        )
+        not_covered = ~covered & ~np.isnan(values)
 
-        groups = self.default_groups if default else self.groups
+        if not_covered.any():
+            warnings.append(
+                f"Some values in the variable are not covered by any group: "
+                f"{self.variable[not_covered].drop_duplicates().sort_values().tolist()}"
+            )
 
-        if not error:
-            valid_groups = groups.drop(invalid_groups)
+        codes = np.full(len(values), -1, dtype=_code_dtype(len(groups)))
 
-            for group_index, (lower_bound, upper_bound) in valid_groups.items():
-                mask = (self.variable > lower_bound) & (self.variable <= upper_bound)
-                group_indices.loc[mask] = group_index
+        if not errors and len(intervals):
+            # Without overlaps, the upper bounds are sorted as well
+            group_codes = groups.index.get_indexer([i[0] for i in intervals])
+            codes[covered] = group_codes[located[covered]]
 
-        group_indices = group_indices.astype(
-            pd.CategoricalDtype(categories=groups.index)
-        )
+        warnings = [f"Iteration {self.uid}: {warning}" for warning in warnings]
+        errors = [f"Iteration {self.uid}: {error}" for error in errors]
 
-        return IterationOutput(
-            risk_segment_column=group_indices,
-            errors=error,
-            warnings=warnings,
-            invalid_groups=invalid_groups,
-        )
+        return warnings, errors, invalid_groups, codes
 
     def get_group_display(self):
         np.set_printoptions(legacy="1.25")
@@ -691,10 +813,22 @@ class CategoricalIteration(IterationBase):
         warnings = []
         errors = []
 
-        all_categories = set(self.variable.cat.categories)
+        categories = self.variable.cat.categories
+        all_categories = set(categories)
         assigned_categories = set()
+        # Positions in `categories` of the categories assigned to a group
+        assigned = np.zeros(len(categories), dtype=bool)
         groups = self.default_groups if default else self.groups
 
+        possible_types = [type(self.variable.iloc[0])]
+
+        if pd.api.types.is_integer_dtype(categories.dtype):
+            possible_types.append(int)
+        elif pd.api.types.is_float_dtype(categories.dtype):
+            possible_types.append(float)
+        elif pd.api.types.is_string_dtype(categories.dtype):
+            possible_types.append(str)
+
         for group_index, category_list in groups.items():
             if not isinstance(category_list, set):
                 warnings.append(
@@ -708,15 +842,25 @@ class CategoricalIteration(IterationBase):
                 invalid_groups.append(group_index)
                 continue
 
-            possible_types = [type(self.variable.iloc[0])]
+            category_list = list(category_list)
+            positions = categories.get_indexer(category_list)
 
-            if pd.api.types.is_integer_dtype(self.variable.cat.categories.dtype):
-                possible_types.append(int)
-            elif pd.api.types.is_float_dtype(self.variable.cat.categories.dtype):
-                possible_types.append(float)
-            elif pd.api.types.is_string_dtype(self.variable.cat.categories.dtype):
-                possible_types.append(str)
+            # Checked per distinct type rather than per category
+            valid_types = all(
+                issubclass(category_type, tuple(possible_types))
+                for category_type in set(map(type, category_list))
+            )
+
+            if (
+                valid_types
+                and (positions >= 0).all()
+                and not assigned[positions].any()
+                and len(np.unique(positions)) == len(positions)
+            ):
+                assigned[positions] = True
+                continue
 
+            # Reports the problems category by category
             for category in category_list:
                 if not isinstance(category, tuple(possible_types)):
                     warnings.append(
@@ -732,17 +876,24 @@ class CategoricalIteration(IterationBase):
                     )
                     invalid_groups.append(group_index)
 
-                if category in assigned_categories:
+                position = categories.get_indexer([category])[0]
+
+                if category in assigned_categories or (
+                    position >= 0 and assigned[position]
+                ):
                     errors.append(
                         f"Category '{category}' is assigned to multiple groups."
                     )
 
-                assigned_categories.add(category)
+                if position >= 0:
+                    assigned[position] = True
+                else:
+                    assigned_categories.add(category)
 
-        if len(all_categories - assigned_categories) > 0:
+        if not assigned.all():
             warnings.append(
                 f"The following categories are not assigned to any group: "
-                f"{', '.join(all_categories - assigned_categories)}"
+                f"{', '.join(map(str, categories[~assigned]))}"
             )
 
         warnings = [f"Iteration {self.uid}: {warning}" for warning in warnings]
@@ -750,31 +901,28 @@ class CategoricalIteration(IterationBase):
 
         return warnings, errors, invalid_groups
 
-    def get_group_mapping(self, default: bool) -> IterationOutput:
-        warnings, error, invalid_groups = self._validate(default=default)
-        group_indices = pd.Series(
-            index=self.variable.index, name=GridColumn.GROUP_INDEX
-        )
+    def _assign_groups(
+        self, default: bool
+    ) -> tuple[list[str], list[str], list, np.ndarray]:
+        warnings, errors, invalid_groups = self._validate(default=default)
 
         groups = self.default_groups if default else self.groups
+        categories = self.variable.cat.categories
+
+        # Group of every category of the variable, and -1 (the last entry) for
+        # categories in no valid group and for missing values (code -1)
+        lookup = np.full(len(categories) + 1, -1, dtype=_code_dtype(len(groups)))
 
-        if not error:
+        if not errors:
             valid_groups = groups.drop(invalid_groups)
 
             for group_index, category_list in valid_groups.items():
-                mask = self.variable.isin(category_list)
-                group_indices.loc[mask] = group_index
+                positions = categories.get_indexer(list(category_list))
+                lookup[positions[positions >= 0]] = groups.index.get_loc(group_index)
 
-        group_indices = group_indices.astype(
-            pd.CategoricalDtype(categories=groups.index),
-        )
+        codes = lookup.take(self.variable.cat.codes.to_numpy())
 
-        return IterationOutput(
-            risk_segment_column=group_indices,
-            errors=error,
-            warnings=warnings,
-            invalid_groups=invalid_groups,
-        )
+        return warnings, errors, invalid_groups, codes
 
     def get_group_display(self):
         return self.groups.map(lambda categories: ", ".join(categories))
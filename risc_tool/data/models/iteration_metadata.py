@@ -15,6 +15,7 @@ class IterationMetadata:
         current_filter_ids: list[FilterID],
         metric_ids: list[MetricID],
         remove_outliers: bool,
+        confidence_intervals: bool = False,
     ):
         self.editable: bool = editable
         self.scalars_enabled: bool = scalars_enabled
@@ -25,6 +26,7 @@ class IterationMetadata:
         self.current_filter_ids: list[FilterID] = current_filter_ids
         self.metric_ids: list[MetricID] = metric_ids
         self.remove_outliers: bool = remove_outliers
+        self.confidence_intervals: bool = confidence_intervals
 
     def to_dict(self) -> IterationMetadataJSON:
         return IterationMetadataJSON(
@@ -37,6 +39,7 @@ class IterationMetadata:
             current_filter_ids=self.current_filter_ids,
             metric_ids=self.metric_ids,
             remove_outliers=self.remove_outliers,
+            confidence_intervals=self.confidence_intervals,
         )
 
     @classmethod
@@ -51,6 +54,7 @@ class IterationMetadata:
             current_filter_ids=data.current_filter_ids,
             metric_ids=data.metric_ids,
             remove_outliers=data.remove_outliers,
+            confidence_intervals=data.confidence_intervals,
         )
 
     def update(
@@ -64,6 +68,7 @@ class IterationMetadata:
         current_filter_ids: list[FilterID] | None = None,
         metric_ids: list[MetricID] | None = None,
         remove_outliers: bool | None = None,
+        confidence_intervals: bool | None = None,
     ) -> None:
         if editable is not None:
             self.editable = editable
@@ -92,6 +97,9 @@ class IterationMetadata:
         if remove_outliers is not None:
             self.remove_outliers = remove_outliers
 
+        if confidence_intervals is not None:
+            self.confidence_intervals = confidence_intervals
+
     def with_changes(
         self,
         editable: bool | None = None,
@@ -103,6 +111,7 @@ class IterationMetadata:
         current_filter_ids: list[FilterID] | None = None,
         metric_ids: list[MetricID] | None = None,
         remove_outliers: bool | None = None,
+        confidence_intervals: bool | None = None,
     ):
         if editable is None:
             editable = self.editable
@@ -131,6 +140,9 @@ class IterationMetadata:
         if remove_outliers is None:
             remove_outliers = self.remove_outliers
 
+        if confidence_intervals is None:
+            confidence_intervals = self.confidence_intervals
+
         return IterationMetadata(
             editable=editable,
             scalars_enabled=scalars_enabled,
@@ -141,6 +153,7 @@ class IterationMetadata:
             current_filter_ids=current_filter_ids,
             metric_ids=metric_ids,
             remove_outliers=remove_outliers,
+            confidence_intervals=confidence_intervals,
         )
 
 
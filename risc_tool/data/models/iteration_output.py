@@ -1,3 +1,7 @@
+import typing as t
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 from pydantic import BaseModel, ConfigDict
 
@@ -15,4 +19,86 @@ class IterationOutput(BaseModel):
     invalid_groups: list[int]
 
 
-__all__ = ["IterationOutput"]
+class IterationOutputCache:
+    """
+    Iteration outputs kept as bare risk segment codes (int8 up to 127 segments),
+    their categories and messages, without the index of the rows. An output is
+    rebuilt as a categorical Series on the index it is read with.
+
+    The least recently used outputs are dropped once the codes take more than
+    `max_bytes`; a dropped output is simply a miss.
+    """
+
+    def __init__(self, max_bytes: int = 128 * 2**20):
+        self.max_bytes: int = max_bytes
+        self.__outputs: OrderedDict[
+            t.Hashable, tuple[np.ndarray, pd.Index, list[str], list[str], list[int]]
+        ] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__outputs)
+
+    def __contains__(self, key: t.Hashable) -> bool:
+        return key in self.__outputs
+
+    @property
+    def nbytes(self) -> int:
+        return sum(codes.nbytes for codes, *_ in self.__outputs.values())
+
+    def get_codes(self, key: t.Hashable) -> tuple[np.ndarray, pd.Index] | None:
+        """The risk segment codes of every row and the risk segment categories."""
+
+        if key not in self.__outputs:
+            return None
+
+        self.__outputs.move_to_end(key)
+        codes, categories, *_ = self.__outputs[key]
+
+        return codes, categories
+
+    def get(self, key: t.Hashable, index: pd.Index) -> IterationOutput | None:
+        if key not in self.__outputs:
+            return None
+
+        self.__outputs.move_to_end(key)
+        codes, categories, errors, warnings, invalid_groups = self.__outputs[key]
+
+        return IterationOutput(
+            risk_segment_column=pd.Series(
+                pd.Categorical.from_codes(
+                    codes,
+                    dtype=pd.CategoricalDtype(categories=categories),
+                    validate=False,
+                ),
+                index=index,
+            ),
+            errors=errors,
+            warnings=warnings,
+            invalid_groups=invalid_groups,
+        )
+
+    def put(self, key: t.Hashable, output: IterationOutput) -> None:
+        risk_segments = output.risk_segment_column
+
+        self.__outputs.pop(key, None)
+        self.__outputs[key] = (
+            risk_segments.cat.codes.to_numpy(),
+            risk_segments.cat.categories,
+            output.errors,
+            output.warnings,
+            output.invalid_groups,
+        )
+
+        nbytes = self.nbytes
+        while nbytes > self.max_bytes and self.__outputs:
+            _, (evicted, *_) = self.__outputs.popitem(last=False)
+            nbytes -= evicted.nbytes
+
+    def pop(self, key: t.Hashable) -> None:
+        self.__outputs.pop(key, None)
+
+    def clear(self) -> None:
+        self.__outputs.clear()
+
+
+__all__ = ["IterationOutput", "IterationOutputCache"]
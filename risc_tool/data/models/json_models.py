@@ -8,6 +8,7 @@ from risc_tool.data.models.enums import (
     IterationType,
     LossRateTypes,
     PercentileOptions,
+    PivotDimension,
     VariableType,
 )
 from risc_tool.data.models.types import (
@@ -76,6 +77,8 @@ class MetricJSON(BaseJSON):
     use_thousand_sep: bool
     is_percentage: bool
     decimal_places: int
+    approximate: bool = False
+    referenced_metrics: list[str] = []
     processed_query: str
     placeholder_map: dict[str, str]
 
@@ -85,6 +88,7 @@ class MetricRepositoryJSON(BaseJSON):
     var_unt_bad: str | None
     var_dlr_bad: str | None
     var_avg_bal: str | None
+    var_weight: str | None = None
     current_rate_mob: int
     lifetime_rate_mob: int
     data_source_ids: list[DataSourceID]
@@ -151,6 +155,7 @@ class IterationMetadataJSON(BaseJSON):
     current_filter_ids: list[FilterID]
     metric_ids: list[MetricID]
     remove_outliers: bool
+    confidence_intervals: bool = False
 
 
 class IterationsViewModelJSON(BaseJSON):
@@ -173,6 +178,20 @@ class SummaryViewModelJSON(BaseJSON):
     cv_selected_iterations: dict[UUID4, tuple[IterationID, bool]]
     cv_view_mode: t.Literal["grid", "list"]
 
+    # Pivot Tab Data
+    pv_metric_ids: list[MetricID] = [
+        MetricID.VOLUME,
+        MetricID.DLR_BAD_RATE,
+        MetricID.UNT_BAD_RATE,
+    ]
+    pv_filter_ids: list[FilterID] = []
+    pv_remove_outliers: bool = False
+    pv_selected_iteration_id: IterationID | None = None
+    pv_selected_iteration_default: bool = False
+    pv_dimensions: list[str] = []
+    pv_rows: list[str] = [PivotDimension.RISK_SEGMENT]
+    pv_columns: list[str] = []
+
 
 # Session Archive Repository
 class SessionArchiveRepositoryJSON(BaseJSON):
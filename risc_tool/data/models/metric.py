@@ -1,125 +1,272 @@
 import ast
+import functools
 import re
 import typing as t
+import warnings
 
 import numpy as np
 import pandas as pd
 
 from risc_tool.data.models.enums import DefaultMetricNames
 from risc_tool.data.models.json_models import MetricJSON
+from risc_tool.data.models.quantile_sketch import DEFAULT_SKETCH_K, KLLSketch
 from risc_tool.data.models.types import DataSourceID, MetricID
 
 MISSING = np.nan
 
 
-def _prepare_element_wise_args(
+def _to_numpy(series: pd.Series) -> np.ndarray:
+    if isinstance(series.dtype, np.dtype):
+        return series.to_numpy()
+
+    # Nullable extension dtypes (Int64, Float64, boolean) have no NaN of their own.
+    if series.hasnans:
+        return series.to_numpy(dtype="float64", na_value=np.nan)
+
+    return series.to_numpy(dtype=getattr(series.dtype, "numpy_dtype", None))
+
+
+def _stack_element_wise_args(
     *args: pd.Series | int | float,
-) -> (
-    tuple[list[pd.Series], t.Literal[True]] | tuple[list[int | float], t.Literal[False]]
-):
+) -> tuple[np.ndarray, pd.Index] | tuple[list[int | float], None]:
     """
-    Helper to validate and prepare arguments for element-wise operations.
+    Helper to validate and stack arguments for element-wise operations.
 
     Returns a tuple containing:
-    - A list/tuple of prepared arguments.
-    - A boolean indicating if the operation involves a pd.Series.
+    - A 2-D array with one row per argument, scalars broadcast to the series
+      length, or the list of arguments if none of them is a pd.Series.
+    - The index of the first series, or None if there are no series.
     """
     if not args:
         raise ValueError("At least one argument is required.")
 
-    is_series_op: bool = any(isinstance(arg, pd.Series) for arg in args)
+    series_list: list[pd.Series[t.Any]] = [
+        arg for arg in args if isinstance(arg, pd.Series)
+    ]
 
-    if is_series_op:
-        series_list: list[pd.Series[t.Any]] = [
-            s for s in args if isinstance(s, pd.Series)
-        ]
+    if not series_list:
+        return list(args), None  # type: ignore
 
-        # Validate that all series have the same length
-        if len(series_list) > 1:
-            first_series_len: int = len(series_list[0])
-            if not all(len(s) == first_series_len for s in series_list[1:]):
-                raise ValueError("All series arguments must have the same length.")
+    # Validate that all series have the same length
+    series_len: int = len(series_list[0])
+    if not all(len(s) == series_len for s in series_list[1:]):
+        raise ValueError("All series arguments must have the same length.")
 
-        # Find the length from the first available series
-        series_len: int = len(series_list[0])
+    arrays = [_to_numpy(arg) if isinstance(arg, pd.Series) else arg for arg in args]
+    # Scalars are typed as arrays, so that they promote narrow columns instead of
+    # being cast to them, and integers are widened like pandas does.
+    dtype = np.result_type(*(np.asarray(array) for array in arrays))
 
-        # Convert all arguments to Series of the same length
-        prepared_args: list[pd.Series[t.Any]] = [
-            arg if isinstance(arg, pd.Series) else pd.Series([arg] * series_len)
-            for arg in args
-        ]
-        return prepared_args, True
-    else:
-        non_series_args: list[int | float] = [
-            arg for arg in args if not isinstance(arg, pd.Series)
-        ]
-        return non_series_args, False
+    if dtype.kind in "biu":
+        dtype = np.promote_types(dtype, np.int64)
+    elif dtype.kind != "f":
+        dtype = np.dtype("float64")
+
+    # Scalars are broadcast by the row assignment, without materializing them.
+    stacked = np.empty((len(arrays), series_len), dtype=dtype)
+    for i, array in enumerate(arrays):
+        stacked[i] = array
+
+    return stacked, series_list[0].index
+
+
+def _is_exact(stacked: np.ndarray) -> bool:
+    return stacked.dtype.kind in "biu"
 
 
 def element_wise_sum(
     *args: pd.Series | int | float,
 ) -> pd.Series | int | float:
-    prepared_args, is_series_op = _prepare_element_wise_args(*args)
+    stacked, index = _stack_element_wise_args(*args)
 
-    if is_series_op:
-        return pd.concat(prepared_args, axis=1).sum(axis=1)  # type: ignore
-    else:
-        return np.sum(prepared_args)
+    if index is None:
+        return np.sum(stacked)
+
+    if not _is_exact(stacked):
+        # The stacked array is a private copy, so missing values are zeroed in place.
+        np.copyto(stacked, 0.0, where=np.isnan(stacked))
+
+    return pd.Series(stacked.sum(axis=0), index=index)
 
 
 def element_wise_mean(
     *args: t.Union[pd.Series, int, float],
 ) -> t.Union[pd.Series, int, float]:
-    prepared_args, is_series_op = _prepare_element_wise_args(*args)
+    stacked, index = _stack_element_wise_args(*args)
 
-    if is_series_op:
-        return pd.concat(prepared_args, axis=1).mean(axis=1)  # type: ignore
-    else:
-        return np.mean(prepared_args)  # type: ignore
+    if index is None:
+        return np.mean(stacked)  # type: ignore
+
+    if _is_exact(stacked):
+        return pd.Series(stacked.mean(axis=0), index=index)
+
+    missing = np.isnan(stacked)
+    count = len(stacked) - np.count_nonzero(missing, axis=0)
+    np.copyto(stacked, 0.0, where=missing)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.Series(stacked.sum(axis=0) / count, index=index)
 
 
 def element_wise_median(
     *args: t.Union[pd.Series, int, float],
 ) -> t.Union[pd.Series, int, float]:
-    prepared_args, is_series_op = _prepare_element_wise_args(*args)
+    stacked, index = _stack_element_wise_args(*args)
 
-    if is_series_op:
-        return pd.concat(prepared_args, axis=1).median(axis=1)  # type: ignore
-    else:
-        return np.median(prepared_args)  # type: ignore
+    if index is None:
+        return np.median(stacked)  # type: ignore
+
+    if _is_exact(stacked):
+        return pd.Series(np.median(stacked, axis=0), index=index)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # All-NaN slices
+        return pd.Series(np.nanmedian(stacked, axis=0), index=index)
 
 
 def element_wise_min(
     *args: t.Union[pd.Series, int, float],
 ) -> t.Union[pd.Series, int, float]:
-    prepared_args, is_series_op = _prepare_element_wise_args(*args)
+    stacked, index = _stack_element_wise_args(*args)
 
-    if is_series_op:
-        return pd.concat(prepared_args, axis=1).min(axis=1)  # type: ignore
-    else:
-        return np.min(prepared_args)
+    if index is None:
+        return np.min(stacked)
+
+    # fmin ignores NaN unless every value is NaN
+    return pd.Series(np.fmin.reduce(stacked, axis=0), index=index)
 
 
 def element_wise_max(
     *args: t.Union[pd.Series, int, float],
 ) -> t.Union[pd.Series, int, float]:
-    prepared_args, is_series_op = _prepare_element_wise_args(*args)
+    stacked, index = _stack_element_wise_args(*args)
 
-    if is_series_op:
-        return pd.concat(prepared_args, axis=1).max(axis=1)  # type: ignore
-    else:
-        return np.max(prepared_args)
+    if index is None:
+        return np.max(stacked)
+
+    # fmax ignores NaN unless every value is NaN
+    return pd.Series(np.fmax.reduce(stacked, axis=0), index=index)
 
 
 def element_wise_std(
     *args: t.Union[pd.Series, int, float],
 ) -> t.Union[pd.Series, int, float]:
-    prepared_args, is_series_op = _prepare_element_wise_args(*args)
+    stacked, index = _stack_element_wise_args(*args)
+
+    if index is None:
+        return np.std(stacked)  # type: ignore
+
+    # Sample standard deviation (ddof=1) over the non-missing values, like pandas.
+    stacked = stacked.astype("float64", copy=False)
+    valid = ~np.isnan(stacked)
+    count = np.count_nonzero(valid, axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(stacked, axis=0) / count
+        squared_deviation = np.where(valid, (stacked - mean) ** 2, 0.0)
+        variance = squared_deviation.sum(axis=0) / (count - 1)
+
+    return pd.Series(np.where(count > 1, np.sqrt(variance), np.nan), index=index)
+
+
+# Every value 0-999 as a digit group, unpadded and zero padded
+_DIGIT_GROUPS = np.array([str(i) for i in range(1000)], dtype=object)
+_PADDED_DIGIT_GROUPS = np.array([f"{i:03d}" for i in range(1000)], dtype=object)
+
+
+@functools.lru_cache(maxsize=32)
+def _fraction_suffixes(decimal_places: int, is_percentage: bool) -> np.ndarray:
+    # Every possible fractional part, with the percent sign already appended
+    percent = "%" if is_percentage else ""
+
+    if decimal_places == 0:
+        return np.array([percent], dtype=object)
+
+    return np.array(
+        [f".{i:0{decimal_places}d}{percent}" for i in range(10**decimal_places)],
+        dtype=object,
+    )
+
+
+def _integer_text(values: np.ndarray, use_thousand_sep: bool) -> np.ndarray:
+    if not use_thousand_sep:
+        return values.astype(str).astype(object)
+
+    text = _DIGIT_GROUPS[values % 1000]
+
+    # Only the rows with more digit groups are visited again.
+    rows = np.flatnonzero(values >= 1000)
+    text[rows] = _PADDED_DIGIT_GROUPS[values[rows] % 1000]
+    remaining = values[rows] // 1000
+
+    while len(rows):
+        has_more = remaining >= 1000
+        group = np.where(
+            has_more,
+            _PADDED_DIGIT_GROUPS[remaining % 1000],
+            _DIGIT_GROUPS[remaining % 1000],
+        )
+        text[rows] = group + "," + text[rows]
+
+        rows = rows[has_more]
+        remaining = remaining[has_more] // 1000
+
+    return text
+
+
+def format_values(
+    values: np.ndarray,
+    decimal_places: int,
+    use_thousand_sep: bool,
+    is_percentage: bool,
+) -> np.ndarray:
+    """
+    Vectorized counterpart of `Metric.format`: formats every value of an array of
+    any shape with the same spec. Missing values are kept as NaN.
+
+    Values are rounded as scaled integers and assembled from precomputed digit
+    groups. Values close to a rounding tie or too large for exact integers are
+    formatted one by one, so the output always matches `str.format`.
+    """
+
+    values = np.asarray(values, dtype="float64")
+    result = np.full(values.shape, np.nan, dtype=object)
+    present = ~np.isnan(values)
 
-    if is_series_op:
-        return pd.concat(prepared_args, axis=1).std(axis=1)  # type: ignore
+    formatter = f"{{:{',' if use_thousand_sep else ''}.{decimal_places}f}}{'%' if is_percentage else ''}"
+    unit = 10**decimal_places
+
+    with np.errstate(invalid="ignore", over="ignore"):
+        scaled = np.abs(values) * unit
+        distance_to_tie = np.abs(scaled - np.floor(scaled) - 0.5)
+        exact = present & (scaled < 2**53) & (distance_to_tie > 1e-6)
+
+    fallback = present & ~exact
+    if fallback.any():
+        result[fallback] = [formatter.format(value) for value in values[fallback]]
+
+    if not exact.any():
+        return result
+
+    rounded = np.round(scaled[exact]).astype(np.int64)
+
+    text = _integer_text(rounded // unit, use_thousand_sep)
+
+    negative = np.flatnonzero(np.signbit(values[exact]))
+    text[negative] = "-" + text[negative]
+
+    if decimal_places <= 4:
+        text = text + _fraction_suffixes(decimal_places, is_percentage)[rounded % unit]
     else:
-        return np.std(prepared_args)  # type: ignore
+        fraction = np.strings.zfill((rounded % unit).astype(str), decimal_places)
+        text = text + ("." + fraction.astype(object))
+
+        if is_percentage:
+            text = text + "%"
+
+    result[exact] = text
+
+    return result
 
 
 class MetricQueryValidator(ast.NodeVisitor):
@@ -158,6 +305,12 @@ class MetricQueryValidator(ast.NodeVisitor):
 
     # 'quantile' must be scalar
 
+    # Methods that can be answered from a quantile sketch
+    sketchable_series_methods = {
+        "median",
+        "quantile",
+    }
+
     allowed_operators = (
         ast.Add,
         ast.Sub,
@@ -171,8 +324,12 @@ class MetricQueryValidator(ast.NodeVisitor):
     allowed_names = ["__MISSING__"]
     allowed_series_attributes = ["size"]
 
+    # `metric('Name')` evaluates to the value of another metric on the same rows
+    metric_function = "metric"
+
     def __init__(self, placeholder_map: dict[str, str]):
         self.found_columns: set[str] = set()
+        self.found_metrics: set[str] = set()
         self.placeholder_map = placeholder_map
 
     def _resolve_and_add_name(self, identifier: str):
@@ -211,6 +368,21 @@ class MetricQueryValidator(ast.NodeVisitor):
         # In a function call `f(arg)`, `f` is the function and `arg` is the potential column.
         # We visit the arguments, but we avoid visiting `node.func` if it is a simple name
         # to prevent adding function names like 'sin' to our column list.
+        if isinstance(node.func, ast.Name) and node.func.id == self.metric_function:
+            if (
+                len(node.args) != 1
+                or node.keywords
+                or not isinstance(node.args[0], ast.Constant)
+                or not isinstance(node.args[0].value, str)
+            ):
+                raise ValueError(
+                    f"{self.metric_function}() takes the name of a metric as its only"
+                    f" argument, e.g. {self.metric_function}('Volume')."
+                )
+
+            self.found_metrics.add(node.args[0].value)
+            return
+
         if isinstance(node.func, ast.Name):
             if node.func.id not in self.allowed_functions:
                 raise ValueError(f"Unsupported function: {node.func.id}")
@@ -247,6 +419,10 @@ class MetricQueryValidator(ast.NodeVisitor):
 
         if isinstance(expr_node, ast.Call):
             if isinstance(expr_node.func, ast.Name):
+                # Arguments of `metric()` are checked when visiting the call
+                if expr_node.func.id == self.metric_function:
+                    return True
+
                 return all(self.is_result_scalar(arg) for arg in expr_node.args)
             elif isinstance(expr_node.func, ast.Attribute):
                 func_name = expr_node.func.attr
@@ -268,6 +444,183 @@ class MetricQueryValidator(ast.NodeVisitor):
         return False
 
 
+class QuantileSketchTransformer(ast.NodeTransformer):
+    """Rewrites `.median()` and `.quantile(q)` calls into sketch-based quantiles."""
+
+    function_name = "__SKETCH_QUANTILE__"
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+
+        if not (
+            isinstance(node.func, ast.Attribute)
+            and node.func.attr in MetricQueryValidator.sketchable_series_methods
+        ):
+            return node
+
+        q: ast.expr = ast.Constant(0.5)
+
+        if node.func.attr == "quantile":
+            if node.args:
+                q = node.args[0]
+
+            for kw in node.keywords:
+                if kw.arg == "q":
+                    q = kw.value
+
+        return ast.Call(
+            func=ast.Name(id=self.function_name, ctx=ast.Load()),
+            args=[node.func.value, q],
+            keywords=[],
+        )
+
+
+class PlaceholderCanonicalizer(ast.NodeTransformer):
+    """Replaces per-metric backtick placeholders with the original column names."""
+
+    def __init__(self, placeholder_map: dict[str, str]):
+        self.placeholder_map = placeholder_map
+
+    def visit_Name(self, node: ast.Name):
+        if node.id in self.placeholder_map:
+            return ast.Name(id=f"`{self.placeholder_map[node.id]}`", ctx=node.ctx)
+
+        return node
+
+    def canonical_key(self, node: ast.AST) -> str:
+        """Text of `node` that is the same for every metric using the same columns."""
+
+        copied = ast.parse(ast.unparse(node), mode="eval").body
+        return ast.unparse(self.visit(copied))
+
+
+class SharedReductionTransformer(ast.NodeTransformer):
+    """
+    Wraps every reduction in `__SHARED__(key, lambda: reduction)`, keyed by its
+    canonical text, so that the metrics evaluated on the same rows compute each
+    reduction (e.g. `` `bal`.sum() ``) only once.
+    """
+
+    function_name = "__SHARED__"
+
+    def __init__(self, placeholder_map: dict[str, str]):
+        self.canonicalizer = PlaceholderCanonicalizer(placeholder_map)
+
+    def __wrap(self, key: str, node: ast.expr) -> ast.Call:
+        return ast.Call(
+            func=ast.Name(id=self.function_name, ctx=ast.Load()),
+            args=[
+                ast.Constant(key),
+                ast.Lambda(
+                    args=ast.arguments(
+                        posonlyargs=[],
+                        args=[],
+                        kwonlyargs=[],
+                        kw_defaults=[],
+                        defaults=[],
+                    ),
+                    body=node,
+                ),
+            ],
+            keywords=[],
+        )
+
+    def visit_Call(self, node: ast.Call):
+        is_reduction = (
+            isinstance(node.func, ast.Attribute)
+            and node.func.attr in MetricQueryValidator.allowed_series_methods
+        )
+        key = self.canonicalizer.canonical_key(node) if is_reduction else None
+
+        self.generic_visit(node)
+
+        return node if key is None else self.__wrap(key, node)
+
+    def visit_Attribute(self, node: ast.Attribute):
+        if node.attr not in MetricQueryValidator.allowed_series_attributes:
+            return self.generic_visit(node)
+
+        key = self.canonicalizer.canonical_key(node)
+        self.generic_visit(node)
+
+        return self.__wrap(key, node)
+
+
+def metric_evaluation_order(metrics: t.Iterable["Metric"]) -> list["Metric"]:
+    """
+    Orders the metrics and the metrics they reference (transitively) so that every
+    metric comes after the metrics it references. Raises `ValueError` on a cycle.
+    """
+
+    ordered: dict[str, Metric] = {}
+    visiting: list[str] = []
+
+    def visit(metric: Metric):
+        if metric.name in ordered:
+            return
+
+        if metric.name in visiting:
+            cycle = visiting[visiting.index(metric.name) :] + [metric.name]
+            raise ValueError(f"Circular metric reference: {' -> '.join(cycle)}")
+
+        visiting.append(metric.name)
+        for reference in metric.references.values():
+            visit(reference)
+        visiting.pop()
+
+        ordered[metric.name] = metric
+
+    for metric in metrics:
+        visit(metric)
+
+    return list(ordered.values())
+
+
+# (processed query, placeholder map, used columns, referenced metrics)
+ParsedQuery = tuple[str, dict[str, str], tuple[str, ...], tuple[str, ...]]
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_query(query: str) -> ParsedQuery:
+    """
+    Parses and statically validates a metric query. The result only depends on
+    the query text, so it is cached; callers must not mutate the placeholder map.
+    """
+
+    # --- 1. Preprocess Backticked Identifiers ---
+    # This allows parsing names with spaces or special characters.
+    backticked_map: dict[str, str] = {}
+
+    def replace_backtick(match: re.Match[str]) -> str:
+        name_inside_ticks = match.group(1)
+        placeholder = f"__BACKTICKED__{len(backticked_map)}__"
+        backticked_map[placeholder] = name_inside_ticks
+        return placeholder
+
+    processed_expression = re.sub(r"`([^`]+)`", replace_backtick, query)
+
+    # --- 2. Parse and Validate Structure & Semantics ---
+    expr_node = ast.parse(processed_expression, mode="eval").body
+
+    # --- 3. Validate Query Structure ---
+    validator = MetricQueryValidator(backticked_map)
+
+    if not validator.is_result_scalar(expr_node):
+        node_type_name = type(expr_node).__name__
+        raise ValueError(
+            f"Expression does not appear to be a scalar value; top-level operation is '{node_type_name}'."
+        )
+
+    validator.visit(expr_node)
+
+    return (
+        processed_expression,
+        validator.placeholder_map,
+        tuple(sorted(validator.found_columns)),
+        tuple(sorted(validator.found_metrics)),
+    )
+
+
 class Metric:
     def __init__(
         self,
@@ -278,6 +631,7 @@ class Metric:
         use_thousand_sep: bool = True,
         is_percentage: bool = False,
         decimal_places: int = 2,
+        approximate: bool = False,
     ) -> None:
         self.uid: MetricID = uid
         self.name: str = name
@@ -288,14 +642,97 @@ class Metric:
         self.use_thousand_sep: bool = use_thousand_sep
         self.is_percentage: bool = is_percentage
         self.decimal_places: int = decimal_places
+        self.approximate: bool = approximate
 
         self.processed_query: str = query
         self.placeholder_map: dict[str, str] = {}
 
+        # Names of the metrics used through `metric('Name')`, and the metrics
+        # themselves as resolved by the repository.
+        self.referenced_metrics: list[str] = []
+        self.references: dict[str, Metric] = {}
+
+        self.__approximate_query: tuple[str, str] | None = None
+        self.__shared_query: tuple[str, str] | None = None
+        self.__uses_quantiles: tuple[str, bool] | None = None
+
     @property
     def pretty_name(self):
         return self.name
 
+    @property
+    def uses_quantiles(self) -> bool:
+        if (
+            self.__uses_quantiles is None
+            or self.__uses_quantiles[0] != self.processed_query
+        ):
+            try:
+                expr_node = ast.parse(self.processed_query, mode="eval")
+            except SyntaxError:
+                uses_quantiles = False
+            else:
+                uses_quantiles = any(
+                    isinstance(node, ast.Call)
+                    and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in MetricQueryValidator.sketchable_series_methods
+                    for node in ast.walk(expr_node)
+                )
+
+            self.__uses_quantiles = (self.processed_query, uses_quantiles)
+
+        return self.__uses_quantiles[1]
+
+    @property
+    def rank_error(self) -> float | None:
+        """Rank error of the approximated quantiles, or None if nothing is approximated."""
+
+        if not self.approximate or not self.uses_quantiles:
+            return None
+
+        return KLLSketch.normalized_rank_error(DEFAULT_SKETCH_K)
+
+    @property
+    def sketch_query(self) -> str:
+        """
+        The processed query, with quantiles answered from sketches if approximate.
+        Only used where the statistics of partial rows are merged (see
+        `MetricDecomposition`); rows evaluated together use exact quantiles.
+        """
+
+        if not self.approximate:
+            return self.processed_query
+
+        if (
+            self.__approximate_query is None
+            or self.__approximate_query[0] != self.processed_query
+        ):
+            expr_node = QuantileSketchTransformer().visit(
+                ast.parse(self.processed_query, mode="eval")
+            )
+            self.__approximate_query = (
+                self.processed_query,
+                ast.unparse(ast.fix_missing_locations(expr_node)),
+            )
+
+        return self.__approximate_query[1]
+
+    @property
+    def shared_query(self) -> str:
+        """The processed query, with its reductions shared through `__SHARED__`."""
+
+        processed_query = self.processed_query
+
+        if self.__shared_query is None or self.__shared_query[0] != processed_query:
+            expr_node = SharedReductionTransformer(self.placeholder_map).visit(
+                ast.parse(processed_query, mode="eval")
+            )
+            self.__shared_query = (
+                processed_query,
+                ast.unparse(ast.fix_missing_locations(expr_node)),
+            )
+
+        return self.__shared_query[1]
+
     def to_dict(self) -> MetricJSON:
         return MetricJSON(
             uid=self.uid,
@@ -306,6 +743,8 @@ class Metric:
             use_thousand_sep=self.use_thousand_sep,
             is_percentage=self.is_percentage,
             decimal_places=self.decimal_places,
+            approximate=self.approximate,
+            referenced_metrics=self.referenced_metrics,
             processed_query=self.processed_query,
             placeholder_map=self.placeholder_map,
         )
@@ -320,9 +759,11 @@ class Metric:
             use_thousand_sep=data.use_thousand_sep,
             is_percentage=data.is_percentage,
             decimal_places=data.decimal_places,
+            approximate=data.approximate,
         )
 
         instance.used_columns = data.used_columns
+        instance.referenced_metrics = data.referenced_metrics
         instance.processed_query = data.processed_query
         instance.placeholder_map = data.placeholder_map
         return instance
@@ -334,42 +775,68 @@ class Metric:
         formatter = f"{{:{',' if self.use_thousand_sep else ''}.{self.decimal_places}f}}{'%' if self.is_percentage else ''}"
         return formatter.format(value)
 
-    def validate_query(self, data: pd.DataFrame) -> None:
-        # --- 1. Preprocess Backticked Identifiers ---
-        # This allows parsing names with spaces or special characters.
-        backticked_map: dict[str, str] = {}
+    @t.overload
+    def format_values(self, values: pd.Series) -> pd.Series: ...
 
-        def replace_backtick(match: re.Match[str]) -> str:
-            name_inside_ticks = match.group(1)
-            placeholder = f"__BACKTICKED__{len(backticked_map)}__"
-            backticked_map[placeholder] = name_inside_ticks
-            return placeholder
+    @t.overload
+    def format_values(self, values: pd.DataFrame) -> pd.DataFrame: ...
 
-        processed_expression = re.sub(r"`([^`]+)`", replace_backtick, self.query)
+    def format_values(self, values: pd.Series | pd.DataFrame):
+        formatted = format_values(
+            values.to_numpy(dtype="float64", na_value=np.nan),
+            decimal_places=self.decimal_places,
+            use_thousand_sep=self.use_thousand_sep,
+            is_percentage=self.is_percentage,
+        )
 
-        # --- 2. Parse and Validate Structure & Semantics ---
-        expr_node = ast.parse(processed_expression, mode="eval").body
+        if isinstance(values, pd.DataFrame):
+            return pd.DataFrame(formatted, index=values.index, columns=values.columns)
 
-        # --- 3. Validate Query Structure ---
-        validator = MetricQueryValidator(backticked_map)
+        return pd.Series(formatted, index=values.index, name=values.name)
 
-        if not validator.is_result_scalar(expr_node):
-            node_type_name = type(expr_node).__name__
+    def resolve_references(self, available_metrics: t.Mapping[str, "Metric"]) -> None:
+        missing_metrics = sorted(
+            name for name in self.referenced_metrics if name not in available_metrics
+        )
+        if missing_metrics:
             raise ValueError(
-                f"Expression does not appear to be a scalar value; top-level operation is '{node_type_name}'."
+                f"Following metrics are not found: {', '.join(missing_metrics)}"
             )
 
-        validator.visit(expr_node)
+        self.references = {
+            name: available_metrics[name] for name in self.referenced_metrics
+        }
+
+        metric_evaluation_order([self])
+
+    def validate_query(
+        self,
+        data: pd.DataFrame,
+        available_metrics: t.Mapping[str, "Metric"] | None = None,
+    ) -> None:
+        # --- 1-3. Parse and Validate Structure & Semantics ---
+        processed_expression, placeholder_map, used_columns, referenced_metrics = (
+            parse_query(self.query)
+        )
 
         # --- 4. Extract Column Names and Functions if Structurally Valid ---
-        self.used_columns = sorted(list(validator.found_columns))
-        self.placeholder_map = validator.placeholder_map
+        self.used_columns = list(used_columns)
+        self.placeholder_map = dict(placeholder_map)
         self.processed_query = processed_expression
+        self.referenced_metrics = list(referenced_metrics)
+
+        # --- 4.1 Resolve Referenced Metrics and Check for Cycles ---
+        self.resolve_references(available_metrics or {})
 
         # --- 5. Check Against List of Available Columns ---
         available_columns = data.columns.to_list()
         available_set = set(available_columns)
-        used_set = set(self.used_columns)
+        used_set = set(self.used_columns).union(
+            *(
+                reference.used_columns
+                for reference in metric_evaluation_order(self.references.values())
+            )
+        )
         missing_columns = sorted(list(used_set - available_set))
         if missing_columns:
             raise ValueError(
@@ -382,7 +849,11 @@ class Metric:
         if not np.isscalar(result):
             raise ValueError("The result of the metric query must be a scalar value.")
 
-    def calculate(self, data: pd.DataFrame):
+    def create_scope(
+        self,
+        data: pd.DataFrame,
+        metric_values: t.Mapping[str, float] | None = None,
+    ) -> dict[str, t.Any]:
         # Local scope for eval
         scope: dict[
             str,
@@ -403,17 +874,68 @@ class Metric:
         scope["max"] = element_wise_max
         scope["std"] = element_wise_std
 
+        # Referenced metrics, computed on the same rows unless given
+        def metric_value(name: str) -> float:
+            if metric_values is not None and name in metric_values:
+                return metric_values[name]
+
+            if name in self.references:
+                return self.references[name].evaluate(data)
+
+            return MISSING
+
+        scope[MetricQueryValidator.metric_function] = metric_value
+
+        return scope
+
+    def calculate(
+        self,
+        data: pd.DataFrame,
+        metric_values: t.Mapping[str, float] | None = None,
+        shared: dict[str, t.Any] | None = None,
+    ) -> float:
+        """The value of `evaluate`, scaled by 100 for percentages."""
+
+        result = self.evaluate(data, metric_values, shared)
+
+        return result * 100 if self.is_percentage else result
+
+    def evaluate(
+        self,
+        data: pd.DataFrame,
+        metric_values: t.Mapping[str, float] | None = None,
+        shared: dict[str, t.Any] | None = None,
+    ) -> float:
+        """
+        Evaluates the metric on `data`, without the percentage scaling; this is the
+        value other metrics see. `metric_values` are the values of the referenced
+        metrics. `shared` holds the reductions of the metrics evaluated on the same
+        rows; reductions found in it are not computed again.
+        """
+
+        scope = self.create_scope(data, metric_values)
+
         with np.errstate(invalid="ignore", divide="ignore"):
-            result = eval(self.processed_query, {"__builtins__": {}}, scope)
+            if shared is None:
+                result = eval(self.processed_query, {"__builtins__": {}}, scope)
+            else:
+
+                def shared_value(key: str, compute: t.Callable[[], t.Any]):
+                    if key not in shared:
+                        shared[key] = compute()
+
+                    return shared[key]
+
+                scope[SharedReductionTransformer.function_name] = shared_value
+
+                # Lambdas resolve names in the globals, so the scope goes there.
+                result = eval(self.shared_query, {"__builtins__": {}, **scope})
 
         if not np.isscalar(result) or not isinstance(result, (int, float, np.number)):
             raise ValueError(
                 f"The result of the metric query must be a scalar value.\nResult:\n{result}"
             )
 
-        if self.is_percentage:
-            result *= 100
-
         return float(result)
 
     def duplicate(self, uid: MetricID | None = None, name: str | None = None):
@@ -430,9 +952,12 @@ class Metric:
             use_thousand_sep=self.use_thousand_sep,
             is_percentage=self.is_percentage,
             decimal_places=self.decimal_places,
+            approximate=self.approximate,
         )
 
         new_metric.used_columns = self.used_columns.copy()
+        new_metric.referenced_metrics = self.referenced_metrics.copy()
+        new_metric.references = self.references.copy()
         new_metric.processed_query = self.processed_query
         new_metric.placeholder_map = self.placeholder_map.copy()
 
@@ -544,6 +1069,8 @@ class Volume(Metric):
 __all__ = [
     "MetricQueryValidator",
     "Metric",
+    "metric_evaluation_order",
+    "parse_query",
     "UnitBadRate",
     "DollarBadRate",
     "Volume",
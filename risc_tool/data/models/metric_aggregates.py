@@ -0,0 +1,518 @@
+import ast
+import typing as t
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from risc_tool.data.models.metric import (
+    MISSING,
+    Metric,
+    MetricQueryValidator,
+    PlaceholderCanonicalizer,
+    QuantileSketchTransformer,
+)
+from risc_tool.data.models.quantile_sketch import DEFAULT_SKETCH_K, KLLSketch
+
+AggregateStat = t.Literal["sum", "count", "size", "sketch"]
+
+# (canonical receiver expression, statistic). The receiver of `size` is irrelevant,
+# so every `.size` in every metric shares the same term. `sketch` terms hold one
+# `KLLSketch` per segment instead of a number.
+AggregateTerm = tuple[str, AggregateStat]
+
+SIZE_TERM: AggregateTerm = ("", "size")
+
+DEFAULT_CONFIDENCE_LEVEL = 0.95
+DEFAULT_BOOTSTRAP_REPLICATES = 200
+DEFAULT_BOOTSTRAP_BUCKETS = 128
+
+
+class MetricDecomposition:
+    """
+    Rewrites a metric query as an arithmetic expression over additive per-segment
+    statistics (sums, non-null counts and row counts of row-wise expressions).
+
+    A query is decomposable when its top level only combines constants,
+    `__MISSING__` and the reductions `.sum()`, `.count()`, `.mean()` and `.size`,
+    and when every reduced expression is itself row-wise (no nested reductions).
+    Approximate metrics may also use `.median()` and `.quantile(q)` with a constant
+    `q`, which are answered from mergeable quantile sketches.
+    Such metrics can be evaluated for all segments at once from the statistics held
+    in a `SegmentAggregates`, and kept up to date when rows move between segments.
+    """
+
+    reductions = {
+        "sum": ("sum",),
+        "count": ("count",),
+        "mean": ("sum", "count"),
+    }
+
+    def __init__(self, metric: Metric):
+        self.metric = metric
+        self.terms: list[AggregateTerm] = []
+        self.receivers: dict[str, ast.expr] = {}
+        self.is_decomposable: bool = False
+
+        self.__expression: t.Any = None
+
+        try:
+            expr_node = ast.parse(metric.sketch_query, mode="eval").body
+            rewritten = self.__rewrite(expr_node)
+        except (SyntaxError, ValueError):
+            self.terms.clear()
+            self.receivers.clear()
+            return
+
+        self.__expression = compile(
+            ast.fix_missing_locations(ast.Expression(body=rewritten)),
+            filename="<metric>",
+            mode="eval",
+        )
+        self.is_decomposable = True
+
+    def __term_name(self, term: AggregateTerm) -> ast.Name:
+        if term not in self.terms:
+            self.terms.append(term)
+
+        return ast.Name(id=f"__TERM_{self.terms.index(term)}__", ctx=ast.Load())
+
+    def __is_row_wise(self, node: ast.AST) -> bool:
+        if isinstance(node, ast.Name):
+            return node.id in self.metric.placeholder_map or node.id == "__MISSING__"
+
+        if isinstance(node, ast.Constant):
+            return True
+
+        if isinstance(node, ast.BinOp):
+            return self.__is_row_wise(node.left) and self.__is_row_wise(node.right)
+
+        if isinstance(node, ast.UnaryOp):
+            return self.__is_row_wise(node.operand)
+
+        if isinstance(node, ast.Compare):
+            return all(
+                self.__is_row_wise(operand)
+                for operand in [node.left] + node.comparators
+            )
+
+        if isinstance(node, ast.Call):
+            return (
+                isinstance(node.func, ast.Name)
+                and node.func.id in MetricQueryValidator.allowed_functions
+                and not node.keywords
+                and all(self.__is_row_wise(arg) for arg in node.args)
+            )
+
+        return False
+
+    def __receiver_key(self, receiver: ast.expr) -> str:
+        if not self.__is_row_wise(receiver) or not any(
+            isinstance(node, ast.Name) and node.id in self.metric.placeholder_map
+            for node in ast.walk(receiver)
+        ):
+            raise ValueError("Reduction is not applied on a row-wise expression.")
+
+        key = PlaceholderCanonicalizer(self.metric.placeholder_map).canonical_key(
+            receiver
+        )
+        self.receivers.setdefault(key, receiver)
+
+        return key
+
+    def __rewrite(self, node: ast.expr) -> ast.expr:
+        if isinstance(node, ast.Constant):
+            return node
+
+        if isinstance(node, ast.Name) and node.id == "__MISSING__":
+            return node
+
+        if isinstance(node, ast.BinOp) and isinstance(
+            node.op, MetricQueryValidator.allowed_operators
+        ):
+            return ast.BinOp(
+                left=self.__rewrite(node.left),
+                op=node.op,
+                right=self.__rewrite(node.right),
+            )
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            return ast.UnaryOp(op=node.op, operand=self.__rewrite(node.operand))
+
+        if (
+            isinstance(node, ast.Attribute)
+            and node.attr in MetricQueryValidator.allowed_series_attributes
+        ):
+            self.__receiver_key(node.value)
+            return self.__term_name(SIZE_TERM)
+
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr in self.reductions
+            and not node.args
+            and not node.keywords
+        ):
+            key = self.__receiver_key(node.func.value)
+            stats = self.reductions[node.func.attr]
+
+            if len(stats) == 1:
+                return self.__term_name((key, stats[0]))
+
+            return ast.BinOp(
+                left=self.__term_name((key, stats[0])),
+                op=ast.Div(),
+                right=self.__term_name((key, stats[1])),
+            )
+
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id == QuantileSketchTransformer.function_name
+            and len(node.args) == 2
+            and isinstance(node.args[1], ast.Constant)
+            and isinstance(node.args[1].value, (int, float))
+        ):
+            key = self.__receiver_key(node.args[0])
+
+            return ast.Call(
+                func=ast.Name(id="__QUANTILE__", ctx=ast.Load()),
+                args=[self.__term_name((key, "sketch")), node.args[1]],
+                keywords=[],
+            )
+
+        raise ValueError(f"Unsupported node for decomposition: {ast.dump(node)}")
+
+    def evaluate_receivers(self, data: pd.DataFrame) -> dict[str, pd.Series]:
+        scope = self.metric.create_scope(data)
+        receiver_values: dict[str, pd.Series] = {}
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for key, receiver in self.receivers.items():
+                value = eval(
+                    compile(ast.Expression(body=receiver), "<receiver>", "eval"),
+                    {"__builtins__": {}},
+                    scope,
+                )
+
+                if not isinstance(value, pd.Series):
+                    value = pd.Series(value, index=data.index)
+
+                receiver_values[key] = value
+
+        return receiver_values
+
+    def evaluate(
+        self, stats: dict[AggregateTerm, np.ndarray], length: int
+    ) -> np.ndarray:
+        if not self.is_decomposable:
+            raise ValueError(f"Metric {self.metric.name} is not decomposable.")
+
+        scope: dict[str, t.Any] = {
+            "__MISSING__": MISSING,
+            "__QUANTILE__": _sketch_quantiles,
+        }
+
+        for i, term in enumerate(self.terms):
+            scope[f"__TERM_{i}__"] = stats[term]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = eval(self.__expression, {"__builtins__": {}}, scope)
+
+        result = np.broadcast_to(np.asarray(result, dtype="float64"), (length,)).copy()
+
+        if self.metric.is_percentage:
+            result = result * 100
+
+        return result
+
+
+def _sketch_quantiles(sketches: np.ndarray, q: float) -> np.ndarray:
+    return np.array([sketch.quantile(q) for sketch in sketches], dtype="float64")
+
+
+class SegmentAggregates:
+    """
+    Additive per-segment statistics of row-wise expressions.
+
+    Rows are assigned to `n_segments` segments through their codes; rows that pass
+    the mask but have no segment are kept in an extra bucket so that the total over
+    all rows can still be derived. Rows outside the mask never contribute.
+
+    When rows change segment, `move_rows` subtracts their contribution from the old
+    segment and adds it to the new one, so the update costs time proportional to
+    the number of moved rows rather than the number of rows in the data. Quantile
+    sketches can not be subtracted from, so only the sketches of the segments that
+    lost or gained rows are rebuilt.
+
+    Confidence intervals are bootstrapped from the same statistics: rows are
+    spread over a fixed number of random buckets, and every replicate re-weights
+    the buckets of each segment with Poisson(1) weights instead of resampling rows.
+
+    With row `weights` (e.g. sampling weights), sums, counts and sizes are weighted
+    sums, so means become weighted means. Quantile sketches stay unweighted.
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        n_segments: int,
+        row_mask: np.ndarray,
+        weights: np.ndarray | None = None,
+    ):
+        self.n_segments = n_segments
+
+        self.__row_mask = np.asarray(row_mask, dtype=bool)
+        self.__codes = self.__bucket_codes(np.asarray(codes), self.__row_mask)
+        self.__weights: np.ndarray | None = None
+        if weights is not None:
+            self.__weights = np.nan_to_num(np.asarray(weights, dtype="float64"))
+        self.__values: dict[str, np.ndarray] = {}
+        self.__valid: dict[str, np.ndarray] = {}
+        self.__bootstrap_buckets: dict[int, np.ndarray] = {}
+
+        self.stats: dict[AggregateTerm, np.ndarray] = {
+            SIZE_TERM: self.__reduce(SIZE_TERM, self.__codes)
+        }
+
+    def __bucket_codes(self, codes: np.ndarray, row_mask: np.ndarray) -> np.ndarray:
+        bucketed = np.where(
+            (codes >= 0) & (codes < self.n_segments), codes, self.n_segments
+        )
+        return np.where(row_mask, bucketed, -1).astype(np.int64)
+
+    def __reduce(
+        self,
+        term: AggregateTerm,
+        codes: np.ndarray,
+        positions: np.ndarray | None = None,
+        minlength: int | None = None,
+    ) -> np.ndarray:
+        receiver, stat = term
+
+        row_weights = self.__weights
+        if row_weights is not None and positions is not None:
+            row_weights = row_weights[positions]
+
+        if stat == "size":
+            weights = row_weights
+        else:
+            valid = self.__valid[receiver]
+            if positions is not None:
+                valid = valid[positions]
+
+            if stat == "count":
+                weights = valid.astype("float64")
+            else:
+                values = self.__values[receiver]
+                if positions is not None:
+                    values = values[positions]
+
+                weights = np.where(valid, values, 0.0)
+
+            if row_weights is not None:
+                weights = weights * row_weights
+
+        included = codes >= 0
+        if weights is not None:
+            weights = weights[included]
+
+        return np.bincount(
+            codes[included],
+            weights=weights,
+            minlength=self.n_segments + 1 if minlength is None else minlength,
+        ).astype("float64")
+
+    def __sketch(self, receiver: str, buckets: np.ndarray | None = None) -> np.ndarray:
+        values = self.__values[receiver]
+        codes = self.__codes
+
+        if buckets is None:
+            buckets = np.arange(self.n_segments + 1)
+
+        rows = np.isin(codes, buckets) & self.__valid[receiver]
+        rows = np.flatnonzero(rows)
+
+        # A single stable sort groups the rows of every bucket together.
+        rows = rows[np.argsort(codes[rows], kind="stable")]
+        bounds = np.searchsorted(codes[rows], buckets)
+        ends = np.searchsorted(codes[rows], buckets, side="right")
+
+        sketches = np.empty(len(buckets), dtype=object)
+        for i, (start, end) in enumerate(zip(bounds, ends)):
+            sketch = KLLSketch(k=DEFAULT_SKETCH_K)
+            sketch.update(values[rows[start:end]])
+            sketches[i] = sketch
+
+        return sketches
+
+    def has_terms(self, terms: t.Iterable[AggregateTerm]) -> bool:
+        return all(term in self.stats for term in terms)
+
+    def add_terms(
+        self, terms: t.Iterable[AggregateTerm], receiver_values: dict[str, pd.Series]
+    ) -> None:
+        for term in terms:
+            if term in self.stats:
+                continue
+
+            receiver, stat = term
+
+            if receiver not in self.__valid:
+                series = receiver_values[receiver]
+                self.__valid[receiver] = series.notna().to_numpy(dtype=bool)
+
+                try:
+                    self.__values[receiver] = series.to_numpy(
+                        dtype="float64", na_value=np.nan
+                    )
+                except (TypeError, ValueError):
+                    if stat in ("sum", "sketch"):
+                        raise ValueError(
+                            f"Expression {receiver} is not numeric."
+                        ) from None
+
+            if stat in ("sum", "sketch") and receiver not in self.__values:
+                raise ValueError(f"Expression {receiver} is not numeric.")
+
+            if stat == "sketch":
+                self.stats[term] = self.__sketch(receiver)
+            else:
+                self.stats[term] = self.__reduce(term, self.__codes)
+
+    def move_rows(self, positions: np.ndarray, new_codes: np.ndarray) -> None:
+        positions = np.asarray(positions, dtype=np.int64)
+        new_codes = self.__bucket_codes(
+            np.asarray(new_codes), self.__row_mask[positions]
+        )
+        old_codes = self.__codes[positions]
+
+        changed = old_codes != new_codes
+        positions = positions[changed]
+        new_codes = new_codes[changed]
+        old_codes = old_codes[changed]
+
+        if len(positions) == 0:
+            return
+
+        for term, values in self.stats.items():
+            if term[1] == "sketch":
+                continue
+
+            values -= self.__reduce(term, old_codes, positions)
+            values += self.__reduce(term, new_codes, positions)
+
+        self.__codes[positions] = new_codes
+
+        touched = np.union1d(old_codes, new_codes)
+        touched = touched[touched >= 0]
+
+        for term, values in self.stats.items():
+            if term[1] == "sketch":
+                values[touched] = self.__sketch(term[0], touched)
+
+    def __bucketed_stats(self, term: AggregateTerm, n_buckets: int) -> np.ndarray:
+        # Rows keep their bucket when they move between segments.
+        if n_buckets not in self.__bootstrap_buckets:
+            rng = np.random.default_rng(n_buckets)
+            self.__bootstrap_buckets[n_buckets] = rng.integers(
+                n_buckets, size=len(self.__codes), dtype=np.int32
+            )
+
+        buckets = self.__bootstrap_buckets[n_buckets]
+        codes = np.where(self.__codes >= 0, self.__codes * n_buckets + buckets, -1)
+
+        return self.__reduce(
+            term, codes, minlength=(self.n_segments + 1) * n_buckets
+        ).reshape(self.n_segments + 1, n_buckets)
+
+    def bootstrap_intervals(
+        self,
+        decomposition: MetricDecomposition,
+        confidence: float = DEFAULT_CONFIDENCE_LEVEL,
+        n_replicates: int = DEFAULT_BOOTSTRAP_REPLICATES,
+        n_buckets: int = DEFAULT_BOOTSTRAP_BUCKETS,
+        seed: int = 0,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Percentile bootstrap confidence intervals of the metric for every segment,
+        followed by the total over all rows in the mask.
+
+        The statistics are computed once per (segment, bucket); every replicate is
+        a weighted sum of these, so the replicates cost about as much as a single
+        aggregation pass. Segments with fewer rows than buckets are resampled row
+        by row. Returns the lower and upper bounds, `NaN` where undefined.
+        """
+
+        if any(term[1] == "sketch" for term in decomposition.terms):
+            raise ValueError(
+                "Confidence intervals are not available for approximate quantiles."
+            )
+
+        rng = np.random.default_rng(seed)
+        weights = rng.poisson(
+            1.0, size=(n_replicates, self.n_segments + 1, n_buckets)
+        ).astype("float64")
+
+        segment_stats: dict[AggregateTerm, np.ndarray] = {}
+        total_stats: dict[AggregateTerm, np.ndarray] = {}
+
+        for term in decomposition.terms:
+            replicates = np.einsum(
+                "rsk,sk->rs", weights, self.__bucketed_stats(term, n_buckets)
+            )
+            segment_stats[term] = replicates[:, : self.n_segments].ravel()
+            total_stats[term] = replicates.sum(axis=1)
+
+        replicate_values = np.column_stack([
+            decomposition.evaluate(
+                segment_stats, length=n_replicates * self.n_segments
+            ).reshape(n_replicates, self.n_segments),
+            decomposition.evaluate(total_stats, length=n_replicates),
+        ])
+
+        alpha = (1 - confidence) / 2
+
+        # Segments without rows have no defined value in any replicate.
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            lower, upper = np.nanquantile(
+                np.where(np.isfinite(replicate_values), replicate_values, np.nan),
+                [alpha, 1 - alpha],
+                axis=0,
+            )
+
+        return lower, upper
+
+    def evaluate(self, decomposition: MetricDecomposition) -> np.ndarray:
+        """Evaluates the metric for every segment."""
+
+        return decomposition.evaluate(
+            {term: self.stats[term][: self.n_segments] for term in decomposition.terms},
+            length=self.n_segments,
+        )
+
+    def evaluate_total(self, decomposition: MetricDecomposition) -> float:
+        """Evaluates the metric over all rows in the mask, with or without a segment."""
+
+        stats: dict[AggregateTerm, np.ndarray] = {}
+
+        for term in decomposition.terms:
+            if term[1] == "sketch":
+                stats[term] = np.empty(1, dtype=object)
+                stats[term][0] = KLLSketch.merge_all(
+                    list(self.stats[term]), k=DEFAULT_SKETCH_K
+                )
+            else:
+                stats[term] = self.stats[term].sum(keepdims=True)
+
+        return float(decomposition.evaluate(stats, length=1)[0])
+
+
+__all__ = [
+    "DEFAULT_CONFIDENCE_LEVEL",
+    "SIZE_TERM",
+    "AggregateTerm",
+    "MetricDecomposition",
+    "SegmentAggregates",
+]
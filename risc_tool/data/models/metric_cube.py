@@ -0,0 +1,197 @@
+import math
+import typing as t
+
+import numpy as np
+import pandas as pd
+
+from risc_tool.data.models.enums import RowIndex
+from risc_tool.data.models.metric_aggregates import (
+    AggregateTerm,
+    MetricDecomposition,
+    SegmentAggregates,
+)
+from risc_tool.data.models.quantile_sketch import DEFAULT_SKETCH_K, KLLSketch
+
+MISSING_LEVEL = "(Missing)"
+
+
+def _factorize(dimension: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    if isinstance(dimension.dtype, pd.CategoricalDtype):
+        codes = dimension.cat.codes.to_numpy(dtype=np.int64)
+        levels = pd.Index(dimension.cat.categories)
+    else:
+        codes, uniques = pd.factorize(dimension, sort=True)
+        codes = codes.astype(np.int64)
+        levels = pd.Index(uniques)
+
+    # Missing values get a level of their own, so that roll-ups keep every row.
+    missing = codes < 0
+    if missing.any():
+        codes = np.where(missing, len(levels), codes)
+        levels = pd.Index([*levels, MISSING_LEVEL])
+
+    return codes, levels.rename(dimension.name)
+
+
+def with_missing_level(dimension: pd.Series) -> pd.Series:
+    """
+    `dimension` as a categorical with the levels it has in a cube, so that grouping
+    by it matches the cube's roll-ups.
+    """
+
+    codes, levels = _factorize(dimension)
+
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=levels),
+        index=dimension.index,
+        name=dimension.name,
+    )
+
+
+class MetricCube:
+    """
+    Additive statistics of decomposable metrics for every combination of the
+    levels of a few dimensions (e.g. risk segment x data source x product).
+
+    The dimensions are factorized once and their codes combined into a single cell
+    code, so the statistics of all cells are computed in one pass over the rows.
+    A roll-up to any subset of the dimensions sums (or merges the sketches of) the
+    cells over the other dimensions, so pivoting, collapsing and drilling down
+    never touch the rows again. Missing values form a level of their own.
+    """
+
+    def __init__(
+        self,
+        dimensions: list[pd.Series],
+        row_mask: np.ndarray,
+        weights: np.ndarray | None = None,
+    ):
+        if not dimensions:
+            raise ValueError("A cube needs at least one dimension.")
+
+        self.dimensions: list[str] = [str(dimension.name) for dimension in dimensions]
+
+        if len(set(self.dimensions)) != len(self.dimensions):
+            raise ValueError(f"Dimension names must be unique, got {self.dimensions}.")
+
+        self.levels: list[pd.Index] = []
+        dimension_codes: list[np.ndarray] = []
+
+        for dimension in dimensions:
+            codes, levels = _factorize(dimension)
+            dimension_codes.append(codes)
+            self.levels.append(levels)
+
+        self.shape: tuple[int, ...] = tuple(len(levels) for levels in self.levels)
+        n_cells = math.prod(self.shape)
+
+        if n_cells > 0:
+            cell_codes = np.ravel_multi_index(dimension_codes, self.shape)
+        else:
+            cell_codes = np.full(len(row_mask), -1, dtype=np.int64)
+
+        self.__aggregates = SegmentAggregates(
+            codes=cell_codes, n_segments=n_cells, row_mask=row_mask, weights=weights
+        )
+
+    @property
+    def n_cells(self) -> int:
+        return self.__aggregates.n_segments
+
+    def has_terms(self, terms: t.Iterable[AggregateTerm]) -> bool:
+        return self.__aggregates.has_terms(terms)
+
+    def add_terms(
+        self, terms: t.Iterable[AggregateTerm], receiver_values: dict[str, pd.Series]
+    ) -> None:
+        self.__aggregates.add_terms(terms, receiver_values)
+
+    def __axes(self, dimensions: list[str]) -> list[int]:
+        axes: list[int] = []
+
+        for dimension in dimensions:
+            if dimension not in self.dimensions:
+                raise ValueError(
+                    f"Dimension `{dimension}` is not part of the cube "
+                    f"({', '.join(self.dimensions)})."
+                )
+
+            axis = self.dimensions.index(dimension)
+
+            if axis in axes:
+                raise ValueError(f"Dimension `{dimension}` is used more than once.")
+
+            axes.append(axis)
+
+        return axes
+
+    def __rollup_stats(self, term: AggregateTerm, axes: list[int]) -> np.ndarray:
+        cells = self.__aggregates.stats[term][: self.n_cells].reshape(self.shape)
+        dropped = [axis for axis in range(len(self.shape)) if axis not in axes]
+
+        kept_size = math.prod(self.shape[axis] for axis in axes)
+        dropped_size = math.prod(self.shape[axis] for axis in dropped)
+
+        # Kept dimensions first, in the requested order; one row per output cell.
+        cells = np.transpose(cells, axes + dropped).reshape(kept_size, dropped_size)
+
+        if term[1] != "sketch":
+            return cells.sum(axis=1)
+
+        merged = np.empty(kept_size, dtype=object)
+        for i, sketches in enumerate(cells):
+            merged[i] = KLLSketch.merge_all(list(sketches), k=DEFAULT_SKETCH_K)
+
+        return merged
+
+    def __index(self, axes: list[int]) -> pd.Index:
+        if not axes:
+            return pd.Index([RowIndex.TOTAL])
+
+        if len(axes) == 1:
+            return self.levels[axes[0]]
+
+        return pd.MultiIndex.from_product([self.levels[axis] for axis in axes])
+
+    def rollup(
+        self, decomposition: MetricDecomposition, dimensions: list[str]
+    ) -> pd.Series:
+        """
+        Evaluates the metric for every combination of the levels of `dimensions`,
+        a subset of the cube's dimensions in any order. Without dimensions, the
+        metric is evaluated over all rows in the mask.
+        """
+
+        axes = self.__axes(dimensions)
+        index = self.__index(axes)
+
+        values = decomposition.evaluate(
+            {term: self.__rollup_stats(term, axes) for term in decomposition.terms},
+            length=len(index),
+        )
+
+        return pd.Series(values, index=index, name=decomposition.metric.pretty_name)
+
+    def pivot(
+        self,
+        decomposition: MetricDecomposition,
+        rows: list[str],
+        columns: list[str],
+    ) -> pd.DataFrame:
+        """
+        Evaluates the metric with the levels of `rows` down the index and the levels
+        of `columns` across. Without columns, the metric is a single column.
+        """
+
+        values = self.rollup(decomposition, rows + columns)
+
+        if not columns:
+            return values.to_frame()
+
+        if not rows:
+            return values.to_frame(name=RowIndex.TOTAL).T
+
+        return values.unstack(list(range(len(rows), len(rows) + len(columns))))
+
+
+__all__ = ["MISSING_LEVEL", "MetricCube", "with_missing_level"]
@@ -0,0 +1,269 @@
+import itertools
+import multiprocessing
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from risc_tool.data.models.metric import Metric
+
+# (shared memory block name, length, dtype) of a one-dimensional array
+SharedArraySpec = tuple[str, int, str]
+
+
+class SharedColumn(t.TypedDict):
+    # Values of numeric columns, or the factorized codes of the others
+    values: SharedArraySpec
+    # Missing values of the nullable columns (Int64, Float64, boolean)
+    mask: SharedArraySpec | None
+    # Distinct values the codes point to, for the columns that are factorized
+    uniques: pd.api.extensions.ExtensionArray | None
+    dtype: t.Any
+
+
+_executor: ProcessPoolExecutor | None = None
+_executor_workers: int = 0
+
+
+def _get_executor(max_workers: int) -> ProcessPoolExecutor:
+    global _executor, _executor_workers
+
+    if _executor is None or _executor_workers != max_workers:
+        _reset_executor()
+
+        # Streamlit runs scripts on threads, where forking is unsafe.
+        _executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        _executor_workers = max_workers
+
+    return _executor
+
+
+def _reset_executor() -> None:
+    global _executor, _executor_workers
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+
+    _executor = None
+    _executor_workers = 0
+
+
+def _share(
+    array: np.ndarray, blocks: list[shared_memory.SharedMemory]
+) -> SharedArraySpec:
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(block)
+
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+
+    return block.name, len(array), array.dtype.str
+
+
+def _share_column(
+    series: pd.Series, blocks: list[shared_memory.SharedMemory]
+) -> SharedColumn:
+    array = series.array
+
+    if isinstance(
+        array, pd.arrays.IntegerArray | pd.arrays.FloatingArray | pd.arrays.BooleanArray
+    ):
+        return {
+            "values": _share(
+                array.to_numpy(dtype=array.dtype.numpy_dtype, na_value=0), blocks
+            ),
+            "mask": _share(series.isna().to_numpy(dtype=bool), blocks),
+            "uniques": None,
+            "dtype": series.dtype,
+        }
+
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in "biufmM":
+        return {
+            "values": _share(series.to_numpy(), blocks),
+            "mask": None,
+            "uniques": None,
+            "dtype": series.dtype,
+        }
+
+    # Strings, categories and objects are shared as codes into their distinct values
+    codes, uniques = pd.factorize(series)
+
+    return {
+        "values": _share(codes.astype(np.int64), blocks),
+        "mask": None,
+        "uniques": uniques.array,
+        "dtype": series.dtype,
+    }
+
+
+def _evaluate_partition(
+    columns: dict[str, SharedColumn],
+    codes_spec: SharedArraySpec,
+    start: int,
+    end: int,
+    segments: np.ndarray,
+    stage_metrics: list[Metric],
+    metric_values: dict[str, np.ndarray],
+    empty_groups: bool,
+    errors_as_nan: bool,
+) -> np.ndarray:
+    """
+    Evaluates the metrics on the `segments` of the rows `start:end` in a worker.
+    The rows are sorted by segment, and hold every row of these segments.
+    """
+
+    blocks: list[shared_memory.SharedMemory] = []
+
+    def attach(spec: SharedArraySpec) -> np.ndarray:
+        name, length, dtype = spec
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+
+        return np.ndarray((length,), dtype=dtype, buffer=block.buf)[start:end].copy()
+
+    try:
+        codes = attach(codes_spec)
+
+        data: dict[str, pd.Series] = {}
+        for name, column in columns.items():
+            column_values = attach(column["values"])
+
+            if column["mask"] is not None:
+                array = pd.array(column_values, dtype=column["dtype"])
+                array[attach(column["mask"])] = pd.NA
+            elif column["uniques"] is not None:
+                array = column["uniques"].take(column_values, allow_fill=True)
+            else:
+                array = column_values
+
+            data[name] = pd.Series(array, dtype=column["dtype"], name=name)
+    finally:
+        for block in blocks:
+            block.close()
+
+    data_df = pd.DataFrame(data, index=pd.RangeIndex(end - start))
+
+    group_starts = np.searchsorted(codes, segments, side="left")
+    group_ends = np.searchsorted(codes, segments, side="right")
+
+    values = np.full((len(segments), len(stage_metrics)), np.nan)
+
+    for i, (group_start, group_end) in enumerate(zip(group_starts, group_ends)):
+        if group_start == group_end and not empty_groups:
+            continue
+
+        group = data_df.iloc[group_start:group_end]
+        group_metric_values = {
+            name: float(segment_values[i])
+            for name, segment_values in metric_values.items()
+        }
+        shared: dict[str, t.Any] = {}
+
+        for j, metric in enumerate(stage_metrics):
+            try:
+                values[i, j] = metric.evaluate(group, group_metric_values, shared)
+            except ValueError:
+                if not errors_as_nan:
+                    raise
+
+    return values
+
+
+def evaluate_groups(
+    data: pd.DataFrame,
+    codes: np.ndarray,
+    n_segments: int,
+    stage_metrics: list[Metric],
+    metric_values: dict[str, np.ndarray],
+    max_workers: int,
+    empty_groups: bool = True,
+    errors_as_nan: bool = False,
+) -> np.ndarray:
+    """
+    Evaluates metrics for every segment, the way `groupby.apply` would, in a process
+    pool. The segments are split into contiguous ranges of about the same number of
+    rows, and every worker evaluates the metrics on the groups of its range; no
+    metric needs to be mergeable, as a group is never split between workers.
+
+    `codes` assign the rows of `data` to segments, and `metric_values` hold the
+    values of the referenced metrics per segment. The columns and codes are handed
+    to the workers through shared memory rather than pickled; only the values of
+    the metrics are returned, as an array of segments by metrics.
+
+    Segments without rows are NaN unless `empty_groups`; `groupby.apply` only
+    evaluates them when grouping by a single categorical variable.
+
+    A ValueError of a metric is raised, or is NaN for the group with
+    `errors_as_nan`. Raises `OSError` or `BrokenProcessPool` if the pool can not be
+    used; callers are expected to evaluate in this process in these cases.
+    """
+
+    # Every segment is a contiguous range of rows, in their original order
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = np.asarray(codes, dtype=np.int64)[order]
+    sorted_data = data.take(order)
+
+    row_ends = np.cumsum(np.bincount(sorted_codes, minlength=n_segments))
+    n_partitions = max(min(max_workers, n_segments), 1)
+    segment_edges = np.unique(
+        np.concatenate([
+            [0],
+            np.searchsorted(
+                row_ends,
+                np.arange(1, n_partitions) * len(sorted_codes) / n_partitions,
+            ),
+            [n_segments],
+        ])
+    )
+
+    blocks: list[shared_memory.SharedMemory] = []
+
+    try:
+        codes_spec = _share(sorted_codes, blocks)
+        columns = {
+            str(name): _share_column(sorted_data[name], blocks)
+            for name in sorted_data.columns
+        }
+
+        executor = _get_executor(max_workers)
+        futures = {
+            (first, last): executor.submit(
+                _evaluate_partition,
+                columns,
+                codes_spec,
+                int(row_ends[first - 1]) if first > 0 else 0,
+                int(row_ends[last - 1]),
+                np.arange(first, last),
+                stage_metrics,
+                {
+                    name: segment_values[first:last]
+                    for name, segment_values in metric_values.items()
+                },
+                empty_groups,
+                errors_as_nan,
+            )
+            for first, last in itertools.pairwise(segment_edges)
+        }
+
+        values = np.full((n_segments, len(stage_metrics)), np.nan)
+        for (first, last), future in futures.items():
+            values[first:last] = future.result()
+    except BrokenProcessPool:
+        _reset_executor()
+        raise
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return values
+
+
+__all__ = [
+    "evaluate_groups",
+]
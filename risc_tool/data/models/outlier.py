@@ -1,56 +1,77 @@
-import pandas as pd
-
+from risc_tool.data.models.column_summary import ColumnSummary
 from risc_tool.data.models.enums import ComparisonOperation, PercentileOptions
 from risc_tool.data.models.filter import Filter
 from risc_tool.data.models.json_models import FilterJSON
 from risc_tool.data.models.types import FilterID
 
+PERCENTILE_FRACTIONS: dict[PercentileOptions, float] = {
+    PercentileOptions.PERC_1: 0.01,
+    PercentileOptions.PERC_5: 0.05,
+    PercentileOptions.PERC_10: 0.10,
+    PercentileOptions.PERC_25: 0.25,
+    PercentileOptions.PERC_50: 0.50,
+    PercentileOptions.PERC_75: 0.75,
+    PercentileOptions.PERC_90: 0.90,
+    PercentileOptions.PERC_95: 0.95,
+    PercentileOptions.PERC_99: 0.99,
+}
+
 
 class OutlierRule(Filter):
+    """
+    Marks the rows of a column beyond a threshold as outliers, leaving out the
+    rows equal to the mode of the column. Only the resolved threshold and the mode
+    are kept; percentile thresholds are resolved from a shared `ColumnSummary` by
+    `from_summary`.
+    """
+
     def __init__(
         self,
         uid: FilterID,
-        variable: pd.Series,
+        variable_name: str,
         comparison_op: ComparisonOperation,
         comparison_base: PercentileOptions | float,
+        threshold: float,
+        mode: int | float,
     ):
         super().__init__(uid, "", "")
 
-        self.variable = variable.copy()
-        self.variable_name: str = str(variable.name)
+        self.variable_name: str = variable_name
         self.comparison_op: ComparisonOperation = comparison_op
         self.comparison_base: PercentileOptions | float = comparison_base
-
-        mode = variable.mode().iloc[0]
+        self.threshold: float = threshold
+        self.mode: int | float = mode
 
         if isinstance(self.comparison_base, PercentileOptions):
-            variable_m = variable.loc[variable != mode]
-
-            match comparison_base:
-                case PercentileOptions.PERC_1:
-                    comparison_base = variable_m.quantile(0.01, interpolation="linear")
-                case PercentileOptions.PERC_5:
-                    comparison_base = variable_m.quantile(0.05, interpolation="linear")
-                case PercentileOptions.PERC_10:
-                    comparison_base = variable_m.quantile(0.10, interpolation="linear")
-                case PercentileOptions.PERC_25:
-                    comparison_base = variable_m.quantile(0.25, interpolation="linear")
-                case PercentileOptions.PERC_50:
-                    comparison_base = variable_m.quantile(0.50, interpolation="linear")
-                case PercentileOptions.PERC_75:
-                    comparison_base = variable_m.quantile(0.75, interpolation="linear")
-                case PercentileOptions.PERC_90:
-                    comparison_base = variable_m.quantile(0.90, interpolation="linear")
-                case PercentileOptions.PERC_95:
-                    comparison_base = variable_m.quantile(0.95, interpolation="linear")
-                case PercentileOptions.PERC_99:
-                    comparison_base = variable_m.quantile(0.99, interpolation="linear")
-
             self.name = f"{self.variable_name} {self.comparison_op.value} {PercentileOptions.format_perc(self.comparison_base.value)}"
         else:
             self.name = f"{self.variable_name} {self.comparison_op.value} {self.comparison_base}"
 
-        self.query = f"~((`{self.variable_name}` {comparison_op} {comparison_base}) & (`{self.variable_name}` != {mode}))"
+        self.query = f"~((`{self.variable_name}` {comparison_op} {threshold}) & (`{self.variable_name}` != {mode}))"
+
+    @classmethod
+    def from_summary(
+        cls,
+        uid: FilterID,
+        summary: ColumnSummary,
+        comparison_op: ComparisonOperation,
+        comparison_base: PercentileOptions | float,
+    ) -> "OutlierRule":
+        if isinstance(comparison_base, PercentileOptions):
+            threshold = summary.quantile(
+                PERCENTILE_FRACTIONS[comparison_base], exclude_mode=True
+            )
+        else:
+            threshold = comparison_base
+
+        return cls(
+            uid=uid,
+            variable_name=summary.name,
+            comparison_op=comparison_op,
+            comparison_base=comparison_base,
+            threshold=threshold,
+            mode=summary.mode,
+        )
 
     def to_dict(self) -> FilterJSON:
         return FilterJSON(
@@ -66,14 +87,14 @@ class OutlierRule(Filter):
 
     @classmethod
     def from_dict(
-        cls, data: FilterJSON, variable: pd.Series | None = None
+        cls, data: FilterJSON, summary: ColumnSummary | None = None
     ) -> "OutlierRule":
-        if variable is None:
-            raise ValueError("Variable must be provided.")
+        if summary is None:
+            raise ValueError("Column summary must be provided.")
 
-        instance = cls(
+        instance = cls.from_summary(
             uid=data.uid,
-            variable=variable,
+            summary=summary,
             comparison_op=data.comparison_op,
             comparison_base=data.comparison_base,
         )
@@ -88,15 +109,18 @@ class OutlierRule(Filter):
 
         new_instance = OutlierRule(
             uid=uid,
-            variable=self.variable,
+            variable_name=self.variable_name,
             comparison_op=self.comparison_op,
             comparison_base=self.comparison_base,
+            threshold=self.threshold,
+            mode=self.mode,
         )
 
         new_instance.used_columns = self.used_columns.copy()
-        new_instance.mask = self.mask.copy() if self.mask is not None else None
+        new_instance.mask = self.mask
+        new_instance.plan = self.plan
 
         return new_instance
 
 
-__all__ = ["OutlierRule"]
+__all__ = ["PERCENTILE_FRACTIONS", "OutlierRule"]
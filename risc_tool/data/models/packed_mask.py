@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+
+class PackedMask:
+    """
+    A boolean row mask stored as packed bits (one bit per row), with an optional
+    second bitset for missing values. This takes an eighth of the memory of a
+    boolean series.
+
+    `&`, `|`, `~` and the counts work directly on the packed bytes. The logical
+    operators follow the Kleene logic of pandas' nullable `boolean` dtype. Missing
+    rows always have their value bit cleared. A boolean view is only unpacked by
+    `to_numpy` / `to_series`.
+    """
+
+    def __init__(
+        self,
+        bits: np.ndarray,
+        index: pd.Index,
+        na_bits: np.ndarray | None = None,
+    ):
+        if len(bits) != (len(index) + 7) // 8:
+            raise ValueError(
+                f"Length Mismatch: {len(bits)} bytes can not hold {len(index)} rows."
+            )
+
+        self.bits: np.ndarray = bits
+        self.na_bits: np.ndarray | None = na_bits
+        self.index: pd.Index = index
+
+    @classmethod
+    def from_series(cls, mask: pd.Series) -> "PackedMask":
+        values = mask.to_numpy(dtype=bool, na_value=False)
+        na_bits = None
+
+        if mask.hasnans:
+            na_bits = np.packbits(mask.isna().to_numpy(dtype=bool))
+
+        return cls(np.packbits(values), mask.index, na_bits)
+
+    @classmethod
+    def full(cls, index: pd.Index, value: bool = True) -> "PackedMask":
+        return cls(np.packbits(np.full(len(index), value, dtype=bool)), index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes + (0 if self.na_bits is None else self.na_bits.nbytes)
+
+    @property
+    def has_na(self) -> bool:
+        return self.na_bits is not None
+
+    def __check_aligned(self, other: "PackedMask") -> None:
+        if len(self) != len(other):
+            raise ValueError(
+                f"Length Mismatch: len(left) != len(right) ({len(self)} != {len(other)})."
+            )
+
+    def __padding(self) -> np.ndarray:
+        # Bits past the last row, which must stay cleared for the counts.
+        padding = np.full(len(self.bits), 0xFF, dtype=np.uint8)
+        remainder = len(self) % 8
+
+        if remainder:
+            padding[-1] = (0xFF << (8 - remainder)) & 0xFF
+
+        return padding
+
+    def __and__(self, other: "PackedMask") -> "PackedMask":
+        self.__check_aligned(other)
+        bits = self.bits & other.bits
+
+        if self.na_bits is None and other.na_bits is None:
+            return PackedMask(bits, self.index)
+
+        # A known False wins over a missing value.
+        self_na = self.na_bits if self.na_bits is not None else 0
+        other_na = other.na_bits if other.na_bits is not None else 0
+        self_false = ~(self.bits | self_na)
+        other_false = ~(other.bits | other_na)
+        na_bits = (self_na | other_na) & ~(self_false | other_false)
+
+        return PackedMask(bits, self.index, na_bits if na_bits.any() else None)
+
+    def __or__(self, other: "PackedMask") -> "PackedMask":
+        self.__check_aligned(other)
+        bits = self.bits | other.bits
+
+        if self.na_bits is None and other.na_bits is None:
+            return PackedMask(bits, self.index)
+
+        # A known True wins over a missing value.
+        self_na = self.na_bits if self.na_bits is not None else 0
+        other_na = other.na_bits if other.na_bits is not None else 0
+        na_bits = (self_na | other_na) & ~bits
+
+        return PackedMask(bits, self.index, na_bits if na_bits.any() else None)
+
+    def __invert__(self) -> "PackedMask":
+        bits = ~self.bits & self.__padding()
+
+        if self.na_bits is not None:
+            bits &= ~self.na_bits
+
+        return PackedMask(bits, self.index, self.na_bits)
+
+    def count(self) -> int:
+        """Number of rows that are True."""
+        return int(np.bitwise_count(self.bits).sum())
+
+    def count_na(self) -> int:
+        """Number of rows that are missing."""
+        if self.na_bits is None:
+            return 0
+
+        return int(np.bitwise_count(self.na_bits).sum())
+
+    def to_numpy(self, na_value: bool = False) -> np.ndarray:
+        values = np.unpackbits(self.bits, count=len(self)).view(bool)
+
+        if na_value and self.na_bits is not None:
+            values = values | np.unpackbits(self.na_bits, count=len(self)).view(bool)
+
+        return values
+
+    def to_series(self) -> pd.Series:
+        values = self.to_numpy()
+
+        if self.na_bits is None:
+            return pd.Series(values, index=self.index, dtype=bool)
+
+        na = np.unpackbits(self.na_bits, count=len(self)).view(bool)
+
+        return pd.Series(pd.arrays.BooleanArray(values, na), index=self.index)
+
+    def copy(self) -> "PackedMask":
+        return PackedMask(
+            self.bits.copy(),
+            self.index,
+            None if self.na_bits is None else self.na_bits.copy(),
+        )
+
+
+__all__ = ["PackedMask"]
@@ -0,0 +1,144 @@
+import math
+
+import numpy as np
+
+DEFAULT_SKETCH_K = 200
+
+
+class KLLSketch:
+    """
+    Mergeable quantile sketch (Karnin, Lang & Liberty, 2016).
+
+    Values are kept in levels of increasing weight; an overfull level is sorted
+    and every other item (random offset) is promoted to the next level with twice
+    the weight. Memory stays around `3k` items regardless of the number of values,
+    and sketches of disjoint partitions can be merged into a sketch of the union.
+    """
+
+    _capacity_ratio = 2 / 3
+    _min_capacity = 8
+
+    def __init__(self, k: int = DEFAULT_SKETCH_K, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.min = np.nan
+        self.max = np.nan
+        self.levels: list[np.ndarray] = [np.empty(0, dtype="float64")]
+
+        self.__rng = np.random.default_rng(seed)
+
+    @staticmethod
+    def normalized_rank_error(k: int = DEFAULT_SKETCH_K) -> float:
+        """
+        Rank error of a quantile query as a fraction of the number of values.
+        Measured worst case over the percentiles of a sketch, at 99% confidence.
+        """
+        return 2.2 / k
+
+    def __capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(self._min_capacity, math.ceil(self.k * self._capacity_ratio**depth))
+
+    def __compress(self) -> None:
+        level = 0
+
+        while level < len(self.levels):
+            items = self.levels[level]
+
+            if len(items) <= self.__capacity(level):
+                level += 1
+                continue
+
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0, dtype="float64"))
+
+            items = np.sort(items)
+
+            # An odd item out stays on its level.
+            if len(items) % 2:
+                kept, items = items[-1:], items[:-1]
+            else:
+                kept = items[:0]
+
+            offset = int(self.__rng.integers(2))
+
+            self.levels[level + 1] = np.concatenate([
+                self.levels[level + 1],
+                items[offset::2],
+            ])
+            self.levels[level] = kept
+
+            # Capacities of the lower levels shrink when a level is added.
+            level = 0
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+
+        if len(values) == 0:
+            return
+
+        self.n += len(values)
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+
+        # Feeding bounded chunks keeps every sort small.
+        chunk_size = self.k * 256
+        for start in range(0, len(values), chunk_size):
+            self.levels[0] = np.concatenate([
+                self.levels[0],
+                values[start : start + chunk_size],
+            ])
+            self.__compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        if other.n == 0:
+            return
+
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype="float64"))
+
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+
+        self.n += other.n
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+
+        self.__compress()
+
+    @classmethod
+    def merge_all(cls, sketches: list["KLLSketch"], k: int = DEFAULT_SKETCH_K):
+        merged = cls(k=k)
+
+        for sketch in sketches:
+            merged.merge(sketch)
+
+        return merged
+
+    def quantile(self, q: float) -> float:
+        if self.n == 0:
+            return np.nan
+
+        if q <= 0:
+            return float(self.min)
+
+        if q >= 1:
+            return float(self.max)
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(len(level_items), 2**level, dtype="int64")
+            for level, level_items in enumerate(self.levels)
+        ])
+
+        order = np.argsort(items, kind="stable")
+        cumulative_weights = np.cumsum(weights[order])
+        position = np.searchsorted(
+            cumulative_weights, q * cumulative_weights[-1], side="left"
+        )
+
+        return float(items[order][min(position, len(items) - 1)])
+
+
+__all__ = ["DEFAULT_SKETCH_K", "KLLSketch"]
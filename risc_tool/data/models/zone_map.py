@@ -0,0 +1,200 @@
+import ast
+import typing as t
+
+import numpy as np
+import pandas as pd
+
+from risc_tool.data.models.filter_kernel import FLIPPED_COMPARISONS
+
+DEFAULT_BLOCK_SIZE = 65_536
+
+# Per block: whether a condition is True for every row, and whether it is False
+# for every row. Blocks that are neither have to be evaluated.
+BlockStates = tuple[np.ndarray, np.ndarray]
+
+
+class ZoneMap:
+    """
+    Minimum, maximum and number of missing values of a numeric column for every
+    block of `block_size` consecutive rows. Range conditions on the column can be
+    decided for a whole block from these, without reading its rows; this pays off
+    when the column is sorted or clustered (e.g. by vintage).
+    """
+
+    def __init__(self, column: pd.Series, block_size: int = DEFAULT_BLOCK_SIZE):
+        values = column.to_numpy(dtype="float64", na_value=np.nan)
+        starts = np.arange(0, len(values), block_size)
+
+        self.block_size: int = block_size
+        self.n_rows: int = len(values)
+
+        if len(values) == 0:
+            self.minimum = self.maximum = np.empty(0)
+            self.null_count = np.empty(0, dtype=np.int64)
+            return
+
+        # `fmin` / `fmax` skip missing values; an all-missing block stays missing
+        self.minimum: np.ndarray = np.fmin.reduceat(values, starts)
+        self.maximum: np.ndarray = np.fmax.reduceat(values, starts)
+        self.null_count: np.ndarray = np.add.reduceat(
+            np.isnan(values).astype(np.int64), starts
+        )
+
+    @property
+    def n_blocks(self) -> int:
+        return len(self.minimum)
+
+    def compare(self, op: ast.cmpop, value: float) -> BlockStates:
+        """Decides `column <op> value` for the blocks without missing values."""
+
+        minimum, maximum = self.minimum, self.maximum
+
+        match op:
+            case ast.Gt():
+                all_true, all_false = minimum > value, maximum <= value
+            case ast.GtE():
+                all_true, all_false = minimum >= value, maximum < value
+            case ast.Lt():
+                all_true, all_false = maximum < value, minimum >= value
+            case ast.LtE():
+                all_true, all_false = maximum <= value, minimum > value
+            case ast.Eq():
+                all_true = (minimum == value) & (maximum == value)
+                all_false = (maximum < value) | (minimum > value)
+            case ast.NotEq():
+                all_true = (maximum < value) | (minimum > value)
+                all_false = (minimum == value) & (maximum == value)
+            case _:
+                raise ValueError(f"Unsupported comparison: {op}")
+
+        # Missing values make the condition missing, neither True nor False
+        complete = self.null_count == 0
+
+        return all_true & complete, all_false & complete
+
+
+ZonePredicate = t.Callable[[dict[str, ZoneMap]], BlockStates]
+
+
+def _number(node: ast.expr) -> float | None:
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _number(node.operand)
+        return (
+            None
+            if value is None
+            else (-value if isinstance(node.op, ast.USub) else value)
+        )
+
+    if (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, (int, float))
+        and not isinstance(node.value, bool)
+    ):
+        return float(node.value)
+
+    return None
+
+
+def _compile_zone_predicate(
+    node: ast.expr, placeholder_map: dict[str, str]
+) -> tuple[ZonePredicate, set[str]] | None:
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+        compiled = _compile_zone_predicate(node.operand, placeholder_map)
+
+        if compiled is None:
+            return None
+
+        operand, columns = compiled
+
+        def negation(zone_maps: dict[str, ZoneMap]) -> BlockStates:
+            all_true, all_false = operand(zone_maps)
+            return all_false, all_true
+
+        return negation, columns
+
+    if isinstance(node, ast.BoolOp):
+        compiled_values = [
+            _compile_zone_predicate(value, placeholder_map) for value in node.values
+        ]
+
+        if any(compiled is None for compiled in compiled_values):
+            return None
+
+        operands = [t.cast(tuple, compiled)[0] for compiled in compiled_values]
+        columns = set().union(*[t.cast(tuple, c)[1] for c in compiled_values])
+        is_and = isinstance(node.op, ast.And)
+
+        # Kleene logic: a known False decides `and`, a known True decides `or`
+        def logical(zone_maps: dict[str, ZoneMap]) -> BlockStates:
+            all_true, all_false = zip(*[operand(zone_maps) for operand in operands])
+
+            if is_and:
+                return np.logical_and.reduce(all_true), np.logical_or.reduce(all_false)
+
+            return np.logical_or.reduce(all_true), np.logical_and.reduce(all_false)
+
+        return logical, columns
+
+    if isinstance(node, ast.Compare):
+        operands = [node.left, *node.comparators]
+        comparisons: list[tuple[str, type[ast.cmpop], float]] = []
+
+        for op, left, right in zip(node.ops, operands[:-1], operands[1:]):
+            if type(op) not in FLIPPED_COMPARISONS:
+                return None
+
+            if isinstance(left, ast.Name) and _number(right) is not None:
+                column, op_type, value = left.id, type(op), _number(right)
+            elif isinstance(right, ast.Name) and _number(left) is not None:
+                column, op_type, value = (
+                    right.id,
+                    FLIPPED_COMPARISONS[type(op)],
+                    _number(left),
+                )
+            else:
+                return None
+
+            comparisons.append((
+                placeholder_map.get(column, column),
+                op_type,
+                t.cast(float, value),
+            ))
+
+        # `a < x < b` is `(a < x) & (x < b)`
+        def compare(zone_maps: dict[str, ZoneMap]) -> BlockStates:
+            all_true, all_false = zip(*[
+                zone_maps[column].compare(op_type(), value)
+                for column, op_type, value in comparisons
+            ])
+
+            return np.logical_and.reduce(all_true), np.logical_or.reduce(all_false)
+
+        return compare, {column for column, _, _ in comparisons}
+
+    return None
+
+
+def compile_zone_predicate(
+    node: ast.expr, placeholder_map: dict[str, str]
+) -> tuple[ZonePredicate, frozenset[str]] | None:
+    """
+    Compiles a condition made only of comparisons of columns with numbers, combined
+    with `&`, `|` and `~`, into a function that decides it per block from the zone
+    maps of its columns. Returns `None` for any other condition.
+    """
+
+    compiled = _compile_zone_predicate(node, placeholder_map)
+
+    if compiled is None:
+        return None
+
+    return compiled[0], frozenset(compiled[1])
+
+
+__all__ = [
+    "DEFAULT_BLOCK_SIZE",
+    "BlockStates",
+    "ZoneMap",
+    "ZonePredicate",
+    "compile_zone_predicate",
+]
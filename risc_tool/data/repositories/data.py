@@ -1,19 +1,34 @@
+import os
 import pathlib
 import typing as t
 from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
 from uuid import uuid4
 
 import numpy as np
 import pandas as pd
 from pydantic import ValidationError
 
+from risc_tool.data.models.column_summary import ColumnSummary
+from risc_tool.data.models.data_change import DataChange
 from risc_tool.data.models.data_config import DataConfig
 from risc_tool.data.models.data_source import DataSource
-from risc_tool.data.models.enums import RowIndex, Signature, VariableType
+from risc_tool.data.models.enums import (
+    DataChangeType,
+    RowIndex,
+    Signature,
+    VariableType,
+)
 from risc_tool.data.models.exceptions import DataImportError, SampleDataNotLoadedError
 from risc_tool.data.models.json_models import DataRepositoryJSON
-from risc_tool.data.models.metric import Metric
-from risc_tool.data.models.types import ChangeIDs, DataSourceID
+from risc_tool.data.models.metric import Metric, metric_evaluation_order
+from risc_tool.data.models.metric_aggregates import (
+    MetricDecomposition,
+    SegmentAggregates,
+)
+from risc_tool.data.models.metric_map_reduce import evaluate_groups
+from risc_tool.data.models.types import ChangeID, ChangeIDs, DataSourceID
+from risc_tool.data.models.zone_map import ZoneMap
 from risc_tool.data.repositories.base import BaseRepository
 
 
@@ -32,9 +47,51 @@ class DataRepository(BaseRepository):
         self.data_sources: OrderedDict[DataSourceID, DataSource] = OrderedDict()
         self.data_config: DataConfig = DataConfig()
 
+        # Grouped metrics are evaluated in a process pool once this many rows count
+        self.max_workers: int = min(os.cpu_count() or 1, 8)
+        self.parallel_min_rows: int = 1_000_000
+
+        # What the recent notifications changed, for selective updates downstream
+        self.__data_changes: OrderedDict[ChangeID, DataChange] = OrderedDict()
+        self.max_data_changes: int = 64
+
+        # Block-level min / max of the numeric columns loaded for all data sources
+        self.__zone_maps: dict[str, ZoneMap] = {}
+
+        # Sorted values of the columns outlier rules are defined on
+        self.__column_summaries: dict[str, ColumnSummary] = {}
+
     def on_dependency_update(self, change_ids: ChangeIDs):
         return
 
+    def __notify_data_change(self, data_change: DataChange):
+        change_id: ChangeID = (self._signature, uuid4())
+
+        if data_change.change_type != DataChangeType.RELABELED:
+            self.__zone_maps.clear()
+            self.__column_summaries.clear()
+
+        self.__data_changes[change_id] = data_change
+        while len(self.__data_changes) > self.max_data_changes:
+            self.__data_changes.popitem(last=False)
+
+        self.notify_subscribers({change_id})
+
+    def get_data_changes(self, change_ids: ChangeIDs) -> list[DataChange] | None:
+        """
+        Descriptions of the data changes behind `change_ids`. Returns `None` when
+        the data changed in a way that is not described, so that everything
+        depending on the data has to be recomputed.
+        """
+
+        data_changes = [
+            self.__data_changes[change_id]
+            for change_id in change_ids
+            if change_id in self.__data_changes
+        ]
+
+        return data_changes or None
+
     @property
     def index(self):
         if not self.sample_loaded:
@@ -177,7 +234,7 @@ class DataRepository(BaseRepository):
         data_source.load_sample()
 
         self.refresh_data_config()
-        self.notify_subscribers()
+        self.__notify_data_change(DataChange(DataChangeType.ADDED, [data_source.uid]))
 
         return data_source
 
@@ -226,6 +283,23 @@ class DataRepository(BaseRepository):
         except (FileNotFoundError, ValueError) as error:
             raise DataImportError(str(error), data_source)
 
+        # Only a new label leaves the values of the source as they are
+        change_type = (
+            DataChangeType.RELABELED
+            if all(
+                getattr(new_data_source, attribute) == getattr(data_source, attribute)
+                for attribute in (
+                    "filepath",
+                    "read_mode",
+                    "delimiter",
+                    "sheet_name",
+                    "header_row",
+                    "sample_row_count",
+                )
+            )
+            else DataChangeType.MODIFIED
+        )
+
         # Store the new source
         self.data_sources[data_source_id] = new_data_source
 
@@ -236,7 +310,7 @@ class DataRepository(BaseRepository):
         self.refresh_data_config()
 
         # Notify subscribers
-        self.notify_subscribers()
+        self.__notify_data_change(DataChange(change_type, [data_source_id]))
 
         return new_data_source
 
@@ -245,7 +319,7 @@ class DataRepository(BaseRepository):
 
         self.refresh_data_config()
 
-        self.notify_subscribers()
+        self.__notify_data_change(DataChange(DataChangeType.REMOVED, [data_source_id]))
 
     def get_data_source_mask(self, data_source_ids: list[DataSourceID]) -> pd.Series:
         mask = pd.Series(False, index=self.index)
@@ -282,6 +356,65 @@ class DataRepository(BaseRepository):
         data_source_mask = self.get_data_source_mask(data_source_ids)
         final_df.loc[~data_source_mask, :] = pd.NA
 
+        final_df = self.__convert_column_dtypes(final_df)
+
+        if data_source_mask.all():
+            self.__update_zone_maps(final_df)
+
+        return final_df
+
+    def __update_zone_maps(self, final_df: pd.DataFrame) -> None:
+        for col in final_df.columns:
+            if col in self.__zone_maps:
+                continue
+
+            dtype = final_df[col].dtype
+            if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(
+                dtype
+            ):
+                self.__zone_maps[col] = ZoneMap(final_df[col])
+
+    def get_zone_maps(self, column_names: t.Iterable[str]) -> dict[str, ZoneMap]:
+        """
+        Zone maps of the numeric columns among `column_names` that have been loaded
+        for all data sources since the data last changed.
+        """
+
+        return {
+            col: self.__zone_maps[col]
+            for col in column_names
+            if col in self.__zone_maps
+        }
+
+    def load_source_columns(
+        self,
+        data_source_id: DataSourceID,
+        column_names: list[str],
+        column_types: list[VariableType] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Loads columns for the rows of a single data source, with the same index as
+        these rows have in `load_columns`.
+        """
+
+        if not self.sample_loaded:
+            raise SampleDataNotLoadedError()
+
+        if column_types is None:
+            column_types = [VariableType.NUMERICAL for _ in column_names]
+
+        if len(column_names) != len(column_types):
+            raise ValueError("column_names and column_types must have the same length")
+
+        ds = self.data_sources[data_source_id]
+        final_df = pd.concat(
+            [ds.load_columns(column_names, column_types)], axis=0, keys=[ds.uid]
+        )
+
+        return self.__convert_column_dtypes(final_df)
+
+    @staticmethod
+    def __convert_column_dtypes(final_df: pd.DataFrame) -> pd.DataFrame:
         final_df = final_df.convert_dtypes()
 
         for col in final_df.columns:
@@ -290,6 +423,19 @@ class DataRepository(BaseRepository):
 
         return final_df
 
+    def get_column_summary(self, column_name: str) -> ColumnSummary:
+        """
+        The sorted values and the mode of a numeric column over all data sources,
+        kept until the data changes.
+        """
+
+        if column_name not in self.__column_summaries:
+            self.__column_summaries[column_name] = ColumnSummary(
+                self.load_column(column_name)
+            )
+
+        return self.__column_summaries[column_name]
+
     def load_column(
         self,
         column_name: str | None = None,
@@ -314,11 +460,231 @@ class DataRepository(BaseRepository):
 
         return pd.Series(index=index)
 
+    def __aggregate_metrics(
+        self,
+        metrics: list[Metric],
+        segment_codes: np.ndarray,
+        all_index: pd.Index,
+        data_filter: pd.Series,
+        weights: pd.Series | None,
+    ) -> dict[int, pd.Series]:
+        """
+        Evaluates the decomposable metrics from per-segment statistics, in one pass
+        over the rows. Returns the results by position in `metrics`; metrics that
+        are missing must be evaluated by grouping.
+        """
+
+        weight_values = None
+        if weights is not None:
+            weight_values = weights.to_numpy(dtype="float64", na_value=0.0)
+
+        # Metrics on the same data sources share the loaded columns and the mask
+        metric_groups: dict[tuple[DataSourceID, ...], list[int]] = {}
+        decompositions: dict[int, MetricDecomposition] = {}
+
+        for position, metric in enumerate(metrics):
+            decomposition = MetricDecomposition(metric)
+
+            if decomposition.is_decomposable:
+                decompositions[position] = decomposition
+                metric_groups.setdefault(
+                    tuple(sorted(metric.data_source_ids)), []
+                ).append(position)
+
+        results: dict[int, pd.Series] = {}
+
+        for group_ds_ids, positions in metric_groups.items():
+            used_columns = sorted({
+                col for pos in positions for col in metrics[pos].used_columns
+            })
+            loaded_data = self.load_columns(
+                used_columns, data_source_ids=list(group_ds_ids)
+            )
+
+            mask = data_filter & self.get_data_source_mask(list(group_ds_ids))
+            codes = np.where(
+                mask.to_numpy(dtype=bool, na_value=False), segment_codes, -1
+            )
+
+            aggregates = SegmentAggregates(
+                codes=codes,
+                n_segments=len(all_index),
+                row_mask=codes >= 0,
+                weights=weight_values,
+            )
+
+            try:
+                values = []
+                for pos in positions:
+                    aggregates.add_terms(
+                        decompositions[pos].terms,
+                        decompositions[pos].evaluate_receivers(loaded_data),
+                    )
+                    values.append(aggregates.evaluate(decompositions[pos]))
+            except (TypeError, ValueError):
+                # Evaluated by grouping instead
+                continue
+
+            for pos, metric_values in zip(positions, values):
+                results[pos] = pd.Series(
+                    metric_values, index=all_index, name=metrics[pos].pretty_name
+                )
+
+        return results
+
+    def __evaluate_metric_graph(
+        self,
+        metrics: list[Metric],
+        results: dict[str, pd.Series],
+        base_df: pd.DataFrame,
+        groupby_variables: list[pd.Series],
+        segment_codes: np.ndarray,
+        all_index: pd.Index,
+        data_filter: pd.Series,
+        errors_as_nan: bool = False,
+    ) -> None:
+        """
+        Evaluates the metrics, and the metrics they reference, that are not in
+        `results` yet. A metric is evaluated after the metrics it references, and
+        metrics on the same data sources share one groupby pass, in which each
+        reduction is computed once per group (see `Metric.shared_query`). With
+        `errors_as_nan`, a metric raising a ValueError on a group is NaN there.
+        Stages with at least `parallel_min_rows` rows split their groups between
+        `max_workers` processes (see `evaluate_groups`).
+        """
+
+        evaluation_order = metric_evaluation_order(metrics)
+
+        # Metrics at the same depth do not depend on each other
+        depths: dict[str, int] = {}
+        for metric in evaluation_order:
+            depths[metric.name] = 1 + max(
+                (depths[name] for name in metric.references), default=-1
+            )
+
+        stages: dict[tuple[int, tuple[DataSourceID, ...]], list[Metric]] = {}
+        for metric in evaluation_order:
+            if metric.name not in results:
+                stages.setdefault(
+                    (depths[metric.name], tuple(sorted(metric.data_source_ids))), []
+                ).append(metric)
+
+        # Reductions by data sources and group, shared across stages
+        shared_results: dict[tuple[tuple[DataSourceID, ...], t.Any], dict] = {}
+
+        # Referenced metrics are seen without the percentage scaling
+        unscaled_results: dict[str, pd.Series] = {
+            metric.name: results[metric.name] / 100
+            if metric.is_percentage
+            else results[metric.name]
+            for metric in evaluation_order
+            if metric.name in results
+        }
+
+        for (_, ds_ids), stage_metrics in sorted(stages.items(), key=lambda s: s[0]):
+            loaded_data = self.load_columns(
+                sorted({
+                    col for metric in stage_metrics for col in metric.used_columns
+                }),
+                data_source_ids=list(ds_ids),
+            )
+
+            metric_data = pd.concat([base_df, loaded_data], axis=1)
+
+            stage_mask = data_filter & self.get_data_source_mask(list(ds_ids))
+            filtered_data = metric_data[stage_mask]
+
+            referenced_names = sorted({
+                name for metric in stage_metrics for name in metric.referenced_metrics
+            })
+
+            stage_df = None
+
+            if self.max_workers > 1 and len(filtered_data) >= self.parallel_min_rows:
+                stage_codes = segment_codes[
+                    stage_mask.to_numpy(dtype=bool, na_value=False)
+                ]
+                grouped = stage_codes >= 0
+
+                try:
+                    stage_values = evaluate_groups(
+                        data=loaded_data[stage_mask][grouped],
+                        codes=stage_codes[grouped],
+                        n_segments=len(all_index),
+                        stage_metrics=stage_metrics,
+                        metric_values={
+                            name: unscaled_results[name].to_numpy(dtype="float64")
+                            for name in referenced_names
+                        },
+                        max_workers=self.max_workers,
+                        empty_groups=len(groupby_variables) == 1,
+                        errors_as_nan=errors_as_nan,
+                    )
+                except (OSError, BrokenProcessPool):
+                    # Evaluated in this process instead
+                    pass
+                else:
+                    stage_df = pd.DataFrame(
+                        stage_values,
+                        index=all_index,
+                        columns=[metric.name for metric in stage_metrics],
+                    )
+
+            if stage_df is None:
+
+                def evaluate_group(
+                    group: pd.DataFrame,
+                    ds_ids: tuple[DataSourceID, ...] = ds_ids,
+                    referenced_names: list[str] = referenced_names,
+                    stage_metrics: list[Metric] = stage_metrics,
+                ) -> pd.Series:
+                    shared = shared_results.setdefault((ds_ids, group.name), {})
+                    metric_values = {
+                        name: unscaled_results[name].loc[group.name]
+                        for name in referenced_names
+                    }
+
+                    values: dict[str, float] = {}
+
+                    for metric in stage_metrics:
+                        try:
+                            values[metric.name] = metric.evaluate(
+                                group, metric_values, shared
+                            )
+                        except ValueError:
+                            if not errors_as_nan:
+                                raise
+
+                            values[metric.name] = np.nan
+
+                    return pd.Series(values)
+
+                stage_df = (
+                    filtered_data
+                    .groupby(groupby_variables, observed=False)
+                    .apply(evaluate_group)
+                    .reindex(
+                        index=all_index,
+                        columns=[metric.name for metric in stage_metrics],
+                    )
+                    .astype("float64")
+                )
+
+            for metric in stage_metrics:
+                unscaled_results[metric.name] = stage_df[metric.name]
+                results[metric.name] = (
+                    stage_df[metric.name] * 100
+                    if metric.is_percentage
+                    else stage_df[metric.name]
+                )
+
     def get_summarized_metrics(
         self,
         groupby_variables: list[pd.Series],
         data_filter: pd.Series | None = None,
         metrics: list[Metric] | None = None,
+        weights: pd.Series | None = None,
+        errors_as_nan: bool = False,
     ):
         """
         Summarizes metrics based on the provided groupby variables and filter.
@@ -326,6 +692,14 @@ class DataRepository(BaseRepository):
         - groupby_variables list[pd.Series]: The list of variables to group by.
         - filter (pd.Series, optional): A boolean mask to filter the data. Defaults to None.
         - metrics list[METRIC]: A list of metrics to summarize. Defaults to None.
+        - weights (pd.Series, optional): Row weights of the sums, counts and sizes.
+        - errors_as_nan (bool, optional): Metrics that raise a ValueError on a group
+        (e.g. an empty one) are NaN there instead of failing the table.
+        Metrics that reduce to sums, counts and sketches, including the metrics
+        referenced through `metric('Name')`, are evaluated from per-group statistics
+        in one pass over the rows. Only these metrics are weighted; others are
+        evaluated on the unweighted rows (see `MetricRepository.weighting_warning`).
+        Referenced metrics are evaluated first, once per table.
         Returns:
         - pd.DataFrame: A DataFrame containing the summarized metrics.
         """
@@ -356,26 +730,37 @@ class DataRepository(BaseRepository):
 
         all_index = base_df.groupby(groupby_variables, observed=False).count().index
 
-        metric_results: list[pd.Series] = []
-
-        for metric in metrics:
-            loaded_data = self.load_columns(
-                metric.used_columns, data_source_ids=metric.data_source_ids
-            )
-
-            metric_data = pd.concat([base_df, loaded_data], axis=1)
-
-            filtered_data = metric_data[
-                data_filter & self.get_data_source_mask(metric.data_source_ids)
-            ]
+        if base_df.shape[1] == 1:
+            group_keys: pd.Index = pd.Index(base_df.iloc[:, 0])
+        else:
+            group_keys = pd.MultiIndex.from_frame(base_df)
+
+        segment_codes = all_index.get_indexer(group_keys)
+
+        # Referenced metrics are aggregated too, so that formulas see them weighted
+        evaluation_order = metric_evaluation_order(metrics)
+
+        results: dict[str, pd.Series] = {
+            evaluation_order[position].name: result
+            for position, result in self.__aggregate_metrics(
+                evaluation_order, segment_codes, all_index, data_filter, weights
+            ).items()
+        }
+
+        self.__evaluate_metric_graph(
+            metrics=metrics,
+            results=results,
+            base_df=base_df,
+            groupby_variables=groupby_variables,
+            segment_codes=segment_codes,
+            all_index=all_index,
+            data_filter=data_filter,
+            errors_as_nan=errors_as_nan,
+        )
 
-            metric_result = (
-                filtered_data.groupby(groupby_variables, observed=False)
-                .apply(metric.calculate)
-                .reindex(all_index)
-            )
-            metric_result.name = metric.pretty_name
-            metric_results.append(metric_result)
+        metric_results: list[pd.Series] = [
+            results[metric.name].rename(metric.pretty_name) for metric in metrics
+        ]
 
         if metric_results:
             result_df = pd.concat(metric_results, axis=1)
@@ -1,17 +1,24 @@
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 
+from risc_tool.data.models.data_change import DataChange
 from risc_tool.data.models.enums import (
     ComparisonOperation,
+    DataChangeType,
     PercentileOptions,
     Signature,
 )
 from risc_tool.data.models.exceptions import InvalidFilterError
 from risc_tool.data.models.filter import Filter
+from risc_tool.data.models.filter_plan import PredicateCache
+from risc_tool.data.models.filter_preview import FilterPreview
 from risc_tool.data.models.json_models import FilterRepositoryJSON
-from risc_tool.data.models.outlier import OutlierRule
+from risc_tool.data.models.outlier import PERCENTILE_FRACTIONS, OutlierRule
+from risc_tool.data.models.packed_mask import PackedMask
 from risc_tool.data.models.types import ChangeIDs, FilterID
+from risc_tool.data.models.zone_map import ZoneMap
 from risc_tool.data.repositories.base import BaseRepository
 from risc_tool.data.repositories.data import DataRepository
 from risc_tool.utils.duplicate_name import create_duplicate_name
@@ -29,11 +36,60 @@ class FilterRepository(BaseRepository):
 
         # Cache
         self.__verified_filters: dict[str, Filter] = {}
+        # Combined masks, keyed by the set of filters in them and the data version
+        self.__data_version: int = 0
+        self.__index: pd.Index | None = None
+        self.__combined_masks: t.OrderedDict[
+            tuple[frozenset[FilterID], int], PackedMask
+        ] = t.OrderedDict()
+        self.max_combined_masks: int = 32
+        # Masks of the conditions the filters are made of, shared by all filters
+        self.__predicate_cache: PredicateCache = PredicateCache()
+
+        # Draft filter previews are completed one at a time in the background
+        self.__filter_preview: FilterPreview | None = None
+        self.__preview_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1)
 
         # Dependencies
         self.__data_repository: DataRepository = data_repository
 
-    def __update_user_defined_filters(self):
+    def __update_mask_slices(
+        self, filter_obj: Filter, data_changes: list[DataChange]
+    ) -> None:
+        """
+        Recomputes the mask of `filter_obj` only for the rows of the data sources
+        whose values in the filter's columns changed, keeping the rest.
+        """
+
+        changed_ids = {
+            data_source_id
+            for data_change in data_changes
+            if data_change.touches(filter_obj.used_columns)
+            for data_source_id in data_change.data_source_ids
+        }
+
+        if not changed_ids:
+            return
+
+        mask = t.cast(PackedMask, filter_obj.mask).to_series()
+        slices = [mask.drop(list(changed_ids), level=0, errors="ignore")]
+
+        for data_source_id in changed_ids:
+            if data_source_id not in self.__data_repository.data_sources:
+                continue
+
+            filter_obj.create_mask(
+                self.__data_repository.load_source_columns(
+                    data_source_id, filter_obj.used_columns
+                )
+            )
+            slices.append(t.cast(PackedMask, filter_obj.mask).to_series())
+
+        filter_obj.mask = PackedMask.from_series(
+            pd.concat(slices).reindex(self.__data_index)
+        )
+
+    def __update_user_defined_filters(self, data_changes: list[DataChange] | None):
         if not self.__data_repository.sample_loaded:
             self.filters.clear()
             return
@@ -45,20 +101,70 @@ class FilterRepository(BaseRepository):
         for filter_id, filter_obj in self.filters.items():
             try:
                 filter_obj.validate_query(available_columns=all_columns)
+
+                # Aggregates in a query depend on the rows of every data source
+                if (
+                    data_changes is not None
+                    and filter_obj.mask is not None
+                    and filter_obj.is_row_wise
+                ):
+                    self.__update_mask_slices(filter_obj, data_changes)
+                    continue
+
                 data = self.__data_repository.load_columns(filter_obj.used_columns)
-                filter_obj.create_mask(data)
+                filter_obj.create_mask(
+                    data,
+                    predicate_cache=self.__predicate_cache,
+                    zone_maps=self.__zone_maps(filter_obj),
+                )
             except InvalidFilterError:
                 filter_ids_to_remove.append(filter_id)
 
         for filter_id in filter_ids_to_remove:
             del self.filters[filter_id]
 
+    def __zone_maps(self, filter_obj: Filter) -> dict[str, ZoneMap]:
+        return self.__data_repository.get_zone_maps(filter_obj.used_columns)
+
     def __clear_cache(self):
         self.__verified_filters.clear()
 
+    def __invalidate_combined_masks(self, filter_id: FilterID):
+        for key in list(self.__combined_masks):
+            if filter_id in key[0]:
+                del self.__combined_masks[key]
+
     def on_dependency_update(self, change_ids: ChangeIDs):
+        data_changes = self.__data_repository.get_data_changes(change_ids)
+
+        if data_changes is not None and all(
+            data_change.change_type == DataChangeType.RELABELED
+            for data_change in data_changes
+        ):
+            # No values changed, so every mask is still valid
+            return
+
+        # Combined masks are rebuilt against the new data
+        self.__data_version += 1
+        self.__index = None
+        self.__combined_masks.clear()
+
+        # Cached conditions are only kept if the rows stay the same
+        if data_changes is None or any(
+            data_change.change_type != DataChangeType.MODIFIED
+            or data_change.columns is None
+            for data_change in data_changes
+        ):
+            self.__predicate_cache.invalidate()
+        else:
+            for data_change in data_changes:
+                self.__predicate_cache.invalidate(data_change.columns)
+
+        if self.__filter_preview is not None:
+            self.__filter_preview.cancel()
+
         # Update use defined filters
-        self.__update_user_defined_filters()
+        self.__update_user_defined_filters(data_changes)
 
         # clear cache
         self.__clear_cache()
@@ -77,12 +183,42 @@ class FilterRepository(BaseRepository):
 
         # Creating mask
         df = self.__data_repository.load_columns(column_names=new_filter.used_columns)
-        new_filter.create_mask(df)
+        new_filter.create_mask(
+            df,
+            predicate_cache=self.__predicate_cache,
+            zone_maps=self.__zone_maps(new_filter),
+        )
 
         self.__verified_filters[query] = new_filter
 
         return new_filter
 
+    def preview_filter(self, query: str, time_budget: float = 0.2) -> FilterPreview:
+        """
+        Counts of the rows that pass `query`, estimated from the rows evaluated
+        within `time_budget` seconds. If these are not all the rows, the counts are
+        completed in the background and become exact once `is_exact` is set.
+        """
+
+        if self.__filter_preview is not None:
+            self.__filter_preview.cancel()
+
+        new_filter = Filter(uid=FilterID.TEMPORARY, name="", query=query)
+        new_filter.validate_query(available_columns=self.__data_repository.all_columns)
+
+        preview = FilterPreview(
+            new_filter,
+            self.__data_repository.load_columns(column_names=new_filter.used_columns),
+        )
+        preview.refine(time_budget)
+
+        if not preview.is_exact:
+            preview.refine_in_background(self.__preview_executor)
+
+        self.__filter_preview = preview
+
+        return preview
+
     def create_filter(self, name: str, query: str) -> None:
         new_filter = self.validate_filter(name, query)
         new_filter.uid = FilterID(self._get_new_id(current_ids=self.filters.keys()))
@@ -99,6 +235,7 @@ class FilterRepository(BaseRepository):
         modified_filter.uid = filter_id
 
         self.filters[filter_id] = modified_filter
+        self.__invalidate_combined_masks(filter_id)
 
         self.notify_subscribers()
 
@@ -106,6 +243,8 @@ class FilterRepository(BaseRepository):
         if filter_id in self.filters:
             del self.filters[filter_id]
 
+        self.__invalidate_combined_masks(filter_id)
+
         self.notify_subscribers()
 
     def duplicate_filter(self, filter_id: FilterID) -> None:
@@ -138,11 +277,9 @@ class FilterRepository(BaseRepository):
         comparison_op: ComparisonOperation,
         comparison_base: PercentileOptions | float,
     ):
-        variable = self.__data_repository.load_column(variable_name)
-
-        new_outlier = OutlierRule(
+        new_outlier = OutlierRule.from_summary(
             uid=FilterID.TEMPORARY,
-            variable=variable,
+            summary=self.__data_repository.get_column_summary(variable_name),
             comparison_op=comparison_op,
             comparison_base=comparison_base,
         )
@@ -151,10 +288,36 @@ class FilterRepository(BaseRepository):
         new_outlier.validate_query(available_columns=[variable_name])
 
         # Creating mask
-        new_outlier.create_mask(variable.to_frame())
+        new_outlier.create_mask(
+            self.__data_repository.load_columns([variable_name]),
+            predicate_cache=self.__predicate_cache,
+            zone_maps=self.__zone_maps(new_outlier),
+        )
 
         return new_outlier
 
+    def preview_outlier_rules(
+        self,
+        variable_name: str,
+        comparison_op: ComparisonOperation,
+    ) -> pd.DataFrame:
+        """
+        Threshold and number of outliers of a rule on `variable_name` for every
+        percentile option, all resolved from the cached summary of the column.
+        """
+
+        summary = self.__data_repository.get_column_summary(variable_name)
+
+        thresholds = summary.quantiles(
+            list(PERCENTILE_FRACTIONS.values()), exclude_mode=True
+        )
+        outlier_counts = summary.count(comparison_op, thresholds, exclude_mode=True)
+
+        return pd.DataFrame(
+            {"threshold": thresholds, "outlier_count": outlier_counts},
+            index=pd.Index(list(PERCENTILE_FRACTIONS.keys()), name="percentile"),
+        )
+
     def create_outlier_rule(
         self,
         variable_name: str,
@@ -187,44 +350,85 @@ class FilterRepository(BaseRepository):
         modified_outlier.uid = filter_id
 
         self.filters[filter_id] = modified_outlier
+        self.__invalidate_combined_masks(filter_id)
 
         self.notify_subscribers()
 
-    def get_mask(
-        self, filter_ids: t.Iterable[FilterID], remove_outliers: bool = False
-    ) -> pd.Series:
-        index = self.__data_repository.index
-        mask = pd.Series(True, index=index, dtype=bool)
+    @property
+    def __data_index(self) -> pd.Index:
+        if self.__index is None:
+            self.__index = self.__data_repository.index
 
-        if not self.filters:
-            return mask
+        return self.__index
 
-        filter_ids = list(filter_ids)
+    def __filter_mask(self, filter_id: FilterID) -> PackedMask:
+        filter_obj = self.filters[filter_id]
+        index = self.__data_index
 
-        if remove_outliers:
-            filter_ids.extend(self.outlier_rule_ids)
+        if filter_obj.mask is None or not filter_obj.mask.index.equals(index):
+            filter_obj.create_mask(
+                self.__data_repository.load_columns(
+                    column_names=filter_obj.used_columns
+                ),
+                predicate_cache=self.__predicate_cache,
+                zone_maps=self.__zone_maps(filter_obj),
+            )
 
-        if not filter_ids:
-            return mask
+        return t.cast(PackedMask, filter_obj.mask)
 
-        for filter_id in filter_ids:
-            if filter_id not in self.filters:
-                continue
+    def __combine_masks(self, filter_ids: frozenset[FilterID]) -> PackedMask:
+        key = (filter_ids, self.__data_version)
 
-            filter_obj = self.filters[filter_id]
+        if key in self.__combined_masks:
+            self.__combined_masks.move_to_end(key)
+            return self.__combined_masks[key]
 
-            if filter_obj.mask is None or not filter_obj.mask.index.equals(index):
-                filter_obj.create_mask(
-                    self.__data_repository.load_columns(
-                        column_names=filter_obj.used_columns
-                    )
-                )
+        # Starting from the largest cached subset, only the other filters are ANDed
+        base_ids: frozenset[FilterID] = frozenset()
+        mask = PackedMask.full(self.__data_index)
+
+        for (cached_ids, version), cached_mask in self.__combined_masks.items():
+            if (
+                version == self.__data_version
+                and cached_ids < filter_ids
+                and len(cached_ids) > len(base_ids)
+            ):
+                base_ids, mask = cached_ids, cached_mask
+
+        for filter_id in sorted(filter_ids - base_ids):
+            mask &= self.__filter_mask(filter_id)
+
+        self.__combined_masks[key] = mask
+
+        while len(self.__combined_masks) > self.max_combined_masks:
+            self.__combined_masks.popitem(last=False)
+
+        return mask
+
+    def get_packed_mask(
+        self, filter_ids: t.Iterable[FilterID], remove_outliers: bool = False
+    ) -> PackedMask:
+        filter_ids = set(filter_ids)
+
+        if remove_outliers:
+            filter_ids.update(self.outlier_rule_ids)
+
+        known_ids = frozenset(filter_ids & self.filters.keys())
 
-            current_mask = t.cast(pd.Series, filter_obj.mask)
+        if not known_ids:
+            return PackedMask.full(self.__data_index)
 
-            mask &= current_mask
+        return self.__combine_masks(known_ids)
 
-        return mask.astype("boolean")
+    def get_mask(
+        self, filter_ids: t.Iterable[FilterID], remove_outliers: bool = False
+    ) -> pd.Series:
+        return (
+            self
+            .get_packed_mask(filter_ids, remove_outliers)
+            .to_series()
+            .astype("boolean")
+        )
 
     def get_filters(
         self, filter_ids: list[FilterID] | None = None, outliers: bool = False
@@ -257,8 +461,8 @@ class FilterRepository(BaseRepository):
 
         for filter_json in data.filters:
             if filter_json.is_outlier:
-                variable = data_repository.load_column(filter_json.variable_name)
-                filter_obj = OutlierRule.from_dict(filter_json, variable=variable)
+                summary = data_repository.get_column_summary(filter_json.variable_name)
+                filter_obj = OutlierRule.from_dict(filter_json, summary=summary)
             else:
                 filter_obj = Filter.from_dict(filter_json)
 
@@ -271,7 +475,11 @@ class FilterRepository(BaseRepository):
                 continue
 
             df = data_repository.load_columns(filter_obj.used_columns)
-            filter_obj.create_mask(df)
+            filter_obj.create_mask(
+                df,
+                predicate_cache=repo.__predicate_cache,
+                zone_maps=repo.__zone_maps(filter_obj),
+            )
             repo.filters[filter_obj.uid] = filter_obj
 
         return repo, invalid_filters
@@ -3,10 +3,12 @@ import re
 import textwrap
 import typing as t
 
+import numpy as np
 import pandas as pd
 
 from risc_tool.data.models.enums import (
     LossRateTypes,
+    PivotDimension,
     RangeColumn,
     RowIndex,
     RSDetCol,
@@ -23,10 +25,22 @@ from risc_tool.data.models.iteration import (
 )
 from risc_tool.data.models.iteration import from_dict as iteration_from_dict
 from risc_tool.data.models.iteration_graph import IterationGraph
-from risc_tool.data.models.iteration_output import IterationOutput
+from risc_tool.data.models.iteration_output import (
+    IterationOutput,
+    IterationOutputCache,
+)
 from risc_tool.data.models.json_models import IterationRepositoryJSON
+from risc_tool.data.models.metric import Metric
+from risc_tool.data.models.metric_aggregates import (
+    DEFAULT_CONFIDENCE_LEVEL,
+    SIZE_TERM,
+    MetricDecomposition,
+    SegmentAggregates,
+)
+from risc_tool.data.models.metric_cube import MetricCube, with_missing_level
 from risc_tool.data.models.types import (
     ChangeIDs,
+    DataSourceID,
     FilterID,
     GridMetricSummary,
     IterationID,
@@ -73,14 +87,18 @@ class IterationsRepository(BaseRepository):
         self.graph = IterationGraph()
 
         # Cached data
-        self.__iteration_outputs: dict[
-            tuple[IterationID, t.Literal["default", "edited"]], IterationOutput
-        ] = {}
+        self.__iteration_outputs = IterationOutputCache()
 
         self.__recalculation_required: set[
             tuple[IterationID, t.Literal["default", "edited"]]
         ] = set()
 
+        # Errors of every output evaluated, including the ancestors evaluated on
+        # the way to an output without materializing theirs
+        self.__iteration_errors: dict[
+            tuple[IterationID, t.Literal["default", "edited"]], list[str]
+        ] = {}
+
         self.__metric_range_cache: dict[
             tuple[
                 IterationID,  # iteration_id
@@ -90,6 +108,7 @@ class IterationsRepository(BaseRepository):
                 bool,  # scalars_enabled
                 bool,  # remove_outliers
                 bool,  # show_total_row
+                bool,  # confidence_intervals
             ],
             tuple[pd.DataFrame, list[str], list[str]],
         ] = {}
@@ -108,6 +127,35 @@ class IterationsRepository(BaseRepository):
             tuple[list[GridMetricSummary], list[str], list[str]],
         ] = {}
 
+        self.__segment_aggregates: dict[
+            tuple[
+                IterationID,  # iteration_id
+                t.Literal["default", "edited"],  # default_or_edited
+                tuple[FilterID, ...],  # filter_ids
+                bool,  # remove_outliers
+                tuple[DataSourceID, ...],  # data_source_ids
+            ],
+            SegmentAggregates,
+        ] = {}
+
+        self.__pending_row_moves: dict[
+            tuple[IterationID, t.Literal["default", "edited"]], np.ndarray
+        ] = {}
+
+        self.__sorted_variables: dict[IterationID, tuple[np.ndarray, np.ndarray]] = {}
+
+        self.__metric_cubes: dict[
+            tuple[
+                IterationID,  # iteration_id
+                bool,  # default
+                tuple[str, ...],  # dimensions
+                tuple[FilterID, ...],  # filter_ids
+                bool,  # remove_outliers
+                tuple[DataSourceID, ...],  # data_source_ids
+            ],
+            MetricCube,
+        ] = {}
+
         # Dependencies
         self.__data_repository = data_repository
         self.__filter_repository = filter_repository
@@ -142,8 +190,13 @@ class IterationsRepository(BaseRepository):
         # Clear Cache
         self.__iteration_outputs.clear()
         self.__recalculation_required.clear()
+        self.__iteration_errors.clear()
         self.__metric_range_cache.clear()
         self.__metric_grid_cache.clear()
+        self.__segment_aggregates.clear()
+        self.__pending_row_moves.clear()
+        self.__sorted_variables.clear()
+        self.__metric_cubes.clear()
 
     def iteration_selector_options(self, keep_inactive: bool = False):
         options: dict[tuple[IterationID, bool], str] = {}
@@ -185,15 +238,19 @@ class IterationsRepository(BaseRepository):
             if iteration_id in self.iterations:
                 del self.iterations[iteration_id]
 
-            if (iteration_id, "default") in self.__iteration_outputs:
-                del self.__iteration_outputs[(iteration_id, "default")]
+            self.__iteration_outputs.pop((iteration_id, "default"))
+            self.__iteration_outputs.pop((iteration_id, "edited"))
 
-            if (iteration_id, "edited") in self.__iteration_outputs:
-                del self.__iteration_outputs[(iteration_id, "edited")]
+            self.__iteration_errors.pop((iteration_id, "default"), None)
+            self.__iteration_errors.pop((iteration_id, "edited"), None)
 
             if iteration_id in self.graph.connections:
                 del self.graph.connections[iteration_id]
 
+            self.__sorted_variables.pop(iteration_id, None)
+            self.__drop_segment_aggregates(iteration_id, "default")
+            self.__drop_segment_aggregates(iteration_id, "edited")
+
         for parent, children in self.graph.connections.items():
             self.graph.connections[parent] = [
                 child for child in children if child not in iteration_ids_to_delete
@@ -201,48 +258,212 @@ class IterationsRepository(BaseRepository):
 
         self.__metric_range_cache.clear()
         self.__metric_grid_cache.clear()
+        self.__metric_cubes.clear()
 
         self.notify_subscribers()
 
-    def add_to_calculation_queue(self, iteration_id: IterationID):
+    def add_to_calculation_queue(
+        self, iteration_id: IterationID, moved_rows: np.ndarray | None = None
+    ):
+        """
+        Marks the iteration and its descendants for recalculation.
+
+        `moved_rows` are the positions of the only rows whose segment may have
+        changed in the edited output. When given, cached segment aggregates are
+        patched with those rows instead of being rebuilt from all rows.
+        """
         self.__metric_range_cache.clear()
         self.__metric_grid_cache.clear()
+        self.__metric_cubes.clear()
 
         self.__recalculation_required.add((iteration_id, "default"))
         self.__recalculation_required.add((iteration_id, "edited"))
+        self.__iteration_errors.pop((iteration_id, "default"), None)
+        self.__iteration_errors.pop((iteration_id, "edited"), None)
+
+        if moved_rows is None:
+            self.__drop_segment_aggregates(iteration_id, "default")
+            self.__drop_segment_aggregates(iteration_id, "edited")
+        else:
+            self.__add_pending_row_moves(iteration_id, "edited", moved_rows)
 
         for descendant in self.graph.get_descendants(iteration_id):
             self.__recalculation_required.add((descendant, "default"))
             self.__recalculation_required.add((descendant, "edited"))
+            self.__iteration_errors.pop((descendant, "default"), None)
+            self.__iteration_errors.pop((descendant, "edited"), None)
+
+            for default_or_edited in ("default", "edited"):
+                if moved_rows is None:
+                    self.__drop_segment_aggregates(descendant, default_or_edited)
+                else:
+                    self.__add_pending_row_moves(
+                        descendant, default_or_edited, moved_rows
+                    )
+
+    def __drop_segment_aggregates(
+        self,
+        iteration_id: IterationID,
+        default_or_edited: t.Literal["default", "edited"],
+    ):
+        self.__pending_row_moves.pop((iteration_id, default_or_edited), None)
+
+        for key in list(self.__segment_aggregates.keys()):
+            if key[:2] == (iteration_id, default_or_edited):
+                del self.__segment_aggregates[key]
+
+    def __add_pending_row_moves(
+        self,
+        iteration_id: IterationID,
+        default_or_edited: t.Literal["default", "edited"],
+        moved_rows: np.ndarray,
+    ):
+        if not any(
+            key[:2] == (iteration_id, default_or_edited)
+            for key in self.__segment_aggregates
+        ):
+            return
+
+        prefix = (iteration_id, default_or_edited)
+
+        if prefix in self.__pending_row_moves:
+            moved_rows = np.union1d(self.__pending_row_moves[prefix], moved_rows)
+
+        self.__pending_row_moves[prefix] = moved_rows
+
+    def __get_sorted_variable(
+        self, iteration: Iteration
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if iteration.uid not in self.__sorted_variables:
+            values = iteration.variable.to_numpy(dtype="float64", na_value=np.nan)
+            order = np.argsort(values, kind="stable")
+            self.__sorted_variables[iteration.uid] = (order, values[order])
+
+        return self.__sorted_variables[iteration.uid]
+
+    def __get_moved_rows(
+        self, iteration: Iteration, old_groups: pd.Series, new_groups: pd.Series
+    ) -> np.ndarray | None:
+        """
+        Finds the rows whose group may differ between two sets of numerical groups.
+
+        A row can only change group if its value lies between the old and the new
+        position of an edited bound, or inside a group that became valid or invalid.
+        Those ranges are looked up in the sorted variable, so the cost is
+        proportional to the number of moved rows.
+        """
+        if iteration.var_type != VariableType.NUMERICAL:
+            return None
+
+        if not old_groups.index.equals(new_groups.index):
+            return None
+
+        def is_valid(bounds: tuple[float, float]) -> bool:
+            lower_bound, upper_bound = bounds
+            return (
+                not pd.isna(lower_bound)
+                and not pd.isna(upper_bound)
+                and lower_bound < upper_bound
+            )
+
+        ranges: list[tuple[float, float]] = []
+
+        for group_index, new_bounds in new_groups.items():
+            old_bounds = old_groups[group_index]
+
+            if old_bounds == new_bounds:
+                continue
+
+            if is_valid(old_bounds) and is_valid(new_bounds):
+                for old_bound, new_bound in zip(old_bounds, new_bounds):
+                    ranges.append((
+                        min(old_bound, new_bound),
+                        max(old_bound, new_bound),
+                    ))
+            else:
+                ranges.extend(
+                    bounds for bounds in (old_bounds, new_bounds) if is_valid(bounds)
+                )
+
+        order, sorted_values = self.__get_sorted_variable(iteration)
+
+        # Groups are right-closed, so (lower_bound, upper_bound] maps to this slice.
+        starts = np.searchsorted(sorted_values, [r[0] for r in ranges], side="right")
+        stops = np.searchsorted(sorted_values, [r[1] for r in ranges], side="right")
+
+        moved_rows = [order[start:stop] for start, stop in zip(starts, stops)]
+
+        if not moved_rows:
+            return np.array([], dtype=np.int64)
+
+        return np.unique(np.concatenate(moved_rows))
 
     def get_risk_segments(
         self, iteration_id: IterationID, default: bool
     ) -> IterationOutput:
-        default_or_edited = "default" if default else "edited"
-
-        if (iteration_id, default_or_edited) not in self.__iteration_outputs:
-            self.add_to_calculation_queue(iteration_id)
+        key = (iteration_id, "default" if default else "edited")
 
         # No calculation required. Taking from cache.
-        if (iteration_id, default_or_edited) not in self.__recalculation_required:
-            return self.__iteration_outputs[(iteration_id, default_or_edited)]
+        if key not in self.__recalculation_required:
+            iteration_output = self.__iteration_outputs.get(
+                key, self.iterations[iteration_id].variable.index
+            )
 
-        # Calculation Required.
-        previous_risk_segments = None
+            if iteration_output is not None:
+                return iteration_output
 
-        if not self.graph.is_root(iteration_id) and (
-            (parent_id := self.graph.get_parent(iteration_id)) is not None
-        ):
-            previous_iteration_output = self.get_risk_segments(parent_id, default=False)
-            previous_risk_segments = previous_iteration_output.risk_segment_column
+        # Calculation Required, or the output was dropped from the cache.
+        iteration_output = self.__evaluate_chain(iteration_id, default)
 
-        iteration_output = self.iterations[iteration_id].get_risk_segments(
-            previous_risk_segments=previous_risk_segments,
-            default=default,
+        self.__iteration_outputs.put(key, iteration_output)
+        self.__recalculation_required.discard(key)
+
+        return iteration_output
+
+    def __evaluate_chain(
+        self, iteration_id: IterationID, default: bool
+    ) -> IterationOutput:
+        """
+        Evaluates the risk segments of an iteration in one pass down its chain of
+        ancestors, starting below the nearest one with an up-to-date output.
+
+        Every level maps the segment codes of the level above through its lookup
+        table, so only the codes of one level are kept at a time and the outputs
+        of the ancestors are not materialized. Their errors are recorded.
+        """
+        ancestor_ids: list[IterationID] = []
+        previous_codes: np.ndarray | None = None
+        previous_categories: pd.Index | None = None
+
+        ancestor_id = self.graph.get_parent(iteration_id)
+
+        while ancestor_id is not None:
+            key = (ancestor_id, "edited")
+
+            if (
+                key not in self.__recalculation_required
+                and (cached := self.__iteration_outputs.get_codes(key)) is not None
+            ):
+                previous_codes, previous_categories = cached
+                break
+
+            ancestor_ids.append(ancestor_id)
+            ancestor_id = self.graph.get_parent(ancestor_id)
+
+        for ancestor_id in reversed(ancestor_ids):
+            _, errors, _, previous_codes, previous_categories = self.iterations[
+                ancestor_id
+            ].get_segment_codes(previous_codes, previous_categories, default=False)
+
+            self.__iteration_errors[(ancestor_id, "edited")] = errors
+
+        iteration_output = self.iterations[iteration_id].get_risk_segments_from_codes(
+            previous_codes, previous_categories, default=default
         )
 
-        self.__iteration_outputs[(iteration_id, default_or_edited)] = iteration_output
-        self.__recalculation_required.remove((iteration_id, default_or_edited))
+        self.__iteration_errors[(iteration_id, "default" if default else "edited")] = (
+            iteration_output.errors
+        )
 
         return iteration_output
 
@@ -533,6 +754,8 @@ class IterationsRepository(BaseRepository):
                     data_source_ids=self.__metric_repository.data_source_ids,
                 )
 
+            weights = self.__metric_repository.load_weights()
+
             if use_scalar:
                 dlr_scalar = self.__scalar_repository.get_scalar(LossRateTypes.DLR)
                 ulr_scalar = self.__scalar_repository.get_scalar(LossRateTypes.ULR)
@@ -551,6 +774,7 @@ class IterationsRepository(BaseRepository):
                 var_dlr_bad=var_dlr_bad,
                 var_unt_bad=var_unt_bad,
                 var_avg_bal=var_avg_bal,
+                weights=weights,
             )
 
             if variable_dtype == VariableType.NUMERICAL:
@@ -681,6 +905,11 @@ class IterationsRepository(BaseRepository):
                 numerator = var_unt_bad
                 denominator = pd.Series(1, index=variable.index)
 
+            weights = self.__metric_repository.load_weights()
+            if weights is not None:
+                numerator = numerator * weights
+                denominator = denominator * weights
+
             if variable_dtype == VariableType.NUMERICAL:
                 hv_imp_hr = does_high_value_implies_high_risk(
                     variable=variable,
@@ -710,6 +939,7 @@ class IterationsRepository(BaseRepository):
                     var_unt_bad=var_unt_bad,
                     var_avg_bal=var_avg_bal,
                     hv_imp_hr=hv_imp_hr,
+                    weights=weights,
                 )
 
                 if variable_dtype == VariableType.NUMERICAL:
@@ -1036,6 +1266,8 @@ class IterationsRepository(BaseRepository):
         else:
             categories = pd.Series(index=groups.index)
 
+        old_groups = iteration.groups
+
         for row_index in iteration.groups.index:
             iteration.set_group(
                 group_index=row_index,
@@ -1044,7 +1276,9 @@ class IterationsRepository(BaseRepository):
                 categories=categories[row_index],
             )
 
-        self.add_to_calculation_queue(iteration.uid)
+        moved_rows = self.__get_moved_rows(iteration, old_groups, iteration.groups)
+
+        self.add_to_calculation_queue(iteration.uid, moved_rows=moved_rows)
         self.notify_subscribers()
 
     def get_metric_range(
@@ -1056,7 +1290,13 @@ class IterationsRepository(BaseRepository):
         scalars_enabled: bool,
         remove_outliers: bool,
         show_total_row: bool,
+        confidence_intervals: bool = False,
     ) -> tuple[pd.DataFrame, list[str], list[str]]:
+        """
+        Metric values of every risk segment, formatted for display. With
+        `confidence_intervals`, decomposable metrics get an extra column with
+        their bootstrapped confidence interval.
+        """
         key = (
             iteration_id,
             default,
@@ -1065,15 +1305,21 @@ class IterationsRepository(BaseRepository):
             scalars_enabled,
             remove_outliers,
             show_total_row,
+            confidence_intervals,
         )
 
+        all_metrics = self.__metric_repository.get_all_metrics()
+
         if key in self.__metric_range_cache:
-            return self.__metric_range_cache[key]
+            metric_df, errors, warnings = self.__metric_range_cache[key]
+            return (
+                self.__format_metric_df(metric_df, metric_ids, all_metrics),
+                errors,
+                warnings,
+            )
 
         risk_segment_details = self.get_risk_segment_details(iteration_id)
 
-        all_metrics = self.__metric_repository.get_all_metrics()
-
         valid_metrics = [
             all_metrics[metric_id]
             for metric_id in metric_ids
@@ -1082,26 +1328,22 @@ class IterationsRepository(BaseRepository):
 
         iteration_output = self.get_risk_segments(iteration_id, default=default)
 
-        metric_df = self.__data_repository.get_summarized_metrics(
-            groupby_variables=[iteration_output.risk_segment_column],
-            data_filter=self.__filter_repository.get_mask(filter_ids, remove_outliers),
+        metric_df = self.__get_segment_metrics(
+            iteration_id=iteration_id,
+            default=default,
+            filter_ids=filter_ids,
+            remove_outliers=remove_outliers,
+            iteration_output=iteration_output,
             metrics=valid_metrics,
+            show_total_row=show_total_row,
+            confidence_intervals=confidence_intervals,
         )
 
         scalar_df = risk_segment_details[[RSDetCol.MAF_DLR, RSDetCol.MAF_ULR]]
 
         if show_total_row:
-            total_metric_df_row = self.__data_repository.get_summarized_metrics(
-                groupby_variables=[],
-                data_filter=self.__filter_repository.get_mask(
-                    filter_ids, remove_outliers
-                ),
-                metrics=valid_metrics,
-            )
-            metric_df = pd.concat([metric_df, total_metric_df_row], axis=0)
-
             total_scalar_df_row = pd.DataFrame(
-                1, index=total_metric_df_row.index, columns=scalar_df.columns
+                1, index=[RowIndex.TOTAL], columns=scalar_df.columns
             )
             scalar_df = pd.concat([scalar_df, total_scalar_df_row], axis=0)
 
@@ -1111,29 +1353,298 @@ class IterationsRepository(BaseRepository):
             if MetricID.DLR_BAD_RATE in metric_ids:
                 scalar = self.__scalar_repository.get_scalar(LossRateTypes.DLR)
                 metric_name = all_metrics[MetricID.DLR_BAD_RATE].pretty_name
-                metric_df[metric_name] *= scalar.get_risk_scalar_factor(
-                    scalar_df[RSDetCol.MAF_DLR]
-                )
+                for column in self.__metric_columns(metric_df, metric_name):
+                    metric_df[column] *= scalar.get_risk_scalar_factor(
+                        scalar_df[RSDetCol.MAF_DLR]
+                    )
 
             if MetricID.UNT_BAD_RATE in metric_ids:
                 scalar = self.__scalar_repository.get_scalar(LossRateTypes.ULR)
                 metric_name = all_metrics[MetricID.UNT_BAD_RATE].pretty_name
-                metric_df[metric_name] *= scalar.get_risk_scalar_factor(
-                    scalar_df[RSDetCol.MAF_ULR]
-                )
-
-        for metric_id in metric_ids:
-            metric = all_metrics[metric_id]
-            metric_name = metric.pretty_name
-            metric_df[metric_name] = metric_df[metric_name].map(metric.format)
+                for column in self.__metric_columns(metric_df, metric_name):
+                    metric_df[column] *= scalar.get_risk_scalar_factor(
+                        scalar_df[RSDetCol.MAF_ULR]
+                    )
 
+        # Numbers are cached; display options are applied on every read.
         self.__metric_range_cache[key] = (
             metric_df,
             iteration_output.errors,
             iteration_output.warnings,
         )
 
-        return metric_df, iteration_output.errors, iteration_output.warnings
+        return (
+            self.__format_metric_df(metric_df, metric_ids, all_metrics),
+            iteration_output.errors,
+            iteration_output.warnings,
+        )
+
+    def __format_metric_df(
+        self,
+        metric_df: pd.DataFrame,
+        metric_ids: list[MetricID],
+        all_metrics: dict[MetricID, Metric],
+    ) -> pd.DataFrame:
+        formatted_df = pd.DataFrame(index=metric_df.index)
+
+        for metric_id in metric_ids:
+            metric = all_metrics[metric_id]
+            metric_name = metric.pretty_name
+            formatted_df[metric_name] = metric.format_values(metric_df[metric_name])
+
+            lower_column, upper_column = self.__interval_columns(metric_name)
+
+            if lower_column in metric_df.columns:
+                lower = metric.format_values(metric_df[lower_column])
+                upper = metric.format_values(metric_df[upper_column])
+                formatted_df[self.__interval_label(metric_name)] = (
+                    lower + " – " + upper
+                ).where(
+                    metric_df[lower_column].notna() & metric_df[upper_column].notna()
+                )
+
+        return formatted_df
+
+    @staticmethod
+    def __interval_columns(metric_name: str) -> tuple[str, str]:
+        return f"{metric_name} __CI_LOWER__", f"{metric_name} __CI_UPPER__"
+
+    @staticmethod
+    def __interval_label(metric_name: str) -> str:
+        return f"{metric_name} ({DEFAULT_CONFIDENCE_LEVEL:.0%} CI)"
+
+    def __metric_columns(self, metric_df: pd.DataFrame, metric_name: str) -> list[str]:
+        """The metric's column, followed by its interval bounds if present."""
+
+        return [metric_name] + [
+            column
+            for column in self.__interval_columns(metric_name)
+            if column in metric_df.columns
+        ]
+
+    def __has_chain_errors(
+        self, iteration_id: IterationID, iteration_output: IterationOutput
+    ) -> bool:
+        # An error anywhere up the chain blanks out every row, not just moved ones.
+        return bool(iteration_output.errors) or any(
+            self.__get_errors(ancestor_id)
+            for ancestor_id in self.graph.get_ancestors(iteration_id)
+        )
+
+    def __get_errors(self, iteration_id: IterationID) -> list[str]:
+        """Errors of the edited output, without materializing it if known."""
+
+        if (iteration_id, "edited") in self.__iteration_errors:
+            return self.__iteration_errors[(iteration_id, "edited")]
+
+        return self.get_risk_segments(iteration_id, default=False).errors
+
+    def __sync_segment_aggregates(
+        self,
+        iteration_id: IterationID,
+        default_or_edited: t.Literal["default", "edited"],
+        iteration_output: IterationOutput,
+    ):
+        prefix = (iteration_id, default_or_edited)
+        moved_rows = self.__pending_row_moves.pop(prefix, None)
+
+        risk_segments = iteration_output.risk_segment_column
+        n_segments = len(risk_segments.cat.categories)
+
+        if self.__has_chain_errors(iteration_id, iteration_output):
+            self.__drop_segment_aggregates(iteration_id, default_or_edited)
+            return
+
+        if moved_rows is None or len(moved_rows) == 0:
+            return
+
+        new_codes = risk_segments.cat.codes.to_numpy()[moved_rows]
+
+        for key in list(self.__segment_aggregates.keys()):
+            if key[:2] != prefix:
+                continue
+
+            if self.__segment_aggregates[key].n_segments != n_segments:
+                del self.__segment_aggregates[key]
+                continue
+
+            self.__segment_aggregates[key].move_rows(moved_rows, new_codes)
+
+    def __get_segment_aggregates(
+        self,
+        iteration_id: IterationID,
+        default_or_edited: t.Literal["default", "edited"],
+        filter_ids: list[FilterID],
+        remove_outliers: bool,
+        iteration_output: IterationOutput,
+        data_filter: pd.Series,
+        metric: Metric,
+        decomposition: MetricDecomposition,
+    ) -> SegmentAggregates:
+        key = (
+            iteration_id,
+            default_or_edited,
+            tuple(sorted(filter_ids)),
+            remove_outliers,
+            tuple(sorted(metric.data_source_ids)),
+        )
+
+        risk_segments = iteration_output.risk_segment_column
+
+        if key in self.__segment_aggregates:
+            aggregates = self.__segment_aggregates[key]
+        else:
+            row_mask = (
+                data_filter
+                & self.__data_repository.get_data_source_mask(metric.data_source_ids)
+            ).to_numpy(dtype=bool, na_value=False)
+            weights = self.__metric_repository.load_weights()
+
+            aggregates = SegmentAggregates(
+                codes=risk_segments.cat.codes.to_numpy(),
+                n_segments=len(risk_segments.cat.categories),
+                row_mask=row_mask,
+                weights=None if weights is None else weights.to_numpy(dtype="float64"),
+            )
+
+            # Aggregates of an erroneous output are never patched, only rebuilt.
+            if not self.__has_chain_errors(iteration_id, iteration_output):
+                self.__segment_aggregates[key] = aggregates
+
+        if not aggregates.has_terms(decomposition.terms):
+            loaded_data = self.__data_repository.load_columns(
+                metric.used_columns, data_source_ids=metric.data_source_ids
+            )
+            aggregates.add_terms(
+                decomposition.terms, decomposition.evaluate_receivers(loaded_data)
+            )
+
+        return aggregates
+
+    def __get_segment_metrics(
+        self,
+        iteration_id: IterationID,
+        default: bool,
+        filter_ids: list[FilterID],
+        remove_outliers: bool,
+        iteration_output: IterationOutput,
+        metrics: list[Metric],
+        show_total_row: bool,
+        confidence_intervals: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Summarizes the metrics for each risk segment (and the total row).
+
+        Metrics that decompose into additive statistics are evaluated from cached
+        segment aggregates, which are patched in place when band edges move. The
+        rest are grouped over all rows by the data repository.
+
+        With `confidence_intervals`, the bootstrapped bounds of the decomposable
+        metrics are added after their columns.
+        """
+        default_or_edited = "default" if default else "edited"
+        risk_segments = iteration_output.risk_segment_column
+        data_filter = self.__filter_repository.get_mask(filter_ids, remove_outliers)
+
+        self.__sync_segment_aggregates(
+            iteration_id, default_or_edited, iteration_output
+        )
+
+        segment_index = pd.Index(risk_segments.cat.categories)
+        metric_df = pd.DataFrame(index=segment_index)
+        total_row: dict[str, float] = {}
+        remaining_metrics: list[Metric] = []
+        interval_columns: dict[str, list[str]] = {}
+
+        for metric in metrics:
+            decomposition = MetricDecomposition(metric)
+
+            if not decomposition.is_decomposable:
+                remaining_metrics.append(metric)
+                continue
+
+            try:
+                aggregates = self.__get_segment_aggregates(
+                    iteration_id=iteration_id,
+                    default_or_edited=default_or_edited,
+                    filter_ids=filter_ids,
+                    remove_outliers=remove_outliers,
+                    iteration_output=iteration_output,
+                    data_filter=data_filter,
+                    metric=metric,
+                    decomposition=decomposition,
+                )
+            except (TypeError, ValueError):
+                remaining_metrics.append(metric)
+                continue
+
+            metric_df[metric.pretty_name] = aggregates.evaluate(decomposition)
+            total_row[metric.pretty_name] = aggregates.evaluate_total(decomposition)
+
+            # Intervals of plain row counts say little about the segments.
+            if not confidence_intervals or decomposition.terms == [SIZE_TERM]:
+                continue
+
+            try:
+                bounds = aggregates.bootstrap_intervals(decomposition)
+            except ValueError:
+                continue
+
+            columns = list(self.__interval_columns(metric.pretty_name))
+            interval_columns[metric.pretty_name] = columns
+
+            for column, values in zip(columns, bounds):
+                metric_df[column] = values[:-1]
+                total_row[column] = values[-1]
+
+        if remaining_metrics:
+            weights = self.__metric_repository.load_weights()
+
+            remaining_df = self.__data_repository.get_summarized_metrics(
+                groupby_variables=[risk_segments],
+                data_filter=data_filter,
+                metrics=remaining_metrics,
+                weights=weights,
+            )
+
+            if show_total_row:
+                remaining_total_df = self.__data_repository.get_summarized_metrics(
+                    groupby_variables=[],
+                    data_filter=data_filter,
+                    metrics=remaining_metrics,
+                    weights=weights,
+                )
+
+            for metric in remaining_metrics:
+                metric_df[metric.pretty_name] = remaining_df[
+                    metric.pretty_name
+                ].to_numpy()
+
+                if show_total_row:
+                    total_row[metric.pretty_name] = remaining_total_df.at[
+                        RowIndex.TOTAL, metric.pretty_name
+                    ]
+
+        metric_df = metric_df[
+            [
+                column
+                for metric in metrics
+                for column in [
+                    metric.pretty_name,
+                    *interval_columns.get(metric.pretty_name, []),
+                ]
+            ]
+        ]
+
+        if show_total_row:
+            total_df = pd.DataFrame(
+                [[total_row[column] for column in metric_df.columns]],
+                index=[RowIndex.TOTAL],
+                columns=metric_df.columns,
+            )
+            metric_df = pd.concat([metric_df, total_df], axis=0)
+
+        return metric_df
 
     def get_risk_segment_grid(
         self, iteration_id: IterationID, default: bool, details_column: RSDetCol
@@ -1209,6 +1720,237 @@ class IterationsRepository(BaseRepository):
         self.add_to_calculation_queue(iteration.uid)
         self.notify_subscribers()
 
+    def __pivot_dimension(
+        self, iteration_output: IterationOutput, dimension: str
+    ) -> pd.Series:
+        if dimension == PivotDimension.RISK_SEGMENT:
+            return iteration_output.risk_segment_column.rename(dimension)
+
+        if dimension == PivotDimension.DATA_SOURCE:
+            labels = {
+                ds_id: data_source.label
+                for ds_id, data_source in self.__data_repository.data_sources.items()
+            }
+            data_source_ids = self.__data_repository.index.get_level_values(0)
+
+            return pd.Series(
+                pd.Categorical(
+                    data_source_ids.map(labels),
+                    categories=list(dict.fromkeys(labels.values())),
+                ),
+                index=self.__data_repository.index,
+                name=dimension,
+            )
+
+        return self.__data_repository.load_column(
+            column_name=dimension, column_type=VariableType.CATEGORICAL
+        ).rename(dimension)
+
+    @staticmethod
+    def __order_levels(
+        table: pd.DataFrame,
+        rows: list[str],
+        columns: list[str],
+        levels: dict[str, pd.Index],
+    ) -> pd.DataFrame:
+        """
+        Orders the `rows` and `columns` of a pivot table by the levels of the
+        dimensions, so that the tables of all metrics line up.
+        """
+
+        def axis(axis_dimensions: list[str]) -> pd.Index:
+            if len(axis_dimensions) == 1:
+                return levels[axis_dimensions[0]].rename(axis_dimensions[0])
+
+            return pd.MultiIndex.from_product(
+                [levels[dimension] for dimension in axis_dimensions],
+                names=axis_dimensions,
+            )
+
+        if rows:
+            table = table.reindex(index=axis(rows))
+        if columns:
+            table = table.reindex(columns=axis(columns))
+
+        return table
+
+    def get_metric_cube(
+        self,
+        iteration_id: IterationID,
+        default: bool,
+        dimensions: list[str],
+        filter_ids: list[FilterID],
+        remove_outliers: bool,
+        data_source_ids: list[DataSourceID],
+    ) -> MetricCube:
+        """
+        Cube of the rows of the data sources over the risk segments of the iteration
+        and the other `dimensions`. The cube is cached; statistics of new metrics are
+        added to it as they are requested.
+        """
+        dimensions = [PivotDimension.RISK_SEGMENT.value] + [
+            dimension
+            for dimension in dimensions
+            if dimension != PivotDimension.RISK_SEGMENT
+        ]
+
+        key = (
+            iteration_id,
+            default,
+            tuple(dimensions),
+            tuple(sorted(filter_ids)),
+            remove_outliers,
+            tuple(sorted(data_source_ids)),
+        )
+
+        if key in self.__metric_cubes:
+            return self.__metric_cubes[key]
+
+        iteration_output = self.get_risk_segments(iteration_id, default=default)
+
+        row_mask = (
+            self.__filter_repository.get_mask(filter_ids, remove_outliers)
+            & self.__data_repository.get_data_source_mask(data_source_ids)
+        ).to_numpy(dtype=bool, na_value=False)
+        weights = self.__metric_repository.load_weights()
+
+        cube = MetricCube(
+            dimensions=[
+                self.__pivot_dimension(iteration_output, dimension)
+                for dimension in dimensions
+            ],
+            row_mask=row_mask,
+            weights=None if weights is None else weights.to_numpy(dtype="float64"),
+        )
+
+        if not self.__has_chain_errors(iteration_id, iteration_output):
+            self.__metric_cubes[key] = cube
+
+        return cube
+
+    def get_pivot_table(
+        self,
+        iteration_id: IterationID,
+        default: bool,
+        metric_ids: list[MetricID],
+        dimensions: list[str],
+        rows: list[str],
+        columns: list[str],
+        filter_ids: list[FilterID],
+        remove_outliers: bool,
+    ) -> tuple[pd.DataFrame, list[str], list[str]]:
+        """
+        Metric values with the levels of `rows` down the index and of `columns`
+        across, formatted for display. `rows` and `columns` are subsets of the risk
+        segment and `dimensions`.
+
+        Decomposable metrics are rolled up from a cached cube, so changing the
+        layout does not touch the rows. Other metrics are grouped over the same rows
+        and levels.
+        """
+        all_metrics = self.__metric_repository.get_all_metrics()
+        iteration_output = self.get_risk_segments(iteration_id, default=default)
+
+        risk_segment_names = self.get_risk_segment_details(iteration_id)[
+            RSDetCol.RISK_SEGMENT
+        ].to_dict()
+
+        tables: dict[str, pd.DataFrame] = {}
+
+        for metric_id in metric_ids:
+            if metric_id not in all_metrics:
+                continue
+
+            metric = all_metrics[metric_id]
+            decomposition = MetricDecomposition(metric)
+
+            table = None
+            levels: dict[str, pd.Index] = {}
+
+            if decomposition.is_decomposable:
+                cube = self.get_metric_cube(
+                    iteration_id=iteration_id,
+                    default=default,
+                    dimensions=dimensions,
+                    filter_ids=filter_ids,
+                    remove_outliers=remove_outliers,
+                    data_source_ids=metric.data_source_ids,
+                )
+
+                try:
+                    if not cube.has_terms(decomposition.terms):
+                        loaded_data = self.__data_repository.load_columns(
+                            metric.used_columns, data_source_ids=metric.data_source_ids
+                        )
+                        cube.add_terms(
+                            decomposition.terms,
+                            decomposition.evaluate_receivers(loaded_data),
+                        )
+
+                    table = cube.pivot(decomposition, rows, columns)
+                    levels = dict(zip(cube.dimensions, cube.levels))
+                except (TypeError, ValueError):
+                    table = None
+
+            if table is None:
+                # Same rows and levels as the cube; cells the metric cannot be
+                # evaluated on (e.g. empty ones) are left blank.
+                groupby_variables = [
+                    with_missing_level(
+                        self.__pivot_dimension(iteration_output, dimension)
+                    )
+                    for dimension in rows + columns
+                ]
+                levels = {
+                    str(variable.name): variable.cat.categories
+                    for variable in groupby_variables
+                }
+
+                summary = self.__data_repository.get_summarized_metrics(
+                    groupby_variables=groupby_variables,
+                    data_filter=self.__filter_repository.get_mask(
+                        filter_ids, remove_outliers
+                    )
+                    & self.__data_repository.get_data_source_mask(
+                        metric.data_source_ids
+                    ),
+                    metrics=[metric],
+                    weights=self.__metric_repository.load_weights(),
+                    errors_as_nan=True,
+                )[metric.pretty_name]
+
+                if columns and rows:
+                    table = summary.unstack(
+                        list(range(len(rows), len(rows) + len(columns)))
+                    )
+                elif columns:
+                    table = summary.to_frame(name=RowIndex.TOTAL).T
+                else:
+                    table = summary.to_frame()
+
+            table = self.__order_levels(table, rows, columns, levels)
+
+            if PivotDimension.RISK_SEGMENT in rows:
+                table = table.rename(
+                    index=risk_segment_names, level=PivotDimension.RISK_SEGMENT
+                )
+            if PivotDimension.RISK_SEGMENT in columns:
+                table = table.rename(
+                    columns=risk_segment_names, level=PivotDimension.RISK_SEGMENT
+                )
+
+            tables[metric.pretty_name] = metric.format_values(table)
+
+        if not tables:
+            return pd.DataFrame(), iteration_output.errors, iteration_output.warnings
+
+        if columns:
+            pivot_df = pd.concat(tables, axis=1)
+        else:
+            pivot_df = pd.concat(tables.values(), axis=1)
+
+        return pivot_df, iteration_output.errors, iteration_output.warnings
+
     def get_metric_grids(
         self,
         iteration_id: IterationID,
@@ -1232,7 +1974,12 @@ class IterationsRepository(BaseRepository):
         )
 
         if key in self.__metric_grid_cache:
-            return self.__metric_grid_cache[key]
+            metric_outputs, errors, warnings = self.__metric_grid_cache[key]
+            return (
+                self.__format_metric_grids(metric_outputs, metric_ids),
+                errors,
+                warnings,
+            )
 
         iteration = self.get_iteration(iteration_id)
 
@@ -1253,6 +2000,7 @@ class IterationsRepository(BaseRepository):
         column_mapping = risk_segment_details[RSDetCol.RISK_SEGMENT].to_dict()
 
         all_metrics = self.__metric_repository.get_all_metrics()
+        weights = self.__metric_repository.load_weights()
 
         metric_df = self.__data_repository.get_summarized_metrics(
             groupby_variables=[
@@ -1261,6 +2009,7 @@ class IterationsRepository(BaseRepository):
             ],
             data_filter=self.__filter_repository.get_mask(filter_ids, remove_outliers),
             metrics=[all_metrics[metric_id] for metric_id in metric_ids],
+            weights=weights,
         )
 
         total_series = pd.Series(
@@ -1277,6 +2026,7 @@ class IterationsRepository(BaseRepository):
                     filter_ids, remove_outliers
                 ),
                 metrics=[all_metrics[metric_id] for metric_id in metric_ids],
+                weights=weights,
             )
             metric_df = pd.concat([metric_df, metric_col_df], axis=0)
 
@@ -1290,6 +2040,7 @@ class IterationsRepository(BaseRepository):
                     filter_ids, remove_outliers
                 ),
                 metrics=[all_metrics[metric_id] for metric_id in metric_ids],
+                weights=weights,
             )
             metric_df = pd.concat([metric_df, metric_row_df], axis=0)
 
@@ -1303,6 +2054,7 @@ class IterationsRepository(BaseRepository):
                     filter_ids, remove_outliers
                 ),
                 metrics=[all_metrics[metric_id] for metric_id in metric_ids],
+                weights=weights,
             )
             metric_df = pd.concat([metric_df, metric_total_df], axis=0)
 
@@ -1364,7 +2116,6 @@ class IterationsRepository(BaseRepository):
         for metric_id in metric_ids:
             metric = all_metrics[metric_id]
             metric_name = metric.pretty_name
-            metric_df[metric_name] = metric_df[metric_name].map(metric.format)
 
             metric_outputs.append(
                 GridMetricSummary(
@@ -1379,13 +2130,34 @@ class IterationsRepository(BaseRepository):
                 )
             )
 
+        # Numbers are cached; display options are applied on every read.
         self.__metric_grid_cache[key] = (
             metric_outputs,
             errors,
             warnings,
         )
 
-        return metric_outputs, errors, warnings
+        return (
+            self.__format_metric_grids(metric_outputs, metric_ids),
+            errors,
+            warnings,
+        )
+
+    def __format_metric_grids(
+        self, metric_outputs: list[GridMetricSummary], metric_ids: list[MetricID]
+    ) -> list[GridMetricSummary]:
+        all_metrics = self.__metric_repository.get_all_metrics()
+
+        return [
+            GridMetricSummary(
+                metric_grid=all_metrics[metric_id].format_values(
+                    metric_output["metric_grid"]
+                ),
+                metric_name=metric_output["metric_name"],
+                data_source_names=metric_output["data_source_names"],
+            )
+            for metric_id, metric_output in zip(metric_ids, metric_outputs)
+        ]
 
     def to_dict(self) -> IterationRepositoryJSON:
         return IterationRepositoryJSON(
@@ -13,7 +13,9 @@ from risc_tool.data.models.metric import (
     Metric,
     UnitBadRate,
     Volume,
+    metric_evaluation_order,
 )
+from risc_tool.data.models.metric_aggregates import MetricDecomposition
 from risc_tool.data.models.types import ChangeIDs, DataSourceID, MetricID
 from risc_tool.data.repositories.base import BaseRepository
 from risc_tool.data.repositories.data import (
@@ -38,6 +40,7 @@ class MetricRepository(BaseRepository):
         self._var_unt_bad: str | None = None
         self._var_dlr_bad: str | None = None
         self._var_avg_bal: str | None = None
+        self._var_weight: str | None = None
         self._current_rate_mob: int = 12
         self._lifetime_rate_mob: int = 36
         self._data_source_ids: list[DataSourceID] = []
@@ -52,24 +55,129 @@ class MetricRepository(BaseRepository):
         ] = {}
         self.__volume_metric_cache: Metric | None = None
 
+        # Validation results by (query, dtypes of the used columns), least recently
+        # used first. Unlike the caches above these stay valid across data changes.
+        self.__validation_results: t.OrderedDict[
+            tuple[str, tuple[tuple[str, str | None], ...]], bool
+        ] = t.OrderedDict()
+        self.max_validation_results: int = 256
+        # Column dtypes of every data source sample at the last metric update
+        self.__data_source_schemas: dict[DataSourceID, dict[str, str]] = {}
+
         # Dependencies
         self.__data_repository: DataRepository = data_repository
 
+    def _available_metrics(self) -> dict[str, Metric]:
+        """All metrics that can be referenced through `metric('Name')`, by name."""
+
+        available_metrics = {metric.name: metric for metric in self.metrics.values()}
+
+        for default_metric in ("unit_bad_rate", "dollar_bad_rate", "volume"):
+            try:
+                metric = getattr(self, default_metric)
+            except (SyntaxError, ValueError, SampleDataNotLoadedError):
+                continue
+
+            available_metrics[metric.name] = metric
+
+        return available_metrics
+
+    def get_dependent_metrics(self, metric_id: MetricID) -> list[str]:
+        """Names of the user defined metrics that reference the given metric."""
+
+        name = self.metrics[metric_id].name
+
+        return sorted(
+            metric.name
+            for metric in self.metrics.values()
+            if name in metric.referenced_metrics
+        )
+
+    def __is_valid_on_sample(
+        self,
+        metric: Metric,
+        sample_df: pd.DataFrame,
+        schema: dict[str, str],
+        available_metrics: dict[str, Metric],
+    ) -> bool:
+        key = (
+            metric.query,
+            tuple((column, schema.get(column)) for column in metric.used_columns),
+        )
+
+        # Referenced metrics may change, so these are always checked
+        if not metric.referenced_metrics and key in self.__validation_results:
+            self.__validation_results.move_to_end(key)
+            return self.__validation_results[key]
+
+        try:
+            metric.validate_query(sample_df, available_metrics)
+        except (SyntaxError, ValueError):
+            is_valid = False
+        else:
+            is_valid = True
+
+        if not metric.referenced_metrics:
+            self.__validation_results[key] = is_valid
+
+            while len(self.__validation_results) > self.max_validation_results:
+                self.__validation_results.popitem(last=False)
+
+        return is_valid
+
     def _update_user_defined_metrics(self):
         metric_ids_to_remove: list[MetricID] = []
+        available_metrics = self._available_metrics()
+
+        sample_dfs: dict[DataSourceID, pd.DataFrame] = {}
+        schemas: dict[DataSourceID, dict[str, str]] = {}
+
+        for ds_id in self.__data_repository.data_sources:
+            try:
+                sample_dfs[ds_id] = self.__data_repository.get_sample_df([ds_id])
+            except SampleDataNotLoadedError:
+                continue
+
+            schemas[ds_id] = {
+                str(column): str(dtype)
+                for column, dtype in sample_dfs[ds_id].dtypes.items()
+            }
+
+        # Columns added, removed or retyped since the last update; `None` for new
+        # data sources, where every column counts as changed.
+        changed_columns: dict[DataSourceID, set[str] | None] = {}
+
+        for ds_id, schema in schemas.items():
+            previous_schema = self.__data_source_schemas.get(ds_id)
+
+            if previous_schema is None:
+                changed_columns[ds_id] = None
+            else:
+                changed_columns[ds_id] = {
+                    column
+                    for column in schema.keys() | previous_schema.keys()
+                    if schema.get(column) != previous_schema.get(column)
+                }
+
+        self.__data_source_schemas = schemas
 
         for metric_id, metric in self.metrics.items():
             valid_data_source_ids: list[DataSourceID] = []
 
             for ds_id in self.__data_repository.data_sources:
-                if ds_id not in metric.data_source_ids:
+                if ds_id not in metric.data_source_ids or ds_id not in schemas:
                     continue
 
-                try:
-                    metric.validate_query(self.__data_repository.get_sample_df([ds_id]))
-                except (SyntaxError, ValueError, SampleDataNotLoadedError):
-                    pass
-                else:
+                changed = changed_columns[ds_id]
+
+                # Still valid if none of its columns changed
+                if (
+                    changed is not None
+                    and not metric.referenced_metrics
+                    and changed.isdisjoint(metric.used_columns)
+                ) or self.__is_valid_on_sample(
+                    metric, sample_dfs[ds_id], schemas[ds_id], available_metrics
+                ):
                     valid_data_source_ids.append(ds_id)
 
             if valid_data_source_ids:
@@ -85,6 +193,7 @@ class MetricRepository(BaseRepository):
             self._var_unt_bad = None
             self._var_dlr_bad = None
             self._var_avg_bal = None
+            self._var_weight = None
             self._data_source_ids = []
             return
 
@@ -114,6 +223,15 @@ class MetricRepository(BaseRepository):
         ):
             self._var_avg_bal = None
 
+        # Weights apply to the rows of every data source
+        all_data_source_ids = list(self.__data_repository.data_sources)
+
+        if (
+            self._var_weight,
+            VariableType.NUMERICAL,
+        ) not in self.__data_repository.available_columns(all_data_source_ids):
+            self._var_weight = None
+
     def _clear_cache(self):
         self.__verified_metrics.clear()
         self.__unit_bad_rate_metric_cache.clear()
@@ -130,16 +248,19 @@ class MetricRepository(BaseRepository):
         # clear cache
         self._clear_cache()
 
-    def validate_metric_input_column(self, column_name: str):
-        available_columns = self.__data_repository.available_columns(
-            self.data_source_ids
-        )
+    def validate_metric_input_column(
+        self, column_name: str, data_source_ids: list[DataSourceID] | None = None
+    ):
+        if data_source_ids is None:
+            data_source_ids = self.data_source_ids
+
+        available_columns = self.__data_repository.available_columns(data_source_ids)
 
         if (column_name, VariableType.CATEGORICAL) in available_columns:
             raise VariableNotNumericError(
                 column_name,
                 str(
-                    self.__data_repository.data_sources[self.data_source_ids[0]]
+                    self.__data_repository.data_sources[data_source_ids[0]]
                     .load_columns([column_name], [VariableType.CATEGORICAL])
                     .iloc[:, 0]
                     .dtypes
@@ -197,6 +318,79 @@ class MetricRepository(BaseRepository):
 
         self.notify_subscribers()
 
+    @property
+    def var_weight(self) -> str | None:
+        return self._var_weight
+
+    @var_weight.setter
+    def var_weight(self, value: str | None):
+        if value is not None:
+            self.validate_metric_input_column(
+                value, list(self.__data_repository.data_sources)
+            )
+
+        self._var_weight = value
+
+        self.notify_subscribers()
+
+    def load_weights(self) -> pd.Series | None:
+        """
+        Row weights of the aggregations, over all data sources. Rows without a
+        weight do not count. `None` if no weight column is set.
+        """
+
+        if self._var_weight is None:
+            return None
+
+        return self.__data_repository.load_column(
+            column_name=self._var_weight, column_type=VariableType.NUMERICAL
+        ).fillna(0)
+
+    def __is_weighted(self, metric: Metric) -> bool:
+        if MetricDecomposition(metric).is_decomposable:
+            return True
+
+        # Formulas of referenced metrics only see the weighted values
+        return (
+            bool(metric.references)
+            and not metric.used_columns
+            and all(
+                self.__is_weighted(reference)
+                for reference in metric.references.values()
+            )
+        )
+
+    def weighting_warning(self, metric: Metric) -> str | None:
+        """
+        Why the weight column does not weight `metric` as expected, or None if it
+        does or no weight column is set. Only sums, counts and sizes (and formulas
+        of metrics made of them) are weighted.
+        """
+
+        if self._var_weight is None:
+            return None
+
+        try:
+            evaluation_order = metric_evaluation_order([metric])
+        except ValueError:
+            return None
+
+        if any(
+            self._var_weight in evaluated.used_columns for evaluated in evaluation_order
+        ):
+            return (
+                f"Uses the weight column `{self._var_weight}`, which already weights"
+                " the sums, counts and sizes."
+            )
+
+        if not self.__is_weighted(metric):
+            return (
+                "Not weighted: only sums, counts and sizes are weighted by"
+                f" `{self._var_weight}`."
+            )
+
+        return None
+
     @property
     def current_rate_mob(self) -> int:
         return self._current_rate_mob
@@ -329,12 +523,26 @@ class MetricRepository(BaseRepository):
         return metric
 
     def validate_metric(
-        self, name: str, query: str, data_source_ids: list[DataSourceID]
+        self,
+        name: str,
+        query: str,
+        data_source_ids: list[DataSourceID],
+        metric_id: MetricID | None = None,
     ) -> Metric:
         # Validate Name
         if name in DefaultMetricNames:
             raise ValueError(f"Metric name '{name}' is reserved.")
 
+        if (
+            metric_id in self.metrics
+            and self.metrics[metric_id].name != name
+            and (dependent_metrics := self.get_dependent_metrics(metric_id))
+        ):
+            raise ValueError(
+                f"Metric '{self.metrics[metric_id].name}' can not be renamed, it is"
+                f" used by: {', '.join(dependent_metrics)}"
+            )
+
         # Validate Query with Data Source
         key = (query, tuple(sorted(data_source_ids)))
 
@@ -355,8 +563,13 @@ class MetricRepository(BaseRepository):
         )
 
         # Validating query string
-        new_metric.validate_query(data=sample_df)
-        self.__verified_metrics[key] = new_metric
+        new_metric.validate_query(
+            data=sample_df, available_metrics=self._available_metrics()
+        )
+
+        # Referenced metrics may change, so only self-contained queries are cached
+        if not new_metric.referenced_metrics:
+            self.__verified_metrics[key] = new_metric
 
         return new_metric
 
@@ -368,6 +581,7 @@ class MetricRepository(BaseRepository):
         is_percentage: bool,
         decimal_places: int,
         data_source_ids: list[DataSourceID],
+        approximate: bool = False,
     ) -> None:
         new_metric = self.validate_metric(name, query, data_source_ids)
 
@@ -375,6 +589,7 @@ class MetricRepository(BaseRepository):
         new_metric.use_thousand_sep = use_thousand_sep
         new_metric.is_percentage = is_percentage
         new_metric.decimal_places = decimal_places
+        new_metric.approximate = approximate
 
         self.metrics[new_metric.uid] = new_metric
 
@@ -389,15 +604,35 @@ class MetricRepository(BaseRepository):
         is_percentage: bool,
         decimal_places: int,
         data_source_ids: list[DataSourceID],
+        approximate: bool = False,
     ) -> None:
         if metric_id not in self.metrics:
             raise ValueError(f"Metric '{metric_id}' not found.")
 
-        modified_metric = self.validate_metric(name, query, data_source_ids)
+        current_metric = self.metrics[metric_id]
+
+        if (
+            current_metric.name == name
+            and current_metric.query == query
+            and sorted(current_metric.data_source_ids) == sorted(data_source_ids)
+            and current_metric.approximate == approximate
+            and current_metric.is_percentage == is_percentage
+        ):
+            # Display options are applied when results are read, so the computed
+            # numbers cached by the subscribers stay valid. Percentages are scaled
+            # when computed, so they are not display options.
+            current_metric.use_thousand_sep = use_thousand_sep
+            current_metric.decimal_places = decimal_places
+            return
+
+        modified_metric = self.validate_metric(
+            name, query, data_source_ids, metric_id=metric_id
+        )
         modified_metric.uid = metric_id
         modified_metric.use_thousand_sep = use_thousand_sep
         modified_metric.is_percentage = is_percentage
         modified_metric.decimal_places = decimal_places
+        modified_metric.approximate = approximate
 
         self.metrics[metric_id] = modified_metric
 
@@ -405,6 +640,12 @@ class MetricRepository(BaseRepository):
 
     def remove_metric(self, metric_id: MetricID) -> None:
         if metric_id in self.metrics:
+            if dependent_metrics := self.get_dependent_metrics(metric_id):
+                raise ValueError(
+                    f"Metric '{self.metrics[metric_id].name}' is used by:"
+                    f" {', '.join(dependent_metrics)}"
+                )
+
             del self.metrics[metric_id]
 
         self.notify_subscribers()
@@ -431,6 +672,16 @@ class MetricRepository(BaseRepository):
         all_metrics[self.dollar_bad_rate.uid] = self.dollar_bad_rate
         all_metrics[self.volume.uid] = self.volume
 
+        # References are resolved by name, to the current version of each metric
+        available_metrics = {metric.name: metric for metric in all_metrics.values()}
+
+        for metric in self.metrics.values():
+            if metric.referenced_metrics:
+                try:
+                    metric.resolve_references(available_metrics)
+                except ValueError:
+                    metric.references = {}
+
         return all_metrics
 
     def to_dict(self) -> MetricRepositoryJSON:
@@ -439,6 +690,7 @@ class MetricRepository(BaseRepository):
             var_unt_bad=self._var_unt_bad,
             var_dlr_bad=self._var_dlr_bad,
             var_avg_bal=self._var_avg_bal,
+            var_weight=self._var_weight,
             current_rate_mob=self._current_rate_mob,
             lifetime_rate_mob=self._lifetime_rate_mob,
             data_source_ids=[ds_id for ds_id in self._data_source_ids],
@@ -455,12 +707,14 @@ class MetricRepository(BaseRepository):
 
         invalid_metrics: list[tuple[Metric, Exception]] = []
 
-        for metric_json in data.metrics:
-            metric_obj = Metric.from_dict(metric_json)
+        metric_objs = [Metric.from_dict(metric_json) for metric_json in data.metrics]
+        available_metrics = {metric_obj.name: metric_obj for metric_obj in metric_objs}
 
+        for metric_obj in metric_objs:
             try:
                 metric_obj.validate_query(
-                    data_repository.get_sample_df(metric_obj.data_source_ids)
+                    data_repository.get_sample_df(metric_obj.data_source_ids),
+                    available_metrics,
                 )
             except (SyntaxError, ValueError, SampleDataNotLoadedError) as error:
                 if errors == "raise":
@@ -473,6 +727,7 @@ class MetricRepository(BaseRepository):
         repo._var_unt_bad = data.var_unt_bad
         repo._var_dlr_bad = data.var_dlr_bad
         repo._var_avg_bal = data.var_avg_bal
+        repo._var_weight = data.var_weight
         repo._current_rate_mob = data.current_rate_mob
         repo._lifetime_rate_mob = data.lifetime_rate_mob
         repo._data_source_ids = [DataSourceID(i) for i in data.data_source_ids]
@@ -251,6 +251,7 @@ def create_auto_bands(
     var_unt_bad: pd.Series | None = None,
     var_avg_bal: pd.Series | None = None,
     hv_imp_hr: bool | None = None,
+    weights: pd.Series | None = None,
 ) -> pd.DataFrame:
     if mob is None:
         mob = 12
@@ -260,6 +261,11 @@ def create_auto_bands(
             f"Variable (length={len(variable)}) and Mask (length={len(mask)}) must be the same length"
         )
 
+    if weights is not None and len(variable) != len(weights):
+        raise ValueError(
+            f"Variable (length={len(variable)}) and Weights (length={len(weights)}) must be the same length"
+        )
+
     if loss_rate_type == LossRateTypes.DLR:
         if var_dlr_bad is None or var_avg_bal is None:
             raise ValueError(
@@ -355,6 +361,11 @@ def create_auto_bands(
         numerators = unt_wrt_off_filtered  # type: ignore
         denominators = volume
 
+    if weights is not None:
+        weights_filtered = weights[mask]
+        numerators = numerators * weights_filtered
+        denominators = denominators * weights_filtered
+
     if pd.api.types.is_numeric_dtype(variable):
         groups = create_auto_numeric_bands(
             variable=variable_filtered,
@@ -2,13 +2,17 @@ import numpy as np
 import pandas as pd
 
 
-def calculate_iv(variable: pd.Series, target: pd.Series) -> float:
+def calculate_iv(
+    variable: pd.Series, target: pd.Series, weights: pd.Series | None = None
+) -> float:
     """
     Calculates the Information Value (IV) for a given variable against a binary target.
 
     Args:
         variable (pd.Series): The independent variable (predictor).
         target (pd.Series): The binary target variable (dependent).
+        weights (pd.Series | None): Optional sample weight of each row. Numerical
+            variables are still binned by their unweighted quantiles.
 
     Returns:
         float: The Information Value (IV).
@@ -16,26 +20,38 @@ def calculate_iv(variable: pd.Series, target: pd.Series) -> float:
     if not pd.api.types.is_numeric_dtype(target) or not target.isin([0, 1]).all():
         raise ValueError("Target variable must be binary (0 or 1).")
 
+    if weights is None:
+        weights = pd.Series(1.0, index=target.index)
+
     if pd.api.types.is_numeric_dtype(variable):
         variable = pd.qcut(variable, q=20, duplicates="drop")
 
     # Create a DataFrame for convenience
-    df = pd.DataFrame({"variable": variable, "target": target}).dropna()
+    df = pd.DataFrame({
+        "variable": variable,
+        "target": target,
+        "weight": weights,
+    }).dropna()
 
     if df.empty:
         return 0.0
 
-    # Calculate counts for good and bad
-    total_good = df["target"].value_counts().get(0, 0)
-    total_bad = df["target"].value_counts().get(1, 0)
+    df["good"] = df["weight"] * (df["target"] == 0)
+    df["bad"] = df["weight"] * (df["target"] == 1)
+
+    # Calculate (weighted) counts for good and bad
+    total_good = df["good"].sum()
+    total_bad = df["bad"].sum()
 
     if total_good == 0 or total_bad == 0:
         return 0.0  # IV is undefined or 0 if one class is missing
 
     # Group by the variable and calculate counts
-    grouped = df.groupby("variable", observed=True)["target"].agg(
-        good_count=lambda x: (x == 0).sum(),
-        bad_count=lambda x: (x == 1).sum(),
+    grouped = (
+        df
+        .groupby("variable", observed=True)[["good", "bad"]]
+        .sum()
+        .rename(columns={"good": "good_count", "bad": "bad_count"})
     )
 
     # Calculate % of Good and % of Bad
@@ -57,4 +73,4 @@ def calculate_iv(variable: pd.Series, target: pd.Series) -> float:
     # Sum up the IVs for the final result
     iv_total = grouped["iv"].sum()
 
-    return iv_total
+    return float(iv_total)
@@ -48,6 +48,7 @@ class Session:
         self.data_explorer_view_model = DataExplorerViewModel(
             data_repository=self.data_repository,
             filter_repository=self.filter_repository,
+            metric_repository=self.metric_repository,
         )
         self.metric_editor_view_model = MetricViewModel(
             data_repository=self.data_repository,
@@ -124,6 +125,7 @@ class Session:
         self.data_explorer_view_model = DataExplorerViewModel(
             data_repository=self.data_repository,
             filter_repository=self.filter_repository,
+            metric_repository=self.metric_repository,
         )
         self.metric_editor_view_model = MetricViewModel(
             data_repository=self.data_repository,
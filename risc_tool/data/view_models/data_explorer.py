@@ -12,6 +12,7 @@ from risc_tool.data.models.outlier import OutlierRule
 from risc_tool.data.models.types import ChangeIDs, DataSourceID, FilterID
 from risc_tool.data.repositories.data import DataRepository
 from risc_tool.data.repositories.filter import FilterRepository
+from risc_tool.data.repositories.metric import MetricRepository
 from risc_tool.data.services.iv_calculation import calculate_iv
 from risc_tool.utils.hash_boolean_series import hash_boolean_series
 
@@ -22,13 +23,19 @@ class DataExplorerViewModel(ChangeTracker):
         return Signature.DATA_EXPLORER_VIEW_MODEL
 
     def __init__(
-        self, data_repository: DataRepository, filter_repository: FilterRepository
+        self,
+        data_repository: DataRepository,
+        filter_repository: FilterRepository,
+        metric_repository: MetricRepository,
     ) -> None:
-        super().__init__(dependencies=[data_repository, filter_repository])
+        super().__init__(
+            dependencies=[data_repository, filter_repository, metric_repository]
+        )
 
         # Dependencies
         self.data_repository = data_repository
         self.filter_repository = filter_repository
+        self.metric_repository = metric_repository
 
         # Tab navigation
         self.tab_names: list[DataExplorerTabName] = [
@@ -214,6 +221,7 @@ class DataExplorerViewModel(ChangeTracker):
 
         iv_df = pd.DataFrame(columns=["variable", "iv"])
         target: pd.Series | None = None
+        weights: pd.Series | None = None
 
         for input_col in input_cols_available:
             try:
@@ -231,6 +239,7 @@ class DataExplorerViewModel(ChangeTracker):
             except KeyError:
                 if target is None:
                     target = self.data_repository.load_column(target_variable)
+                    weights = self.metric_repository.load_weights()
 
                 target_m = target[mask]
                 target_m = target_m.loc[(list(self.iv_data_sources),)]
@@ -267,7 +276,11 @@ class DataExplorerViewModel(ChangeTracker):
                     )
                     continue
 
-                iv = calculate_iv(variable_m, target_m)
+                weights_m = None
+                if weights is not None:
+                    weights_m = weights[mask].loc[(list(self.iv_data_sources),)]
+
+                iv = calculate_iv(variable_m, target_m, weights=weights_m)
 
                 self.__iv_cache.loc[(target_variable, input_col, mask_hash)] = iv
 
@@ -295,8 +308,8 @@ class DataExplorerViewModel(ChangeTracker):
     @property
     def total_outlier_count(self):
         return (
-            ~self.filter_repository.get_mask(filter_ids=[], remove_outliers=True)
-        ).sum()
+            ~self.filter_repository.get_packed_mask(filter_ids=[], remove_outliers=True)
+        ).count()
 
     def validate_outlier(
         self,
@@ -327,6 +340,13 @@ class DataExplorerViewModel(ChangeTracker):
 
         return outlier_cache
 
+    def preview_outlier(
+        self, variable_name: str, comparison_op: ComparisonOperation
+    ) -> pd.DataFrame:
+        return self.filter_repository.preview_outlier_rules(
+            variable_name, comparison_op
+        )
+
     def save_outlier(
         self,
         outlier_id: FilterID,
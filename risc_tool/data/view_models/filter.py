@@ -1,9 +1,12 @@
 import typing as t
 
+import pandas as pd
+
 from risc_tool.data.models.changes import ChangeTracker
 from risc_tool.data.models.enums import Signature
 from risc_tool.data.models.exceptions import InvalidFilterError, format_error
 from risc_tool.data.models.filter import Filter
+from risc_tool.data.models.filter_preview import FilterPreview
 from risc_tool.data.models.types import ChangeIDs, FilterID
 from risc_tool.data.repositories.data import DataRepository
 from risc_tool.data.repositories.filter import FilterRepository
@@ -29,11 +32,13 @@ class FilterViewModel(ChangeTracker):
         self.is_verified = False
         self.latest_editor_id = ""
         self.__errors: list[InvalidFilterError | ValueError | SyntaxError] = []
+        self.filter_preview: FilterPreview | None = None
 
     def on_dependency_update(self, change_ids: ChangeIDs) -> None:
         self.__filter_cache = self.__empty_filter
         self.is_verified = False
         self.__errors = []
+        self.filter_preview = None
 
     @property
     def __empty_filter(self):
@@ -49,6 +54,7 @@ class FilterViewModel(ChangeTracker):
         self.__view_mode = mode
         self.__errors.clear()
         self.is_verified = False
+        self.filter_preview = None
 
         if mode == "edit":
             if filter_id == FilterID.EMPTY:
@@ -118,6 +124,35 @@ class FilterViewModel(ChangeTracker):
             self.__errors.append(e)
             self.is_verified = False
 
+    def preview_filter(self, query: str):
+        self.filter_preview = None
+
+        if query == "":
+            self.__errors.append(ValueError("Filter query cannot be empty"))
+            return
+
+        self.__errors.clear()
+
+        try:
+            self.filter_preview = self.__filter_repository.preview_filter(query)
+        except (InvalidFilterError, SyntaxError, ValueError) as e:
+            self.__errors.append(e)
+
+    def filter_preview_counts(self) -> pd.DataFrame:
+        if self.filter_preview is None:
+            return pd.DataFrame()
+
+        counts = self.filter_preview.counts
+        counts.index = counts.index.map(
+            lambda data_source_id: (
+                self.__data_repository.data_sources[data_source_id].label
+                if data_source_id in self.__data_repository.data_sources
+                else str(data_source_id)
+            )
+        )
+
+        return counts
+
     def error_message(self) -> str:
         if not self.__errors:
             return ""
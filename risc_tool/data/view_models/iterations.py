@@ -287,6 +287,7 @@ class IterationsViewModel(ChangeTracker):
         filter_ids: list[FilterID] | None = None,
         show_prev_iter_details: bool | None = None,
         remove_outliers: bool | None = None,
+        confidence_intervals: bool | None = None,
     ):
         metadata = self.get_iteration_metadata(iteration_id)
 
@@ -300,6 +301,7 @@ class IterationsViewModel(ChangeTracker):
             current_filter_ids=filter_ids,
             show_prev_iter_details=show_prev_iter_details,
             remove_outliers=remove_outliers,
+            confidence_intervals=confidence_intervals,
         )
 
         if (
@@ -443,6 +445,7 @@ class IterationsViewModel(ChangeTracker):
         scalars_enabled: bool,
         remove_outliers: bool,
         show_total_row: bool = False,
+        confidence_intervals: bool = False,
         theme: ColorTheme = "dark",
     ) -> tuple[Styler, list[str], list[str]]:
         iteration = self.__iterations_repository.get_iteration(iteration_id)
@@ -472,6 +475,7 @@ class IterationsViewModel(ChangeTracker):
             scalars_enabled=scalars_enabled,
             remove_outliers=remove_outliers,
             show_total_row=show_total_row,
+            confidence_intervals=confidence_intervals,
         )
 
         # Concatenated df
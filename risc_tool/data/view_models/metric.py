@@ -77,6 +77,7 @@ class MetricViewModel(ChangeTracker):
         use_thousand_sep: bool | None = None,
         is_percentage: bool | None = None,
         decimal_places: int | None = None,
+        approximate: bool | None = None,
     ):
         if name is not None:
             self.__metric_cache.name = name
@@ -95,6 +96,9 @@ class MetricViewModel(ChangeTracker):
         if decimal_places is not None:
             self.__metric_cache.decimal_places = decimal_places
 
+        if approximate is not None:
+            self.__metric_cache.approximate = approximate
+
     @property
     def all_data_source_ids(self) -> list[DataSourceID]:
         return [ds_id for ds_id in self.__data_repository.data_sources]
@@ -140,12 +144,16 @@ class MetricViewModel(ChangeTracker):
                 if name == metric.name and current_id != metric.uid:
                     raise ValueError("Metric name already exists")
 
+            approximate = self.__metric_cache.approximate
+
             self.__metric_cache = self.__metric_repository.validate_metric(
                 name=name,
                 query=query,
                 data_source_ids=self.__metric_cache.data_source_ids,
+                metric_id=current_id,
             )
             self.__metric_cache.uid = current_id
+            self.__metric_cache.approximate = approximate
             self.is_verified = True
             self.latest_editor_id = latest_editor_id
         except (ValueError, SyntaxError) as e:
@@ -180,6 +188,7 @@ class MetricViewModel(ChangeTracker):
                 is_percentage=self.__metric_cache.is_percentage,
                 decimal_places=self.__metric_cache.decimal_places,
                 data_source_ids=self.__metric_cache.data_source_ids,
+                approximate=self.__metric_cache.approximate,
             )
         else:
             self.__metric_repository.modify_metric(
@@ -190,6 +199,7 @@ class MetricViewModel(ChangeTracker):
                 is_percentage=self.__metric_cache.is_percentage,
                 decimal_places=self.__metric_cache.decimal_places,
                 data_source_ids=self.__metric_cache.data_source_ids,
+                approximate=self.__metric_cache.approximate,
             )
 
         self.set_mode("view")
@@ -202,6 +212,12 @@ class MetricViewModel(ChangeTracker):
     def duplicate_metric(self, metric_id: MetricID) -> None:
         self.__metric_repository.duplicate_metric(metric_id)
 
+    def get_weighting_warning(self, metric: Metric) -> str | None:
+        return self.__metric_repository.weighting_warning(metric)
+
+    def get_dependent_metrics(self, metric_id: MetricID) -> list[str]:
+        return self.__metric_repository.get_dependent_metrics(metric_id)
+
     def remove_metric(self, metric_id: MetricID) -> None:
         self.__metric_repository.remove_metric(metric_id)
 
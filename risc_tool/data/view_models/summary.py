@@ -1,8 +1,15 @@
 import typing as t
 from uuid import UUID, uuid4
 
+import pandas as pd
+
 from risc_tool.data.models.changes import ChangeNotifier
-from risc_tool.data.models.enums import Signature, SummaryPageTabName
+from risc_tool.data.models.enums import (
+    PivotDimension,
+    Signature,
+    SummaryPageTabName,
+    VariableType,
+)
 from risc_tool.data.models.json_models import SummaryViewModelJSON
 from risc_tool.data.models.types import ChangeIDs, FilterID, IterationID, MetricID
 from risc_tool.data.repositories.data import DataRepository
@@ -59,6 +66,20 @@ class SummaryViewModel(ChangeNotifier):
         )
         self.cv_view_mode: t.Literal["grid", "list"] = "list"
 
+        # Pivot Tab Data
+        self.pv_metric_ids: list[MetricID] = [
+            MetricID.VOLUME,
+            MetricID.DLR_BAD_RATE,
+            MetricID.UNT_BAD_RATE,
+        ]
+        self.pv_filter_ids: list[FilterID] = []
+        self.pv_remove_outliers = False
+        self.pv_selected_iteration_id: IterationID | None = None
+        self.pv_selected_iteration_default: bool = False
+        self.pv_dimensions: list[str] = []
+        self.pv_rows: list[str] = [PivotDimension.RISK_SEGMENT]
+        self.pv_columns: list[str] = []
+
     def to_dict(self) -> SummaryViewModelJSON:
         return SummaryViewModelJSON(
             ov_metric_ids=self.ov_metric_ids,
@@ -70,6 +91,14 @@ class SummaryViewModel(ChangeNotifier):
             cv_scalars_enabled=self.cv_scalars_enabled,
             cv_selected_iterations=self.cv_selected_iterations,
             cv_view_mode=self.cv_view_mode,
+            pv_metric_ids=self.pv_metric_ids,
+            pv_filter_ids=self.pv_filter_ids,
+            pv_remove_outliers=self.pv_remove_outliers,
+            pv_selected_iteration_id=self.pv_selected_iteration_id,
+            pv_selected_iteration_default=self.pv_selected_iteration_default,
+            pv_dimensions=self.pv_dimensions,
+            pv_rows=self.pv_rows,
+            pv_columns=self.pv_columns,
         )
 
     @classmethod
@@ -92,6 +121,14 @@ class SummaryViewModel(ChangeNotifier):
         instance.cv_scalars_enabled = data.cv_scalars_enabled
         instance.cv_selected_iterations = data.cv_selected_iterations
         instance.cv_view_mode = data.cv_view_mode
+        instance.pv_metric_ids = data.pv_metric_ids
+        instance.pv_filter_ids = data.pv_filter_ids
+        instance.pv_remove_outliers = data.pv_remove_outliers
+        instance.pv_selected_iteration_id = data.pv_selected_iteration_id
+        instance.pv_selected_iteration_default = data.pv_selected_iteration_default
+        instance.pv_dimensions = data.pv_dimensions
+        instance.pv_rows = data.pv_rows
+        instance.pv_columns = data.pv_columns
 
         return instance
 
@@ -127,5 +164,61 @@ class SummaryViewModel(ChangeNotifier):
     ):
         self.cv_selected_iterations[view_idx] = (iteration_id, default)
 
+    # Pivot Page
+    def set_pivot_metrics(self, metric_ids: list[MetricID]) -> None:
+        self.pv_metric_ids = metric_ids
+
+    @property
+    def available_pivot_dimensions(self) -> list[str]:
+        categorical_columns = sorted(
+            column
+            for column, column_type in self.__data_repository.available_columns(
+                list(self.__data_repository.data_sources)
+            )
+            if column_type == VariableType.CATEGORICAL
+        )
+
+        return [PivotDimension.DATA_SOURCE] + categorical_columns
+
+    def set_pivot_dimensions(self, dimensions: list[str]) -> None:
+        """Sets the dimensions of the cube; rows and columns keep the ones left."""
+
+        self.pv_dimensions = dimensions
+
+        layout_dimensions = [PivotDimension.RISK_SEGMENT] + dimensions
+        self.pv_rows = [dim for dim in self.pv_rows if dim in layout_dimensions]
+        self.pv_columns = [dim for dim in self.pv_columns if dim in layout_dimensions]
+
+    def get_pivot_table(self) -> tuple[pd.DataFrame | None, list[str], list[str]]:
+        iteration_id = self.pv_selected_iteration_id
+
+        if (
+            iteration_id is None
+            or iteration_id not in self.__iteration_repository.iterations
+        ):
+            return None, [], []
+
+        available_dimensions = self.available_pivot_dimensions
+        dimensions = [dim for dim in self.pv_dimensions if dim in available_dimensions]
+
+        layout_dimensions = [PivotDimension.RISK_SEGMENT] + dimensions
+        rows = [dim for dim in self.pv_rows if dim in layout_dimensions]
+        columns = [
+            dim
+            for dim in self.pv_columns
+            if dim in layout_dimensions and dim not in rows
+        ]
+
+        return self.__iteration_repository.get_pivot_table(
+            iteration_id=iteration_id,
+            default=self.pv_selected_iteration_default,
+            metric_ids=self.pv_metric_ids,
+            dimensions=dimensions,
+            rows=rows,
+            columns=columns,
+            filter_ids=self.pv_filter_ids,
+            remove_outliers=self.pv_remove_outliers,
+        )
+
 
 __all__ = ["SummaryViewModel"]
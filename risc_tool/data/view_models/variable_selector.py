@@ -51,18 +51,33 @@ class VariableSelectorViewModel(ChangeTracker):
             if c_type == VariableType.NUMERICAL
         ]
 
-    def get_variable(self, usage: t.Literal["unt_bad", "dlr_bad", "avg_bal"]):
+    @property
+    def available_weight_columns(self) -> list[str | None]:
+        column_types = self.__data_repository.available_columns(
+            self.all_data_source_ids
+        )
+        return [None] + [
+            c_name
+            for (c_name, c_type) in column_types
+            if c_type == VariableType.NUMERICAL
+        ]
+
+    def get_variable(self, usage: t.Literal["unt_bad", "dlr_bad", "avg_bal", "weight"]):
         if usage == "unt_bad":
             return self.__metric_repository.var_unt_bad
         elif usage == "dlr_bad":
             return self.__metric_repository.var_dlr_bad
         elif usage == "avg_bal":
             return self.__metric_repository.var_avg_bal
+        elif usage == "weight":
+            return self.__metric_repository.var_weight
         else:
             return None
 
     def set_variable(
-        self, usage: t.Literal["unt_bad", "dlr_bad", "avg_bal"], value: str | None
+        self,
+        usage: t.Literal["unt_bad", "dlr_bad", "avg_bal", "weight"],
+        value: str | None,
     ):
         if usage == "unt_bad":
             self.__metric_repository.var_unt_bad = value
@@ -70,6 +85,8 @@ class VariableSelectorViewModel(ChangeTracker):
             self.__metric_repository.var_dlr_bad = value
         elif usage == "avg_bal":
             self.__metric_repository.var_avg_bal = value
+        elif usage == "weight":
+            self.__metric_repository.var_weight = value
 
     # MOB Selector
     def get_mob(self, mob_type: t.Literal["current", "lifetime"]):
@@ -19,6 +19,7 @@ def iteration_metric_table(
     remove_outliers: bool,
     editable: bool,
     key: str,
+    confidence_intervals: bool = False,
 ):
     session: Session = st.session_state["session"]
     iterations_vm = session.iterations_view_model
@@ -34,6 +35,7 @@ def iteration_metric_table(
         scalars_enabled=scalars_enabled,
         remove_outliers=remove_outliers,
         show_total_row=show_total_row,
+        confidence_intervals=confidence_intervals,
         theme=st.context.theme.type or "dark",
     )
 
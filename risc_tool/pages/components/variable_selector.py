@@ -48,11 +48,16 @@ def data_source_selector() -> None:
         st.rerun()
 
 
-def column_selector(column_usage: t.Literal["unt_bad", "dlr_bad", "avg_bal"]) -> None:
+def column_selector(
+    column_usage: t.Literal["unt_bad", "dlr_bad", "avg_bal", "weight"],
+) -> None:
     session: Session = st.session_state["session"]
     variable_selector_vm = session.variable_selector_view_model
 
-    options = variable_selector_vm.available_columns
+    if column_usage == "weight":
+        options = variable_selector_vm.available_weight_columns
+    else:
+        options = variable_selector_vm.available_columns
 
     current_column = variable_selector_vm.get_variable(column_usage)
     current_index = options.index(current_column)
@@ -66,6 +71,8 @@ def column_selector(column_usage: t.Literal["unt_bad", "dlr_bad", "avg_bal"]) ->
         placeholder = "$ Bad Rate Variable"
     elif column_usage == "avg_bal":
         placeholder = "Avg Balance Variable"
+    elif column_usage == "weight":
+        placeholder = "Unweighted"
     else:
         placeholder = ""
 
@@ -138,6 +145,14 @@ def dlr_bad_selector() -> None:
         column_selector("avg_bal")
 
 
+def weight_selector() -> None:
+    col1, col2, col3, _ = st.columns([4, 1, 5, 6], gap=None)
+    metric_text_widget(col1, "Sample Weight")
+    metric_text_widget(col2, "=")
+    with col3:
+        column_selector("weight")
+
+
 def current_mob_selector() -> None:
     col1, col2, col3, _ = st.columns([4, 1, 5, 6], gap=None)
     metric_text_widget(col1, "MOB")
@@ -158,6 +173,7 @@ def variable_selector():
     data_source_selector()
     unt_bad_selector()
     dlr_bad_selector()
+    weight_selector()
     current_mob_selector()
     lifetime_mob_selector()
 
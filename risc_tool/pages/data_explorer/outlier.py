@@ -1,3 +1,4 @@
+import pandas as pd
 import streamlit as st
 import streamlit_antd_components as sac
 
@@ -6,6 +7,33 @@ from risc_tool.data.models.types import FilterID
 from risc_tool.data.session import Session
 
 
+def outlier_preview(variable_name: str, comparison_op: ComparisonOperation):
+    session: Session = st.session_state["session"]
+    de_view_model = session.data_explorer_view_model
+
+    try:
+        preview = de_view_model.preview_outlier(variable_name, comparison_op)
+    except (TypeError, ValueError):
+        # Not a numeric column; saving the rule reports the error
+        return
+
+    with st.expander("Outlier Count by Percentile"):
+        st.dataframe(
+            pd.DataFrame(
+                {
+                    PercentileOptions.format_perc(percentile): [
+                        f"{threshold:,.6g}",
+                        f"{outlier_count:,}",
+                    ]
+                    for percentile, threshold, outlier_count in zip(
+                        preview.index, preview["threshold"], preview["outlier_count"]
+                    )
+                },
+                index=["Threshold", "Outlier Count"],
+            )
+        )
+
+
 def outlier_rule_input(
     outlier_id: FilterID,
     variable_name: str,
@@ -58,6 +86,8 @@ def outlier_rule_input(
         except ValueError:
             pass
 
+        outlier_preview(new_variable_name, new_comparison_op)
+
         with st.container(horizontal=True, horizontal_alignment="right"):
             if errors:
                 st.error(errors)
@@ -121,7 +151,7 @@ def outlier_rules():
             comparison_base=comparison_base,
             key=str(outlier_rule.uid),
             errors=de_view_model.ol_errors.get(outlier_rule.uid),
-            frequency=(~outlier_rule.mask).sum()
+            frequency=(~outlier_rule.mask).count()
             if outlier_rule.mask is not None
             else -1,
         )
@@ -1,9 +1,11 @@
 import math
 
 import altair as alt
+import pandas as pd
 import streamlit as st
 
 from risc_tool.data.models.asset_path import AssetPath
+from risc_tool.data.models.exceptions import format_error
 from risc_tool.data.models.filter import Filter
 from risc_tool.data.session import Session
 from risc_tool.pages.components.query_editor import query_editor
@@ -69,8 +71,13 @@ def pie_chart_widget(filter_obj: Filter | None):
     if filter_obj is None or filter_obj.mask is None:
         return
 
-    counts = filter_obj.mask.value_counts().to_frame().reset_index()
-    counts.columns = ["Condition Satisfies", "Count"]
+    n_true = filter_obj.mask.count()
+    n_false = len(filter_obj.mask) - n_true - filter_obj.mask.count_na()
+    counts = pd.DataFrame({
+        "Condition Satisfies": [True, False],
+        "Count": [n_true, n_false],
+    })
+    counts = counts.loc[counts["Count"] > 0]
 
     base_chart = alt.Chart(counts).encode(
         theta=alt.Theta(field="Count", type="quantitative").stack(True),
@@ -96,6 +103,56 @@ def pie_chart_widget(filter_obj: Filter | None):
     st.altair_chart(chart, width="stretch")
 
 
+def filter_preview_counts(refining: bool):
+    session: Session = st.session_state["session"]
+    filter_editor_vm = session.filter_editor_view_model
+    preview = filter_editor_vm.filter_preview
+
+    if preview is None:
+        return
+
+    if refining and (preview.is_exact or preview.error is not None):
+        # Stop polling
+        st.rerun()
+
+    if preview.error is not None:
+        st.error(format_error(preview.error))
+        return
+
+    st.metric(
+        label="Pass Rate" if preview.is_exact else "Estimated Pass Rate",
+        value=f"{preview.pass_rate:.2%}",
+    )
+
+    if not preview.is_exact:
+        st.caption(f"Estimated from {preview.progress:.0%} of the rows")
+
+    counts = filter_editor_vm.filter_preview_counts()
+    st.dataframe(
+        counts.rename(
+            columns={
+                "rows": "Rows",
+                "evaluated_rows": "Evaluated",
+                "passed_rows": "Passed",
+            }
+        ),
+        column_config={"Passed": st.column_config.NumberColumn(format="%.0f")},
+    )
+
+
+def filter_preview_widget():
+    session: Session = st.session_state["session"]
+    filter_editor_vm = session.filter_editor_view_model
+    preview = filter_editor_vm.filter_preview
+
+    if preview is None:
+        return
+
+    # Polls the counts while they are refined in the background
+    refining = not preview.is_exact and preview.error is None
+    st.fragment(filter_preview_counts, run_every=0.5 if refining else None)(refining)
+
+
 def quick_reference_widget():
     with open(AssetPath.FILTER_QUERY_REFERENCE) as fp:
         text = fp.read()
@@ -161,6 +218,17 @@ def filter_editor():
                 latest_editor_id=edited_query["id"],
             )
 
+        def on_preview():
+            filter_editor_vm.preview_filter(query=edited_query["text"])
+
+        st.button(
+            label="Preview",
+            type="secondary",
+            icon=":material/speed:",
+            width="stretch",
+            on_click=on_preview,
+        )
+
         st.button(
             label="Verify",
             type="secondary",
@@ -169,6 +237,8 @@ def filter_editor():
             on_click=on_verify,
         )
 
+        filter_preview_widget()
+
         pie_chart_widget(filter_editor_vm.filter_cache)
 
         disabled_save_button: bool = (
@@ -181,6 +181,28 @@ def iteration_sidebar_components(iteration_id: IterationID):
         )
         st.rerun()
 
+    # Confidence Interval Toggle
+    current_confidence_intervals = iterations_vm.get_iteration_metadata(
+        iteration_id
+    ).confidence_intervals
+
+    confidence_intervals = st.checkbox(
+        label="Confidence Intervals",
+        value=current_confidence_intervals,
+        help=(
+            "Show bootstrapped 95% confidence intervals of the segment metrics."
+            " Not available for metrics computed row by row or from approximate"
+            " quantiles."
+        ),
+    )
+
+    if confidence_intervals != current_confidence_intervals:
+        iterations_vm.set_metadata(
+            iteration_id=iteration_id,
+            confidence_intervals=confidence_intervals,
+        )
+        st.rerun()
+
     # Editable Toggle
     if iteration.iter_type == IterationType.DOUBLE:
         current_editable = iterations_vm.get_iteration_metadata(iteration_id).editable
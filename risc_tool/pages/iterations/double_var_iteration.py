@@ -192,6 +192,7 @@ def double_var_iteration():
                 metric_ids=metadata.metric_ids,
                 scalars_enabled=metadata.scalars_enabled,
                 remove_outliers=metadata.remove_outliers,
+                confidence_intervals=metadata.confidence_intervals,
                 editable=False,
                 key=f"chain-{chain_iteration_id}",
             )
@@ -47,6 +47,7 @@ def single_var_iteration():
         metric_ids=metadata.metric_ids,
         scalars_enabled=metadata.scalars_enabled,
         remove_outliers=metadata.remove_outliers,
+        confidence_intervals=metadata.confidence_intervals,
         key="range-grid-default",
     )
 
@@ -61,6 +62,7 @@ def single_var_iteration():
         metric_ids=metadata.metric_ids,
         scalars_enabled=metadata.scalars_enabled,
         remove_outliers=metadata.remove_outliers,
+        confidence_intervals=metadata.confidence_intervals,
         key="range-grid-editable",
     )
 
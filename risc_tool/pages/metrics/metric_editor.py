@@ -2,6 +2,7 @@ import streamlit as st
 
 from risc_tool.data.models.asset_path import AssetPath
 from risc_tool.data.models.metric import MetricQueryValidator
+from risc_tool.data.models.quantile_sketch import KLLSketch
 from risc_tool.data.session import Session
 from risc_tool.pages.components.query_editor import query_editor
 
@@ -121,6 +122,22 @@ def format_selector():
         mc.set_metric_property(decimal_places=decimal_places)
         st.rerun()
 
+    approximate = st.checkbox(
+        "Approximate Quantiles",
+        value=mc.metric_cache.approximate,
+        help=(
+            "Compute `.median()` and `.quantile()` from mergeable sketches where"
+            " segments are updated or rolled up (segment edits, pivot tables) instead"
+            " of re-sorting every value, with a rank error of about"
+            f" ±{KLLSketch.normalized_rank_error():.1%}. Other tables use exact"
+            " quantiles."
+        ),
+    )
+
+    if approximate != mc.metric_cache.approximate:
+        mc.set_metric_property(approximate=approximate)
+        st.rerun()
+
     with st.container(border=True):
         st.markdown("##### Format Preview:")
 
@@ -221,6 +238,13 @@ def metric_editor():
     if error_message := metric_editor_vm.error_message():
         error_container.error(error_message)
     else:
+        if metric_editor_vm.is_verified and (
+            weighting_warning := metric_editor_vm.get_weighting_warning(
+                metric_editor_vm.metric_cache
+            )
+        ):
+            error_container.warning(weighting_warning, icon=":material/balance:")
+
         with error_container.expander(label="Metric Object", expanded=False):
             st.write(metric_editor_vm.metric_cache)
 
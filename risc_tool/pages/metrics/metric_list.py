@@ -30,10 +30,24 @@ def delete_confirmation_dialog(metric_id: MetricID):
 
     st.write(f"Delete Metric `{metric_obj.name}` ?")
 
+    dependent_metrics = metric_editor_vm.get_dependent_metrics(metric_id)
+
+    if dependent_metrics:
+        st.warning(
+            f"`{metric_obj.name}` is used by "
+            + ", ".join(f"`{name}`" for name in dependent_metrics)
+            + ". Remove the references before deleting it."
+        )
+
     col1, col2 = st.columns(2)
 
     with col1:
-        if st.button("Delete", type="primary", width="stretch"):
+        if st.button(
+            "Delete",
+            type="primary",
+            width="stretch",
+            disabled=bool(dependent_metrics),
+        ):
             metric_editor_vm.remove_metric(metric_id)
             st.rerun()
     with col2:
@@ -81,8 +95,16 @@ def metric_list():
 
                     st.badge(f"Decimals: {metric_obj.decimal_places}", color="yellow")
 
+                    if (rank_error := metric_obj.rank_error) is not None:
+                        st.badge(f"±{rank_error:.1%} rank", color="orange")
+
                 st.code(metric_obj.query, language="python")
 
+                if weighting_warning := metric_editor_vm.get_weighting_warning(
+                    metric_obj
+                ):
+                    st.warning(weighting_warning, icon=":material/balance:")
+
             with col2:
                 toggle_container = st.container()
                 col21, col22, col23 = st.columns(3)
@@ -1,9 +1,130 @@
 import streamlit as st
 
+from risc_tool.data.models.enums import PivotDimension
+from risc_tool.data.session import Session
+from risc_tool.pages.components.error_warnings import error_and_warning_widget
+from risc_tool.pages.components.filter_selector import filter_selector
+from risc_tool.pages.components.iteration_selector import iteration_selector
+from risc_tool.pages.components.metric_selector import metric_selector_button
+
+
+def sidebar_widgets():
+    session: Session = st.session_state["session"]
+    summary_vm = session.summary_view_model
+
+    # Metric Selection
+    metric_selector_button(
+        current_metrics=summary_vm.pv_metric_ids,
+        set_metrics=summary_vm.set_pivot_metrics,
+    )
+
+    # Filter Selection
+    current_filter_ids = summary_vm.pv_filter_ids
+
+    selected_filter_ids = filter_selector(
+        key="summary-pivot-filter-selector",
+        filter_ids=current_filter_ids,
+    )
+
+    if set(selected_filter_ids) != set(current_filter_ids):
+        summary_vm.pv_filter_ids = selected_filter_ids
+        st.rerun()
+
+    # Outlier Toggle
+    current_remove_outliers = summary_vm.pv_remove_outliers
+
+    remove_outliers = st.checkbox(
+        label="Remove Outliers",
+        value=current_remove_outliers,
+        help="Remove Outliers",
+    )
+
+    if remove_outliers != current_remove_outliers:
+        summary_vm.pv_remove_outliers = remove_outliers
+        st.rerun()
+
+
+def layout_widgets():
+    session: Session = st.session_state["session"]
+    summary_vm = session.summary_view_model
+
+    available_dimensions = summary_vm.available_pivot_dimensions
+    current_dimensions = [
+        dim for dim in summary_vm.pv_dimensions if dim in available_dimensions
+    ]
+
+    dimensions = st.multiselect(
+        label="Dimensions",
+        options=available_dimensions,
+        default=current_dimensions,
+        help="Dimensions to break the risk segments down by",
+        key="summary-pivot-dimensions",
+    )
+
+    if dimensions != summary_vm.pv_dimensions:
+        summary_vm.set_pivot_dimensions(dimensions)
+        st.rerun()
+
+    layout_dimensions = [PivotDimension.RISK_SEGMENT.value] + dimensions
+
+    row_col, column_col = st.columns(2)
+
+    with row_col:
+        rows = st.multiselect(
+            label="Rows",
+            options=[
+                dim for dim in layout_dimensions if dim not in summary_vm.pv_columns
+            ],
+            default=summary_vm.pv_rows,
+            key="summary-pivot-rows",
+        )
+
+    with column_col:
+        columns = st.multiselect(
+            label="Columns",
+            options=[dim for dim in layout_dimensions if dim not in rows],
+            default=[dim for dim in summary_vm.pv_columns if dim not in rows],
+            key="summary-pivot-columns",
+        )
+
+    if rows != summary_vm.pv_rows or columns != summary_vm.pv_columns:
+        summary_vm.pv_rows = rows
+        summary_vm.pv_columns = columns
+        st.rerun()
+
 
 def pivot():
-    st.header("(Not Implemented Yet)")
-    # st.balloons()
+    session: Session = st.session_state["session"]
+    summary_vm = session.summary_view_model
+
+    with st.sidebar:
+        sidebar_widgets()
+
+    iteration_id, default = iteration_selector(
+        key="summary-pivot-iteration-selector",
+        iteration_id=summary_vm.pv_selected_iteration_id,
+        default=summary_vm.pv_selected_iteration_default,
+    )
+
+    if (
+        iteration_id != summary_vm.pv_selected_iteration_id
+        or default != summary_vm.pv_selected_iteration_default
+    ):
+        summary_vm.pv_selected_iteration_id = iteration_id
+        summary_vm.pv_selected_iteration_default = default
+        st.rerun()
+
+    layout_widgets()
+
+    pivot_df, errors, warnings = summary_vm.get_pivot_table()
+
+    error_and_warning_widget(errors, warnings)
+
+    if pivot_df is None or pivot_df.empty:
+        st.info("Select at least one metric to show the pivot table.")
+        return
+
+    st.dataframe(pivot_df, width="stretch", placeholder="-")
 
 
 __all__ = ["pivot"]
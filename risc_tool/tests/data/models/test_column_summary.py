@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from risc_tool.data.models.column_summary import ColumnSummary
+from risc_tool.data.models.enums import ComparisonOperation, PercentileOptions
+from risc_tool.data.models.outlier import PERCENTILE_FRACTIONS, OutlierRule
+from risc_tool.data.models.types import FilterID
+
+
+@pytest.fixture(params=["Int64", "Float64"])
+def column(request):
+    rng = np.random.default_rng(0)
+    n_rows = 1001
+
+    if request.param == "Int64":
+        values = rng.integers(0, 50, n_rows)
+    else:
+        values = np.round(rng.normal(size=n_rows), 1)
+
+    column = pd.Series(values, name="v").astype(request.param)
+    column[rng.random(n_rows) > 0.9] = pd.NA
+
+    return column
+
+
+def test_mode_and_quantiles_match_pandas(column):
+    summary = ColumnSummary(column)
+    mode = column.mode().iloc[0]
+    without_mode = column.loc[column != mode]
+
+    assert len(summary) == column.count()
+    assert summary.mode == mode
+
+    for q in [0.0, 0.01, 0.25, 0.5, 0.9, 0.99, 1.0]:
+        assert summary.quantile(q) == column.quantile(q)
+        assert summary.quantile(q, exclude_mode=True) == without_mode.quantile(q)
+
+
+def test_constant_and_empty_columns():
+    summary = ColumnSummary(pd.Series([3, 3, pd.NA], dtype="Int64", name="c"))
+
+    assert summary.mode == 3
+    assert summary.quantile(0.5) == 3.0
+    assert np.isnan(summary.quantile(0.5, exclude_mode=True))
+
+    with pytest.raises(ValueError, match="has no values"):
+        ColumnSummary(pd.Series([pd.NA], dtype="Int64", name="c"))
+
+
+def test_outlier_rule_from_summary(column):
+    summary = ColumnSummary(column)
+    mode = column.mode().iloc[0]
+    threshold = column.loc[column != mode].quantile(0.99)
+
+    rule = OutlierRule.from_summary(
+        FilterID(1), summary, ComparisonOperation.GT, PercentileOptions.PERC_99
+    )
+
+    assert PERCENTILE_FRACTIONS[PercentileOptions.PERC_99] == 0.99
+    assert rule.threshold == threshold
+    assert rule.query == f"~((`v` > {threshold}) & (`v` != {mode}))"
+
+    duplicate = rule.duplicate(uid=FilterID(2))
+    assert duplicate.uid == FilterID(2)
+    assert duplicate.query == rule.query
+
+    rule.validate_query(available_columns=["v"])
+    rule.create_mask(column.to_frame())
+    assert rule.mask is not None
+    assert (~rule.mask).count() == ((column > threshold) & (column != mode)).sum()
+
+
+@pytest.mark.parametrize("comparison_op", list(ComparisonOperation))
+def test_percentile_thresholds_and_counts(column, comparison_op):
+    summary = ColumnSummary(column)
+    mode = column.mode().iloc[0]
+    without_mode = column.loc[column != mode]
+
+    fractions = list(PERCENTILE_FRACTIONS.values())
+    thresholds = summary.quantiles(fractions, exclude_mode=True)
+    counts = summary.count(comparison_op, thresholds, exclude_mode=True)
+
+    for fraction, threshold, count in zip(fractions, thresholds, counts):
+        assert threshold == without_mode.quantile(fraction)
+
+        expected = column.to_frame().eval(
+            f"(v {comparison_op} {threshold}) & (v != {mode})"
+        )
+        assert count == expected.sum()
+
+    assert summary.count(comparison_op, [np.nan]).tolist() == [0]
@@ -0,0 +1,26 @@
+from risc_tool.data.models.data_change import DataChange
+from risc_tool.data.models.enums import DataChangeType
+from risc_tool.data.models.types import DataSourceID
+
+
+def test_rows_added_or_removed_touch_every_column():
+    for change_type in (DataChangeType.ADDED, DataChangeType.REMOVED):
+        change = DataChange(change_type, [DataSourceID(1)], columns=["a"])
+        assert change.touches(["b"])
+
+
+def test_modified_columns():
+    change = DataChange(DataChangeType.MODIFIED, [DataSourceID(1)], columns=["a"])
+    assert change.touches(["a", "b"])
+    assert not change.touches(["b"])
+
+    change = DataChange(DataChangeType.MODIFIED, [DataSourceID(1)])
+    assert change.columns is None
+    assert change.touches(["b"])
+
+
+def test_relabeled_touches_nothing():
+    change = DataChange(DataChangeType.RELABELED, [DataSourceID(1)])
+    assert change.columns == frozenset()
+    assert not change.touches(["a"])
+    assert change.data_source_ids == frozenset([DataSourceID(1)])
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -59,7 +60,70 @@ def test_create_mask(sample_df):
     f = Filter(uid=FilterID(1), name="Test", query="A > 2")
     f.create_mask(sample_df)
     assert f.mask is not None
-    assert f.mask.tolist() == [False, False, True, True, True]
+    assert f.mask.to_numpy().tolist() == [False, False, True, True, True]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "(x > 5) & (y == 'a')",
+        "x > 5 or y != 'a'",
+        "~(x > 5) | z.isna()",
+        "1 < x < 8",
+        "x + z > 5",
+        "y in ['a', 'b']",
+        "x == [1, 9]",
+        "y > 'a'",
+        "`w w` % 2 == 1",
+        "b & (z < 3)",
+        "x > 5 & z < 3",
+        "b | x > 5 & y == 'a'",
+    ],
+)
+def test_compiled_plan_matches_eval(query):
+    df = pd.DataFrame({
+        "x": [1, 7, None, 9],
+        "y": ["a", "b", None, "a"],
+        "z": [1.5, np.nan, 3.0, 4.0],
+        "w w": [0, 1, 2, 3],
+        "b": [True, None, False, True],
+    }).convert_dtypes()
+
+    f = Filter(uid=FilterID(1), name="Test", query=query)
+    f.validate_query(available_columns=df.columns.tolist())
+    assert f.plan is not None
+    assert all(conjunct.kernel is not None for conjunct in f.plan.conjuncts)
+
+    pd.testing.assert_series_equal(
+        f.plan.evaluate(df), df.eval(query), check_names=False
+    )
+
+
+def test_kernel_fallback(sample_df):
+    f = Filter(uid=FilterID(1), name="Test", query="B.str.contains('x')")
+    f.validate_query(available_columns=sample_df.columns.tolist())
+    assert f.plan is not None
+    assert f.plan.conjuncts[0].kernel is None
+
+    f.create_mask(sample_df)
+    assert f.mask is not None
+    assert f.mask.to_numpy().tolist() == [True, False, True, False, True]
+
+
+def test_text_column_comparison_matches_eval():
+    df = pd.DataFrame({
+        "s": pd.array(["a", None, "b", "a"], dtype="string"),
+        "o": np.array(["a", "a", None, "b"], dtype=object),
+    })
+
+    for query in ["s == o", "o != s"]:
+        f = Filter(uid=FilterID(1), name="Test", query=query)
+        f.validate_query(available_columns=df.columns.tolist())
+        assert f.plan is not None
+
+        pd.testing.assert_series_equal(
+            f.plan.evaluate(df), df.eval(query), check_names=False
+        )
 
 
 def test_duplicate():
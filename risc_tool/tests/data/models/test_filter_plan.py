@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from risc_tool.data.models.filter import Filter
+from risc_tool.data.models.filter_plan import FilterPlan, PredicateCache
+from risc_tool.data.models.types import FilterID
+
+
+@pytest.fixture
+def sample_df():
+    rng = np.random.default_rng(0)
+    n = 60_000
+
+    df = pd.DataFrame({
+        "a": rng.integers(0, 100, n),
+        "b": rng.choice(["xa", "yb", "xc", None], n),
+        "c c": rng.random(n),
+    }).convert_dtypes()
+    df.loc[rng.random(n) > 0.9, "a"] = pd.NA
+
+    return df
+
+
+def plan(query: str, df: pd.DataFrame) -> FilterPlan:
+    f = Filter(uid=FilterID(1), name="Test", query=query)
+    f.validate_query(available_columns=df.columns.tolist())
+    assert f.plan is not None
+
+    return f.plan
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "(a > 10) & b.str.contains('x') & (`c c` < 0.5)",
+        "b.str.startswith('y') & a < 95",
+        "(a < 2) and (b == 'xa')",
+        "(a > 50) & ((b == 'yb') | (`c c` > 0.9))",
+        "(b == 'xa') & (a > a.mean())",
+        "(`c c` > `c c`.quantile(0.9)) & (b == 'xa')",
+    ],
+)
+def test_plan_matches_eval(sample_df, query):
+    for df in [sample_df, sample_df.iloc[:100]]:
+        for predicate_cache in [None, PredicateCache()]:
+            result = plan(query, df).evaluate(df, predicate_cache)
+            expected = df.eval(query)
+
+            pd.testing.assert_series_equal(
+                result.astype("boolean"),
+                expected.astype("boolean"),
+                check_names=False,
+            )
+
+
+def test_row_wise(sample_df):
+    assert plan("b.str.contains('x') & a.notna() & (a > 5)", sample_df).is_row_wise
+    assert plan("b.str[0] == 'x'", sample_df).is_row_wise
+    assert not plan("(a > 5) & (a > a.median())", sample_df).is_row_wise
+    assert not plan("b.str.len() > b.str.len().max()", sample_df).is_row_wise
+
+
+def test_plan_order(sample_df):
+    query = "b.str.contains('x') & (`c c` < 0.5) & (a < 2)"
+    f_plan = plan(query, sample_df)
+
+    # Text methods last, the most selective comparison first
+    ordered = [conjunct.query for conjunct in f_plan.order(sample_df)]
+    assert ordered[0] == "a < 2"
+    assert ordered[-1] == "b.str.contains('x')"
+
+    # Small data is ordered by cost only
+    ordered = [conjunct.query for conjunct in f_plan.order(sample_df.iloc[:100])]
+    assert ordered[-1] == "b.str.contains('x')"
+
+
+def test_single_condition(sample_df):
+    f_plan = plan("(a > 1) | (`c c` < 0.5)", sample_df)
+    assert len(f_plan.conjuncts) == 1
+
+
+def test_canonical_conditions(sample_df):
+    first = plan("(`a` > 10) & (b == 'xa')", sample_df).conjuncts
+    second = plan("(b == 'xa') & (10 < a)", sample_df).conjuncts
+
+    assert {c.canonical for c in first} == {c.canonical for c in second}
+    assert first[0].columns == frozenset(["a"])
+
+
+def test_predicate_cache(sample_df):
+    cache = PredicateCache()
+
+    first = plan("(a > 10) & b.str.contains('x')", sample_df)
+    second = plan("(10 < a) & (`c c` < 0.5)", sample_df)
+
+    first.evaluate(sample_df, cache)
+    assert len(cache) == 1  # The text condition only ran on a subset of rows
+
+    result = second.evaluate(sample_df, cache)
+    assert len(cache) == 2
+    pd.testing.assert_series_equal(
+        result.astype("boolean"),
+        sample_df.eval("(a > 10) & (`c c` < 0.5)").astype("boolean"),
+        check_names=False,
+    )
+
+    cache.invalidate(["c c"])
+    assert len(cache) == 1
+
+    cache.invalidate()
+    assert len(cache) == 0
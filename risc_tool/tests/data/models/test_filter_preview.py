@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from risc_tool.data.models.filter import Filter
+from risc_tool.data.models.filter_preview import FilterPreview
+from risc_tool.data.models.types import DataSourceID, FilterID
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    sizes = {DataSourceID(1): 3000, DataSourceID(2): 1000}
+
+    return pd.concat(
+        [
+            pd.DataFrame({
+                "x": np.sort(rng.integers(0, 100, size)),
+                "y": rng.choice(["a", "b"], size),
+            })
+            for size in sizes.values()
+        ],
+        keys=list(sizes.keys()),
+    ).convert_dtypes()
+
+
+def make_preview(query: str, data: pd.DataFrame) -> FilterPreview:
+    f = Filter(uid=FilterID.TEMPORARY, name="", query=query)
+    f.validate_query(available_columns=data.columns.tolist())
+
+    return FilterPreview(f, data)
+
+
+def expected_counts(query: str, data: pd.DataFrame) -> list[int]:
+    return data.eval(query).groupby(level=0).sum().tolist()
+
+
+def test_estimate_then_exact(data, monkeypatch):
+    monkeypatch.setattr(FilterPreview, "chunk_size", 500)
+    query = "x > 70 & y == 'a'"
+    preview = make_preview(query, data)
+
+    # A budget of zero still evaluates one chunk, every 8th row
+    preview.refine(time_budget=0)
+    counts = preview.counts
+
+    assert not preview.is_exact
+    assert preview.progress == 1 / 8
+    assert counts["rows"].tolist() == [3000, 1000]
+    assert counts["evaluated_rows"].tolist() == [375, 125]
+
+    expected = expected_counts(query, data)
+    assert counts["passed_rows"].tolist() == pytest.approx(expected, rel=0.3)
+
+    preview.refine()
+    counts = preview.counts
+
+    assert preview.is_exact
+    assert counts["passed_rows"].tolist() == expected
+    assert preview.pass_rate == sum(expected) / len(data)
+
+
+def test_refine_in_background(data, monkeypatch):
+    monkeypatch.setattr(FilterPreview, "chunk_size", 100)
+    preview = make_preview("x < 20", data)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        preview.refine_in_background(executor)
+        assert preview.future is not None
+        preview.future.result()
+
+    assert preview.is_exact
+    assert preview.error is None
+    assert preview.counts["passed_rows"].tolist() == expected_counts("x < 20", data)
+
+
+def test_cancel(data, monkeypatch):
+    monkeypatch.setattr(FilterPreview, "chunk_size", 100)
+    preview = make_preview("x < 20", data)
+
+    preview.cancel()
+    preview.refine()
+
+    assert preview.progress == 0
+    assert preview.counts["passed_rows"].isna().all()
+
+
+def test_background_error(data):
+    preview = make_preview("y > 5", data)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        preview.refine_in_background(executor)
+        preview.future.result()
+
+    assert preview.error is not None
+    assert not preview.is_exact
+
+
+def test_aggregate_in_one_chunk(data, monkeypatch):
+    monkeypatch.setattr(FilterPreview, "chunk_size", 500)
+    query = "x > x.mean() & y == 'a'"
+    preview = make_preview(query, data)
+
+    preview.refine(time_budget=0)
+
+    assert preview.is_exact
+    assert preview.counts["passed_rows"].tolist() == expected_counts(query, data)
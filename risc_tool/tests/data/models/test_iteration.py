@@ -182,3 +182,132 @@ def test_from_dict_roundtrip(numerical_single_iter, numerical_var):
     assert loaded.name == numerical_single_iter.name
     # Check var type logic
     assert isinstance(loaded, NumericalSingleVarIteration)
+
+
+def test_numerical_mapping_edges(risk_segment_details):
+    variable = pd.Series([0, 1, 5, 6, 10, 11, None], name="NumVar", dtype="Float64")
+    iteration = NumericalSingleVarIteration(
+        uid=IterationID(4),
+        name="Edges",
+        variable=variable,
+        risk_segment_details=risk_segment_details,
+    )
+
+    for group_index in range(10):
+        iteration.set_group(group_index, float("nan"), float("nan"))
+
+    # Group 2 is left of group 0; the values 0 and 11 are not covered
+    iteration.set_group(0, 5.0, 10.0)
+    iteration.set_group(2, 0.0, 5.0)
+
+    res = iteration.get_group_mapping(default=False)
+
+    assert not res.errors
+    assert res.risk_segment_column.cat.codes.dtype == "int8"
+    assert res.risk_segment_column.astype("Int64").tolist() == [
+        pd.NA,
+        2,
+        2,
+        0,
+        0,
+        pd.NA,
+        pd.NA,
+    ]
+    assert any("not covered by any group: [0.0, 11.0]" in w for w in res.warnings)
+
+    iteration.set_group(1, 9.0, 12.0)
+    res = iteration.get_group_mapping(default=False)
+
+    assert res.errors == [
+        "Iteration 4: Following intervals overlap: ['0. (5.0, 10.0] and 1. (9.0, 12.0]']"
+    ]
+    assert res.risk_segment_column.isna().all()
+
+
+def test_categorical_mapping(categorical_single_iter):
+    iteration = categorical_single_iter
+
+    for group_index in range(10):
+        iteration.set_group(group_index, categories=set())
+
+    iteration.set_group(1, categories={"A", "C"})
+    iteration.set_group(3, categories={"B"})
+
+    res = iteration.get_group_mapping(default=False)
+
+    assert not res.errors
+    assert res.risk_segment_column.cat.codes.dtype == "int8"
+    assert res.risk_segment_column.iloc[:5].tolist() == [1, 3, 1, 1, 3]
+
+    iteration.set_group(3, categories={"B", "C"})
+    res = iteration.get_group_mapping(default=False)
+
+    assert res.errors == ["Iteration 2: Category 'C' is assigned to multiple groups."]
+    assert res.risk_segment_column.isna().all()
+
+    iteration.set_group(3, categories={"B", "D"})
+    res = iteration.get_group_mapping(default=False)
+
+    assert 3 in res.invalid_groups
+    assert res.risk_segment_column.iloc[0] == 1
+    assert pd.isna(res.risk_segment_column.iloc[1])
+
+
+def test_double_var_risk_segments(numerical_var, risk_segment_details):
+    iteration = NumericalDoubleVarIteration(
+        uid=IterationID(5),
+        name="NumDouble",
+        variable=numerical_var.iloc[:4],
+        risk_segment_details=risk_segment_details,
+    )
+
+    for group_index in range(len(iteration.groups)):
+        iteration.set_group(group_index, float("nan"), float("nan"))
+
+    iteration.set_group(0, -1.0, 1.0)
+    iteration.set_group(1, 1.0, 3.0)
+    iteration.set_risk_segment_grid(group_index=0, previous_rs_index=2, value=7)
+    iteration.set_risk_segment_grid(group_index=1, previous_rs_index=4, value=3)
+
+    previous_risk_segments = pd.Series(
+        [2, 4, 4, None], dtype=pd.CategoricalDtype(categories=range(10))
+    )
+
+    res = iteration.get_risk_segments(previous_risk_segments, default=False)
+
+    assert not res.errors
+    assert res.risk_segment_column.cat.codes.dtype == "int8"
+    assert list(res.risk_segment_column.cat.categories) == list(
+        iteration.risk_segment_grid.columns
+    )
+    assert res.risk_segment_column.astype("Int64").tolist() == [
+        7,
+        iteration.risk_segment_grid.at[0, 4],
+        3,
+        pd.NA,
+    ]
+
+
+def test_chained_segment_codes(numerical_single_iter, risk_segment_details):
+    child = NumericalDoubleVarIteration(
+        uid=IterationID(6),
+        name="Child",
+        variable=numerical_single_iter.variable[::-1].reset_index(drop=True),
+        risk_segment_details=risk_segment_details,
+    )
+    child.set_risk_segment_grid(group_index=0, previous_rs_index=9, value=0)
+
+    parent_output = numerical_single_iter.get_risk_segments(None, default=False)
+    expected = child.get_risk_segments(parent_output.risk_segment_column, default=False)
+
+    _, errors, _, parent_codes, parent_categories = (
+        numerical_single_iter.get_segment_codes(None, None, default=False)
+    )
+    _, _, _, codes, categories = child.get_segment_codes(
+        parent_codes, parent_categories, default=False
+    )
+
+    assert not errors
+    assert codes.tolist() == expected.risk_segment_column.cat.codes.tolist()
+    assert list(categories) == list(expected.risk_segment_column.cat.categories)
+    assert expected.risk_segment_column.iloc[-1] == 0
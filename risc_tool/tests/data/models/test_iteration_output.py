@@ -1,6 +1,6 @@
 import pandas as pd
 
-from risc_tool.data.models.iteration_output import IterationOutput
+from risc_tool.data.models.iteration_output import IterationOutput, IterationOutputCache
 
 
 def test_iteration_output_creation():
@@ -14,3 +14,54 @@ def test_iteration_output_creation():
     assert io.errors == ["err1"]
     assert io.warnings == ["warn1"]
     assert io.invalid_groups == [99]
+
+
+def _output(values: list) -> IterationOutput:
+    return IterationOutput(
+        risk_segment_column=pd.Series(
+            values, dtype=pd.CategoricalDtype(categories=range(10))
+        ),
+        errors=[],
+        warnings=["warn1"],
+        invalid_groups=[3],
+    )
+
+
+def test_iteration_output_cache_roundtrip():
+    cache = IterationOutputCache()
+    cache.put((1, "edited"), _output([0, 9, None, 4]))
+
+    index = pd.Index(["a", "b", "c", "d"])
+    output = cache.get((1, "edited"), index)
+
+    assert output is not None
+    assert output.risk_segment_column.index is index
+    assert output.risk_segment_column.cat.codes.dtype == "int8"
+    assert output.risk_segment_column.astype("Int64").tolist() == [0, 9, pd.NA, 4]
+    assert list(output.risk_segment_column.cat.categories) == list(range(10))
+    assert output.warnings == ["warn1"]
+    assert output.invalid_groups == [3]
+
+    codes, categories = cache.get_codes((1, "edited"))
+    assert categories.tolist() == list(range(10))
+    assert codes.tolist() == [0, 9, -1, 4]
+    assert cache.get((1, "default"), index) is None
+
+
+def test_iteration_output_cache_eviction():
+    cache = IterationOutputCache(max_bytes=8)
+
+    cache.put(1, _output([0] * 4))
+    cache.put(2, _output([1] * 4))
+    cache.get_codes(1)
+    cache.put(3, _output([2] * 4))
+
+    # 2 is the least recently used
+    assert 1 in cache and 3 in cache and 2 not in cache
+    assert cache.nbytes == 8
+
+    cache.pop(1)
+    assert len(cache) == 1
+
+    cache.clear()
+    assert len(cache) == 0
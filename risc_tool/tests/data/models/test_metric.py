@@ -1,10 +1,15 @@
+import numpy as np
 import pandas as pd
 import pytest
 
 from risc_tool.data.models.metric import (
     Metric,
     Volume,
+    element_wise_max,
+    element_wise_mean,
+    element_wise_std,
     element_wise_sum,
+    parse_query,
 )
 from risc_tool.data.models.types import MetricID
 
@@ -36,6 +41,21 @@ def test_metric_validation_invalid_function(sample_data):
         m2.validate_query(sample_data)
 
 
+def test_parse_query_cached():
+    parse_query.cache_clear()
+
+    processed_query, placeholder_map, used_columns, referenced_metrics = parse_query(
+        "`vol`.sum() + bad.sum() + metric('M0')"
+    )
+    parse_query("`vol`.sum() + bad.sum() + metric('M0')")
+
+    assert parse_query.cache_info().hits == 1
+    assert processed_query == "__BACKTICKED__0__.sum() + bad.sum() + metric('M0')"
+    assert placeholder_map == {"__BACKTICKED__0__": "vol", "bad": "bad"}
+    assert used_columns == ("bad", "vol")
+    assert referenced_metrics == ("M0",)
+
+
 def test_metric_calculation(sample_data):
     m = Metric(uid=MetricID(1), name="M1", query="vol.sum()")
     m.validate_query(sample_data)
@@ -60,6 +80,120 @@ def test_metric_custom_functions(sample_data):
     assert res == 4.0
 
 
+def test_metric_reference(sample_data):
+    bad_count = Metric(
+        uid=MetricID(1),
+        name="Bad Count",
+        query="bad.sum()",
+        data_source_ids=[],
+    )
+    bad_count.validate_query(sample_data)
+
+    m = Metric(
+        uid=MetricID(2),
+        name="M2",
+        query="metric('Bad Count') / vol.sum()",
+        data_source_ids=[],
+    )
+    m.validate_query(sample_data, available_metrics={"Bad Count": bad_count})
+
+    assert m.referenced_metrics == ["Bad Count"]
+    assert m.calculate(sample_data) == pytest.approx(1 / 3)
+    assert m.calculate(sample_data, metric_values={"Bad Count": 3}) == 1
+
+
+def test_metric_reference_percentage(sample_data):
+    bad_rate = Metric(
+        uid=MetricID(1),
+        name="Bad Rate",
+        query="bad.mean()",
+        data_source_ids=[],
+        is_percentage=True,
+    )
+    bad_rate.validate_query(sample_data)
+
+    m = Metric(
+        uid=MetricID(2),
+        name="M2",
+        query="metric('Bad Rate') * 3",
+        data_source_ids=[],
+    )
+    m.validate_query(sample_data, available_metrics={"Bad Rate": bad_rate})
+
+    # Referenced metrics are seen before the percentage scaling
+    assert bad_rate.calculate(sample_data) == pytest.approx(100 / 3)
+    assert bad_rate.evaluate(sample_data) == pytest.approx(1 / 3)
+    assert m.calculate(sample_data) == pytest.approx(1)
+
+
+def test_metric_reference_errors(sample_data):
+    m = Metric(
+        uid=MetricID(1),
+        name="M1",
+        query="metric('Missing') + 1",
+        data_source_ids=[],
+    )
+    with pytest.raises(ValueError, match="not found"):
+        m.validate_query(sample_data, available_metrics={})
+
+    m = Metric(
+        uid=MetricID(1),
+        name="M1",
+        query="metric(vol) + 1",
+        data_source_ids=[],
+    )
+    with pytest.raises(ValueError, match="name of a metric"):
+        m.validate_query(sample_data, available_metrics={})
+
+    a = Metric(
+        uid=MetricID(1),
+        name="A",
+        query="vol.sum()",
+        data_source_ids=[],
+    )
+    a.validate_query(sample_data)
+    b = Metric(
+        uid=MetricID(2),
+        name="B",
+        query="metric('A') + 1",
+        data_source_ids=[],
+    )
+    b.validate_query(sample_data, available_metrics={"A": a})
+
+    cyclic = Metric(
+        uid=MetricID(1),
+        name="A",
+        query="metric('B') + 1",
+        data_source_ids=[],
+    )
+    with pytest.raises(ValueError, match="Circular metric reference"):
+        cyclic.validate_query(sample_data, available_metrics={"A": a, "B": b})
+
+
+def test_metric_shared_reductions(sample_data):
+    m1 = Metric(
+        uid=MetricID(1),
+        name="M1",
+        query="bad.sum() / vol.sum()",
+        data_source_ids=[],
+    )
+    m2 = Metric(
+        uid=MetricID(2),
+        name="M2",
+        query="vol.sum() + 1",
+        data_source_ids=[],
+    )
+    m1.validate_query(sample_data)
+    m2.validate_query(sample_data)
+
+    shared = {}
+    assert m1.calculate(sample_data, shared=shared) == pytest.approx(1 / 3)
+    assert len(shared) == 2
+
+    assert m2.calculate(sample_data, shared=shared) == 4
+    assert len(shared) == 2
+
+
 def test_volume_metric(sample_data):
     v = Volume("vol", [])
     assert v.query == "`vol`.size"
@@ -81,6 +215,41 @@ def test_element_wise_helpers():
     pd.testing.assert_series_equal(res_mix, pd.Series([11, 12]))
 
 
+def test_element_wise_helpers_narrow_dtypes():
+    s1 = pd.Series([100, -100], dtype="int8")
+    s2 = pd.Series([True, False])
+
+    pd.testing.assert_series_equal(
+        element_wise_sum(s1, 1000), pd.Series([1100, 900], dtype="int64")
+    )
+    pd.testing.assert_series_equal(
+        element_wise_sum(s1, s1, s2), pd.Series([201, -200], dtype="int64")
+    )
+    pd.testing.assert_series_equal(
+        element_wise_max(s1, 0.5), pd.Series([100.0, 0.5], dtype="float64")
+    )
+
+
+def test_element_wise_helpers_missing_values():
+    index = pd.MultiIndex.from_tuples([(0, 0), (0, 1), (1, 0)])
+    s1 = pd.Series([1.0, None, None], index=index, dtype="Float64")
+    s2 = pd.Series([3.0, 4.0, None], index=index)
+
+    pd.testing.assert_series_equal(
+        element_wise_sum(s1, s2, 1), pd.Series([5.0, 5.0, 1.0], index=index)
+    )
+    pd.testing.assert_series_equal(
+        element_wise_mean(s1, s2), pd.Series([2.0, 4.0, None], index=index)
+    )
+    pd.testing.assert_series_equal(
+        element_wise_max(s1, s2), pd.Series([3.0, 4.0, None], index=index)
+    )
+    pd.testing.assert_series_equal(
+        element_wise_std(s1, s2),
+        pd.Series([2**0.5, None, None], index=index),
+    )
+
+
 def test_metric_format():
     m = Metric(
         uid=MetricID(1), name="M", query="1", is_percentage=True, decimal_places=1
@@ -95,3 +264,32 @@ def test_metric_format():
         uid=MetricID(1), name="M", query="1", use_thousand_sep=True, decimal_places=0
     )
     assert m2.format(1234.56) == "1,235"
+
+
+@pytest.mark.parametrize("decimal_places", [0, 2, 6])
+@pytest.mark.parametrize("use_thousand_sep", [True, False])
+@pytest.mark.parametrize("is_percentage", [True, False])
+def test_format_values_matches_format(decimal_places, use_thousand_sep, is_percentage):
+    m = Metric(
+        uid=MetricID(1),
+        name="M",
+        query="1",
+        data_source_ids=[],
+        use_thousand_sep=use_thousand_sep,
+        is_percentage=is_percentage,
+        decimal_places=decimal_places,
+    )
+
+    rng = np.random.default_rng(0)
+    values = np.concatenate([
+        rng.normal(size=200) * 10.0 ** rng.integers(-4, 22, 200),
+        [np.nan, np.inf, -np.inf, 0.0, -0.0, -0.001, 0.125, 999.9999, 1e18],
+    ])
+
+    formatted = m.format_values(pd.Series(values))
+
+    for value, result in zip(values, formatted):
+        if np.isnan(value):
+            assert np.isnan(result)
+        else:
+            assert result == m.format(value)
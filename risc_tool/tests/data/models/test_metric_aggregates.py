@@ -0,0 +1,249 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from risc_tool.data.models.metric import DollarBadRate, Metric, UnitBadRate, Volume
+from risc_tool.data.models.metric_aggregates import (
+    MetricDecomposition,
+    SegmentAggregates,
+)
+from risc_tool.data.models.types import DataSourceID, MetricID
+
+
+@pytest.fixture
+def sample_data():
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        "bad": rng.integers(0, 2, 200),
+        "bal": rng.random(200) * 100,
+        "score x": rng.random(200),
+    }).convert_dtypes()
+    data.loc[::7, "bal"] = pd.NA
+
+    return data
+
+
+@pytest.fixture
+def metrics(sample_data):
+    data_source_ids = [DataSourceID(0)]
+    metrics = [
+        UnitBadRate("bad", 12, data_source_ids),
+        DollarBadRate("bad", "bal", 6, data_source_ids),
+        Volume("bad", data_source_ids),
+        Metric(
+            uid=MetricID(1),
+            name="M1",
+            query="(`score x` * 2 + (`bal` > 50)).mean() - `bal`.count() / 3",
+            data_source_ids=data_source_ids,
+        ),
+    ]
+
+    for metric in metrics:
+        metric.validate_query(sample_data)
+
+    return metrics
+
+
+def build_aggregates(sample_data, metrics, codes, row_mask):
+    aggregates = SegmentAggregates(codes=codes, n_segments=4, row_mask=row_mask)
+
+    for metric in metrics:
+        decomposition = MetricDecomposition(metric)
+        aggregates.add_terms(
+            decomposition.terms, decomposition.evaluate_receivers(sample_data)
+        )
+
+    return aggregates
+
+
+def assert_matches_calculate(sample_data, metrics, aggregates, codes, row_mask):
+    for metric in metrics:
+        decomposition = MetricDecomposition(metric)
+        expected = [
+            metric.calculate(sample_data[row_mask & (codes == segment)])
+            for segment in range(4)
+        ]
+
+        np.testing.assert_allclose(aggregates.evaluate(decomposition), expected)
+        assert aggregates.evaluate_total(decomposition) == pytest.approx(
+            metric.calculate(sample_data[row_mask])
+        )
+
+
+def test_decomposition_terms(metrics):
+    decomposition = MetricDecomposition(metrics[0])
+    assert decomposition.is_decomposable
+    assert decomposition.terms == [("`bad`", "sum"), ("`bad`", "count")]
+
+    decomposition = MetricDecomposition(metrics[2])
+    assert decomposition.terms == [("", "size")]
+
+
+def test_non_decomposable_metrics(sample_data):
+    for query in ["`bal`.quantile(0.5)", "(`bal` - `bal`.mean()).sum()"]:
+        metric = Metric(
+            uid=MetricID(1), name="M1", query=query, data_source_ids=[DataSourceID(0)]
+        )
+        metric.validate_query(sample_data)
+
+        assert not MetricDecomposition(metric).is_decomposable
+
+
+def test_missing_query_is_decomposable():
+    metric = Metric(
+        uid=MetricID(1),
+        name="M1",
+        query="__MISSING__",
+        data_source_ids=[DataSourceID(0)],
+    )
+
+    aggregates = SegmentAggregates(
+        codes=np.array([0, 1]), n_segments=2, row_mask=np.array([True, True])
+    )
+
+    assert np.isnan(aggregates.evaluate(MetricDecomposition(metric))).all()
+
+
+def test_aggregates_match_calculate(sample_data, metrics):
+    rng = np.random.default_rng(1)
+    codes = rng.integers(-1, 4, len(sample_data))
+    row_mask = rng.random(len(sample_data)) > 0.2
+
+    aggregates = build_aggregates(sample_data, metrics, codes, row_mask)
+
+    assert_matches_calculate(sample_data, metrics, aggregates, codes, row_mask)
+
+
+def test_move_rows(sample_data, metrics):
+    rng = np.random.default_rng(2)
+    codes = rng.integers(-1, 4, len(sample_data))
+    row_mask = rng.random(len(sample_data)) > 0.2
+
+    aggregates = build_aggregates(sample_data, metrics, codes, row_mask)
+
+    positions = np.arange(50, 120)
+    new_codes = codes.copy()
+    new_codes[positions] = rng.integers(-1, 4, len(positions))
+
+    aggregates.move_rows(positions, new_codes[positions])
+
+    assert_matches_calculate(sample_data, metrics, aggregates, new_codes, row_mask)
+
+
+def test_weighted_aggregates(sample_data, metrics):
+    rng = np.random.default_rng(3)
+    codes = rng.integers(-1, 4, len(sample_data))
+    row_mask = rng.random(len(sample_data)) > 0.2
+    weights = rng.integers(0, 4, len(sample_data))
+
+    weighted = SegmentAggregates(
+        codes=codes, n_segments=4, row_mask=row_mask, weights=weights
+    )
+
+    # Integer weights are equivalent to repeating the rows.
+    repeats = np.repeat(np.arange(len(sample_data)), weights)
+    repeated_data = sample_data.iloc[repeats].reset_index(drop=True)
+    repeated = build_aggregates(
+        repeated_data, metrics, codes[repeats], row_mask[repeats]
+    )
+
+    for metric in metrics:
+        decomposition = MetricDecomposition(metric)
+        weighted.add_terms(
+            decomposition.terms, decomposition.evaluate_receivers(sample_data)
+        )
+
+        np.testing.assert_allclose(
+            weighted.evaluate(decomposition), repeated.evaluate(decomposition)
+        )
+        np.testing.assert_allclose(
+            weighted.evaluate_total(decomposition),
+            repeated.evaluate_total(decomposition),
+        )
+
+
+def test_approximate_quantiles(sample_data):
+    exact = Metric(
+        uid=MetricID(1),
+        name="M1",
+        query="`bal`.median() + `bal`.quantile(0.9)",
+        data_source_ids=[DataSourceID(0)],
+    )
+    exact.validate_query(sample_data)
+
+    approximate = exact.duplicate(uid=MetricID(2), name="M2")
+    approximate.approximate = True
+
+    assert not MetricDecomposition(exact).is_decomposable
+    assert exact.rank_error is None
+    assert approximate.rank_error is not None
+    assert approximate.pretty_name == approximate.name
+
+    # Rows evaluated together use exact quantiles.
+    assert approximate.calculate(sample_data) == exact.calculate(sample_data)
+
+    decomposition = MetricDecomposition(approximate)
+    assert decomposition.terms == [("`bal`", "sketch")]
+
+    rng = np.random.default_rng(3)
+    codes = rng.integers(-1, 4, len(sample_data))
+    row_mask = rng.random(len(sample_data)) > 0.2
+
+    aggregates = build_aggregates(sample_data, [approximate], codes, row_mask)
+
+    positions = np.arange(50, 120)
+    new_codes = codes.copy()
+    new_codes[positions] = rng.integers(-1, 4, len(positions))
+    aggregates.move_rows(positions, new_codes[positions])
+
+    # Fewer values than the sketch holds, so the quantiles are exact (without
+    # interpolation between values).
+    expected = []
+    for segment in range(4):
+        bal = sample_data.loc[row_mask & (new_codes == segment), "bal"].dropna()
+        expected.append(
+            np.quantile(bal, 0.5, method="inverted_cdf")
+            + np.quantile(bal, 0.9, method="inverted_cdf")
+        )
+
+    np.testing.assert_allclose(aggregates.evaluate(decomposition), expected)
+
+
+def test_bootstrap_intervals():
+    rng = np.random.default_rng(1)
+    n_rows = 100_000
+    codes = rng.choice(3, n_rows, p=[0.9, 0.099, 0.001])
+    data = pd.DataFrame({"bad": (rng.random(n_rows) < 0.1).astype(int)})
+
+    metric = UnitBadRate("bad", 12, [DataSourceID(0)])
+    metric.validate_query(data)
+    decomposition = MetricDecomposition(metric)
+
+    aggregates = SegmentAggregates(
+        codes=codes, n_segments=3, row_mask=np.ones(n_rows, dtype=bool)
+    )
+    aggregates.add_terms(decomposition.terms, decomposition.evaluate_receivers(data))
+
+    lower, upper = aggregates.bootstrap_intervals(decomposition)
+    estimate = np.append(
+        aggregates.evaluate(decomposition), aggregates.evaluate_total(decomposition)
+    )
+
+    assert lower.shape == upper.shape == (4,)
+    assert np.all((lower <= estimate) & (estimate <= upper))
+
+    # Thin segments get wider intervals.
+    assert np.all(np.diff((upper - lower)[:3]) > 0)
+
+    # Close to the normal approximation of a proportion where segments are large.
+    counts = np.append(np.bincount(codes, minlength=3), n_rows)
+    rate = estimate / 100
+    half_width = 1.96 * np.sqrt(rate * (1 - rate) / counts) * 100
+    np.testing.assert_allclose(
+        (upper - lower)[[0, 3]] / 2, half_width[[0, 3]], rtol=0.15
+    )
+
+    # Deterministic for a given seed.
+    np.testing.assert_array_equal(
+        aggregates.bootstrap_intervals(decomposition)[0], lower
+    )
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from risc_tool.data.models.enums import RowIndex
+from risc_tool.data.models.metric import Metric, UnitBadRate, Volume
+from risc_tool.data.models.metric_aggregates import MetricDecomposition
+from risc_tool.data.models.metric_cube import (
+    MISSING_LEVEL,
+    MetricCube,
+    with_missing_level,
+)
+from risc_tool.data.models.types import DataSourceID, MetricID
+
+
+@pytest.fixture
+def sample_data():
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        "bad": rng.integers(0, 2, 500),
+        "bal": rng.random(500) * 100,
+        "product": rng.choice(["card", "loan", None], 500),
+        "channel": rng.choice(["branch", "online"], 500),
+        "segment": pd.Categorical(rng.integers(0, 3, 500), categories=[0, 1, 2, 3]),
+    }).convert_dtypes()
+
+    return data
+
+
+@pytest.fixture
+def metrics(sample_data):
+    data_source_ids = [DataSourceID(0)]
+    metrics = [
+        UnitBadRate("bad", 12, data_source_ids),
+        Volume("bad", data_source_ids),
+        Metric(
+            uid=MetricID(1),
+            name="M1",
+            query="`bal`.mean() * 2 - `bad`.sum()",
+            data_source_ids=data_source_ids,
+        ),
+    ]
+
+    for metric in metrics:
+        metric.validate_query(sample_data)
+
+    return metrics
+
+
+@pytest.fixture
+def cube(sample_data, metrics):
+    row_mask = np.random.default_rng(1).random(len(sample_data)) > 0.2
+
+    cube = MetricCube(
+        dimensions=[
+            sample_data["segment"],
+            sample_data["product"],
+            sample_data["channel"],
+        ],
+        row_mask=row_mask,
+    )
+
+    for metric in metrics:
+        decomposition = MetricDecomposition(metric)
+        cube.add_terms(
+            decomposition.terms, decomposition.evaluate_receivers(sample_data)
+        )
+
+    return cube, row_mask
+
+
+def test_levels(cube):
+    cube, _ = cube
+
+    assert cube.dimensions == ["segment", "product", "channel"]
+    assert cube.shape == (4, 3, 2)
+    assert list(cube.levels[0]) == [0, 1, 2, 3]
+    assert list(cube.levels[1]) == ["card", "loan", MISSING_LEVEL]
+
+
+@pytest.mark.parametrize(
+    "dimensions",
+    [["segment"], ["channel", "segment"], ["product", "channel"], []],
+)
+def test_rollup_matches_groupby(sample_data, metrics, cube, dimensions):
+    cube, row_mask = cube
+    data = sample_data[row_mask].fillna({"product": MISSING_LEVEL})
+
+    for metric in metrics:
+        rollup = cube.rollup(MetricDecomposition(metric), dimensions)
+
+        if dimensions:
+            expected = data.groupby(dimensions, observed=True).apply(
+                metric.calculate, include_groups=False
+            )
+        else:
+            expected = pd.Series([metric.calculate(data)], index=[RowIndex.TOTAL])
+
+        # Empty cells are only in the cube.
+        expected = expected.reindex(rollup.index).astype("float64")
+        observed = expected.notna().to_numpy()
+        np.testing.assert_allclose(
+            rollup.to_numpy()[observed], expected.to_numpy()[observed]
+        )
+
+
+def test_pivot(metrics, cube):
+    cube, _ = cube
+    decomposition = MetricDecomposition(metrics[1])
+
+    table = cube.pivot(decomposition, ["segment"], ["channel"])
+    assert table.shape == (4, 2)
+    assert table.loc[3].sum() == 0
+
+    # Swapping the axes transposes the table.
+    pd.testing.assert_frame_equal(
+        cube.pivot(decomposition, ["channel"], ["segment"]), table.T
+    )
+
+    total = cube.pivot(decomposition, [], ["product"])
+    assert list(total.index) == [RowIndex.TOTAL]
+    assert total.to_numpy().sum() == table.to_numpy().sum()
+
+
+def test_with_missing_level(sample_data, metrics, cube):
+    cube, row_mask = cube
+    data = sample_data[row_mask]
+    decomposition = MetricDecomposition(metrics[2])
+
+    dimensions = [
+        with_missing_level(sample_data[dimension])
+        for dimension in ("segment", "product")
+    ]
+    assert list(dimensions[1].cat.categories) == list(cube.levels[1])
+
+    # Grouping by the dimensions gives the cells of the cube, empty ones included.
+    grouped = data.groupby(
+        [dimension[row_mask] for dimension in dimensions], observed=False
+    ).size()
+    rollup = cube.rollup(decomposition, ["segment", "product"])
+    assert list(grouped.index) == list(rollup.index)
+    assert rollup[grouped.to_numpy() == 0].isna().all()
+
+
+def test_invalid_dimensions(metrics, cube):
+    cube, _ = cube
+    decomposition = MetricDecomposition(metrics[0])
+
+    with pytest.raises(ValueError, match="not part of the cube"):
+        cube.rollup(decomposition, ["region"])
+
+    with pytest.raises(ValueError, match="more than once"):
+        cube.pivot(decomposition, ["segment"], ["segment"])
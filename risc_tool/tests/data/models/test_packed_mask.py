@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from risc_tool.data.models.packed_mask import PackedMask
+
+
+@pytest.fixture
+def masks():
+    rng = np.random.default_rng(0)
+    index = pd.RangeIndex(1003)
+
+    left = pd.Series(rng.random(len(index)) > 0.5, index=index).astype("boolean")
+    left[rng.random(len(index)) > 0.9] = pd.NA
+
+    right = pd.Series(rng.random(len(index)) > 0.3, index=index).astype("boolean")
+    right[rng.random(len(index)) > 0.8] = pd.NA
+
+    return left, right
+
+
+def test_round_trip(masks):
+    left, _ = masks
+    packed = PackedMask.from_series(left)
+
+    assert len(packed) == len(left)
+    assert packed.nbytes == 2 * 126
+    pd.testing.assert_series_equal(packed.to_series(), left)
+
+    plain = left.fillna(False).astype(bool)
+    packed = PackedMask.from_series(plain)
+    assert not packed.has_na
+    pd.testing.assert_series_equal(packed.to_series(), plain)
+
+
+@pytest.mark.parametrize("op", ["and", "or", "invert"])
+def test_logic_matches_pandas(masks, op):
+    left, right = masks
+    packed_left = PackedMask.from_series(left)
+    packed_right = PackedMask.from_series(right)
+
+    match op:
+        case "and":
+            expected, packed = left & right, packed_left & packed_right
+        case "or":
+            expected, packed = left | right, packed_left | packed_right
+        case _:
+            expected, packed = ~left, ~packed_left
+
+    pd.testing.assert_series_equal(packed.to_series(), expected)
+    assert packed.count() == expected.sum()
+    assert packed.count_na() == expected.isna().sum()
+
+
+def test_invert_keeps_padding_clear():
+    packed = ~PackedMask.full(pd.RangeIndex(10), value=False)
+
+    assert packed.count() == 10
+    assert (~packed).count() == 0
+
+
+def test_length_mismatch():
+    with pytest.raises(ValueError, match="Length Mismatch"):
+        PackedMask.full(pd.RangeIndex(10)) & PackedMask.full(pd.RangeIndex(11))
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from risc_tool.data.models.quantile_sketch import KLLSketch
+
+
+@pytest.fixture
+def values():
+    return np.random.default_rng(0).lognormal(3, 1, 100_000)
+
+
+def rank_error(values, q, estimate):
+    return abs(np.mean(values <= estimate) - q)
+
+
+def test_quantiles_within_rank_error(values):
+    sketch = KLLSketch()
+    sketch.update(values)
+
+    assert sketch.n == len(values)
+    assert sum(len(level) for level in sketch.levels) < 4 * sketch.k
+
+    for q in [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]:
+        estimate = sketch.quantile(q)
+        assert rank_error(values, q, estimate) <= KLLSketch.normalized_rank_error()
+
+    assert sketch.quantile(0) == values.min()
+    assert sketch.quantile(1) == values.max()
+
+
+def test_merge(values):
+    sketches = []
+    for part in np.array_split(values, 7):
+        sketch = KLLSketch()
+        sketch.update(part)
+        sketches.append(sketch)
+
+    merged = KLLSketch.merge_all(sketches)
+
+    assert merged.n == len(values)
+    assert merged.min == values.min()
+    assert merged.max == values.max()
+    assert rank_error(values, 0.5, merged.quantile(0.5)) <= (
+        KLLSketch.normalized_rank_error()
+    )
+
+
+def test_missing_values():
+    sketch = KLLSketch()
+    assert np.isnan(sketch.quantile(0.5))
+
+    sketch.update(np.array([np.nan, 1.0, np.nan, 3.0, 2.0]))
+
+    assert sketch.n == 3
+    assert sketch.quantile(0.5) == 2.0
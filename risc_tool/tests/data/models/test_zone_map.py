@@ -0,0 +1,112 @@
+import ast
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from risc_tool.data.models.filter import Filter
+from risc_tool.data.models.filter_kernel import parse_expression
+from risc_tool.data.models.filter_plan import compile_plan
+from risc_tool.data.models.types import FilterID
+from risc_tool.data.models.zone_map import ZoneMap, compile_zone_predicate
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    n_rows = 10_000
+
+    x = pd.Series(np.sort(rng.integers(0, 1000, n_rows)), dtype="Int64")
+    x[8_000:8_010] = pd.NA
+
+    return pd.DataFrame({
+        "x": x,
+        "y": rng.normal(size=n_rows),
+        "z": rng.choice(["a", "b"], n_rows),
+    })
+
+
+def test_block_statistics():
+    column = pd.Series([3.0, 1.0, np.nan, 7.0, np.nan, np.nan, 5.0])
+    zone_map = ZoneMap(column, block_size=3)
+
+    assert zone_map.n_blocks == 3
+    assert zone_map.minimum.tolist() == [1.0, 7.0, 5.0]
+    assert zone_map.maximum.tolist() == [3.0, 7.0, 5.0]
+    assert zone_map.null_count.tolist() == [1, 2, 0]
+
+    all_true, all_false = ZoneMap(column.fillna(4.0), block_size=3).compare(
+        ast.Gt(), 2.0
+    )
+    assert all_true.tolist() == [False, True, True]
+    assert all_false.tolist() == [False, False, False]
+
+
+def test_compile_zone_predicate():
+    node = parse_expression("~(1 < x < 5) | (y == 2)")
+    compiled = compile_zone_predicate(node, {})
+
+    assert compiled is not None
+    assert compiled[1] == frozenset({"x", "y"})
+
+    node = parse_expression("(x > 1) & (z == 'a')")
+    assert compile_zone_predicate(node, {}) is None
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "x > 500",
+        "x <= 10 or x >= 990",
+        "~((x > 900) & (x != 950))",
+        "(100 < x < 200) & (z == 'a')",
+        "(x > 300) & (y > 0)",
+        "x == 0",
+    ],
+)
+def test_zone_maps_match_eval(data, query):
+    zone_maps = {"x": ZoneMap(data["x"], block_size=512)}
+    plan = compile_plan(query, {})
+    assert plan is not None
+
+    expected = data.eval(query)
+    result = plan.evaluate(data, zone_maps=zone_maps)
+
+    pd.testing.assert_series_equal(
+        result.astype("boolean"), expected.astype("boolean"), check_names=False
+    )
+
+
+def test_zone_maps_skip_decided_blocks(data, monkeypatch):
+    zone_maps = {"x": ZoneMap(data["x"], block_size=512)}
+    plan = compile_plan("x > 500", {})
+    assert plan is not None
+
+    conjunct = plan.conjuncts[0]
+    evaluated_rows: list[int] = []
+    kernel_evaluate = conjunct.kernel.evaluate
+
+    def evaluate(df):
+        evaluated_rows.append(len(df))
+        return kernel_evaluate(df)
+
+    monkeypatch.setattr(conjunct.kernel, "evaluate", evaluate)
+
+    # Only the block around 500 and the block with missing values are read
+    conjunct.evaluate(data, zone_maps=zone_maps)
+    assert evaluated_rows == [2 * 512]
+
+    # Zone maps of other data are ignored
+    conjunct.evaluate(data.iloc[:100], zone_maps=zone_maps)
+    assert evaluated_rows == [2 * 512, 100]
+
+
+def test_filter_with_zone_maps(data):
+    zone_maps = {"x": ZoneMap(data["x"], block_size=512)}
+
+    f = Filter(uid=FilterID(1), name="Test", query="`x` >= 250 & `x` < 750")
+    f.validate_query(available_columns=data.columns.tolist())
+    f.create_mask(data, zone_maps=zone_maps)
+
+    assert f.mask is not None
+    assert f.mask.count() == ((data["x"] >= 250) & (data["x"] < 750)).sum()
@@ -0,0 +1,150 @@
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from risc_tool.data.models.enums import VariableType
+from risc_tool.data.session import Session
+
+
+@pytest.fixture
+def session(tmp_path: pathlib.Path):
+    rng = np.random.default_rng(0)
+    session = Session()
+
+    for i in range(2):
+        path = tmp_path / f"source_{i}.csv"
+        pd.DataFrame({
+            "bad": rng.integers(0, 2, 1000),
+            "bal": rng.random(1000) * 1000,
+            "w": rng.integers(1, 5, 1000),
+            "prod": rng.choice(["a", "b"], 1000),
+        }).to_csv(path, index=False)
+
+        session.data_repository.add_data_source(
+            path, f"source_{i}", sample_row_count=100
+        )
+
+    session.metric_repository.var_weight = "w"
+
+    return session
+
+
+def test_weighted_metric_references(session):
+    metric_repository = session.metric_repository
+    data_source_ids = list(session.data_repository.data_sources)
+
+    for name, query, is_percentage in [
+        ("Balance", "`bal`.sum()", False),
+        ("Accounts", "`bal`.count()", False),
+        ("Average Balance", "metric('Balance') / metric('Accounts')", False),
+        ("Bad Rate", "`bad`.mean()", True),
+        ("Double Bad Rate", "metric('Bad Rate') * 2", False),
+    ]:
+        metric_repository.create_metric(
+            name, query, True, is_percentage, 2, data_source_ids
+        )
+
+    metrics = {metric.name: metric for metric in metric_repository.metrics.values()}
+
+    # Only the formulas are asked for; the metrics they reference are weighted too.
+    summary = session.data_repository.get_summarized_metrics(
+        groupby_variables=[
+            session.data_repository.load_column(
+                "prod", column_type=VariableType.CATEGORICAL
+            )
+        ],
+        metrics=[metrics["Average Balance"], metrics["Double Bad Rate"]],
+        weights=metric_repository.load_weights(),
+    )
+
+    data = session.data_repository.load_columns(["bad", "bal", "w", "prod"])
+    weighted = (
+        data
+        .assign(bad=data["bad"] * data["w"], bal=data["bal"] * data["w"])
+        .groupby("prod")[["bad", "bal", "w"]]
+        .sum()
+    )
+
+    np.testing.assert_allclose(
+        summary["Average Balance"], weighted["bal"] / weighted["w"]
+    )
+    np.testing.assert_allclose(
+        summary["Double Bad Rate"], weighted["bad"] / weighted["w"] * 2
+    )
+
+    for metric in metrics.values():
+        assert metric_repository.weighting_warning(metric) is None
+
+
+def test_weighting_warning(session):
+    metric_repository = session.metric_repository
+    data_source_ids = list(session.data_repository.data_sources)
+
+    for name, query in [
+        ("Median Balance", "`bal`.median()"),
+        ("Weighted Balance", "(`bal` * `w`).sum() / `w`.sum()"),
+        ("Scaled Balance", "metric('Weighted Balance') / 1000"),
+    ]:
+        metric_repository.create_metric(name, query, True, False, 2, data_source_ids)
+
+    warnings = {
+        metric.name: metric_repository.weighting_warning(metric)
+        for metric in metric_repository.metrics.values()
+    }
+
+    assert warnings["Median Balance"].startswith("Not weighted")
+    assert "weight column `w`" in warnings["Weighted Balance"]
+    assert "weight column `w`" in warnings["Scaled Balance"]
+
+    metric_repository.var_weight = None
+    assert (
+        metric_repository.weighting_warning(
+            next(iter(metric_repository.metrics.values()))
+        )
+        is None
+    )
+
+
+def test_grouped_metrics_in_process_pool(session):
+    data_repository = session.data_repository
+    metric_repository = session.metric_repository
+    data_source_ids = list(data_repository.data_sources)
+
+    # Non-decomposable metrics, on nullable and string columns, and a formula
+    for name, query in [
+        ("Balance Spread", "`bal`.std()"),
+        ("Median Balance", "`bal`.median()"),
+        ("Products", "`prod`.nunique()"),
+        ("Largest Weight", "`w`.max()"),
+        ("Spread per Weight", "metric('Balance Spread') / metric('Largest Weight')"),
+    ]:
+        metric_repository.create_metric(name, query, True, False, 2, data_source_ids)
+
+    metrics = list(metric_repository.metrics.values())
+
+    prod = data_repository.load_column("prod", column_type=VariableType.CATEGORICAL)
+    prod = prod.cat.add_categories(["c"])
+    bad = data_repository.load_column("bad", column_type=VariableType.CATEGORICAL)
+    data_filter = data_repository.load_column("bal") > 100
+
+    def summarize(groupby_variables: list[pd.Series]) -> pd.DataFrame:
+        return data_repository.get_summarized_metrics(
+            groupby_variables=groupby_variables,
+            data_filter=data_filter,
+            metrics=metrics,
+            errors_as_nan=True,
+        )
+
+    data_repository.max_workers = 1
+    expected = [summarize([prod]), summarize([prod, bad])]
+
+    # Like groupby.apply, only a single grouping variable evaluates empty groups
+    assert expected[0].loc["c", "Products"] == 0
+    assert expected[1].loc["c"].isna().all().all()
+
+    data_repository.max_workers = 2
+    data_repository.parallel_min_rows = 0
+    pd.testing.assert_frame_equal(summarize([prod]), expected[0])
+    pd.testing.assert_frame_equal(summarize([prod, bad]), expected[1])
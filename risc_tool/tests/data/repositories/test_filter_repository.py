@@ -0,0 +1,89 @@
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from risc_tool.data.session import Session
+
+
+def write_source(path: pathlib.Path, n_rows: int, seed: int) -> pathlib.Path:
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "bal": rng.random(n_rows) * 1000,
+        "prod": rng.choice(["a", "b", None], n_rows),
+    }).to_csv(path, index=False)
+
+    return path
+
+
+@pytest.fixture
+def session(tmp_path: pathlib.Path):
+    session = Session()
+
+    for i in range(2):
+        session.data_repository.add_data_source(
+            write_source(tmp_path / f"source_{i}.csv", 3000, seed=i),
+            f"source_{i}",
+            sample_row_count=100,
+        )
+
+    return session
+
+
+def assert_mask_matches_eval(session: Session, queries: dict[int, str]):
+    data = session.data_repository.load_columns(["bal", "prod"])
+    filter_repository = session.filter_repository
+
+    for filter_ids in ([], *([filter_id] for filter_id in queries), list(queries)):
+        expected = pd.Series(True, index=data.index)
+        for filter_id in filter_ids:
+            expected &= data.eval(queries[filter_id]).fillna(False).astype(bool)
+
+        mask = filter_repository.get_mask(filter_ids)
+
+        assert mask.index.equals(data.index)
+        np.testing.assert_array_equal(
+            mask.to_numpy(dtype=bool), expected.to_numpy(), err_msg=str(filter_ids)
+        )
+
+
+def test_mask_cache_matches_eval(session, tmp_path: pathlib.Path):
+    filter_repository = session.filter_repository
+
+    for name, query in [
+        ("Balance", "`bal` > 300"),
+        ("Product", "`prod` == 'a'"),
+        ("Above Average", "`bal` > `bal`.mean()"),
+    ]:
+        filter_repository.create_filter(name, query)
+
+    queries = {
+        filter_id: filter_obj.query
+        for filter_id, filter_obj in filter_repository.filters.items()
+    }
+    balance_id, product_id, _ = queries
+
+    assert_mask_matches_eval(session, queries)
+
+    # Combined masks that contain a modified or removed filter are not reused.
+    filter_repository.modify_filter(product_id, "Product", "`prod` == 'b'")
+    queries[product_id] = "`prod` == 'b'"
+    assert_mask_matches_eval(session, queries)
+
+    filter_repository.remove_filter(balance_id)
+    del queries[balance_id]
+    assert_mask_matches_eval(session, queries)
+    assert filter_repository.get_mask([balance_id]).all()
+
+    # New rows for one data source; the aggregate filter changes on all of them.
+    data_source_id = next(iter(session.data_repository.data_sources))
+    session.data_repository.update_data_source(
+        data_source_id,
+        filepath=write_source(tmp_path / "updated.csv", 2000, seed=7),
+    )
+    assert_mask_matches_eval(session, queries)
+
+    filter_repository.create_filter("Balance", "`bal` > 500")
+    queries[max(filter_repository.filters)] = "`bal` > 500"
+    assert_mask_matches_eval(session, queries)
@@ -0,0 +1,137 @@
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from risc_tool.data.models.enums import LossRateTypes, VariableType
+from risc_tool.data.models.metric_cube import MISSING_LEVEL
+from risc_tool.data.models.types import MetricID
+from risc_tool.data.session import Session
+
+
+def create_session(path: pathlib.Path) -> Session:
+    rng = np.random.default_rng(0)
+    session = Session()
+
+    for i in range(2):
+        path.mkdir(exist_ok=True)
+        csv_path = path / f"source_{i}.csv"
+        pd.DataFrame({
+            "score": rng.normal(600, 50, 2000).round(),
+            "bad": rng.integers(0, 2, 2000),
+            "bal": rng.random(2000) * 1000,
+            "prod": rng.choice(["a", "b", None], 2000),
+        }).to_csv(csv_path, index=False)
+
+        session.data_repository.add_data_source(
+            csv_path, f"source_{i}", sample_row_count=100
+        )
+
+    metric_repository = session.metric_repository
+    metric_repository.data_source_ids = list(session.data_repository.data_sources)
+    metric_repository.var_unt_bad = "bad"
+    metric_repository.var_dlr_bad = "bad"
+    metric_repository.var_avg_bal = "bal"
+
+    return session
+
+
+def add_iteration(session: Session):
+    return session.iterations_repository.add_single_var_iteration(
+        name="Score",
+        variable_name="score",
+        variable_dtype=VariableType.NUMERICAL,
+        selected_segments_mask=pd.Series(
+            True, index=session.options_repository.risk_segment_details.index
+        ),
+        loss_rate_type=LossRateTypes.ULR,
+        filter_ids=[],
+        auto_band=False,
+        use_scalar=False,
+        remove_outliers=False,
+    )
+
+
+@pytest.fixture
+def session(tmp_path: pathlib.Path):
+    return create_session(tmp_path)
+
+
+@pytest.fixture
+def iteration(session):
+    return add_iteration(session)
+
+
+def test_pivot_level_order(session, iteration):
+    data_source_ids = list(session.data_repository.data_sources)
+    session.metric_repository.create_metric(
+        "Max Balance", "`bal`.max()", True, False, 2, data_source_ids
+    )
+    max_balance_id = max(session.metric_repository.metrics)
+
+    # Volume is rolled up from the cube, the maximum is grouped.
+    pivot_df, _, _ = session.iterations_repository.get_pivot_table(
+        iteration_id=iteration.uid,
+        default=False,
+        metric_ids=[MetricID.VOLUME, max_balance_id],
+        dimensions=["prod"],
+        rows=["prod"],
+        columns=["Risk Segment"],
+        filter_ids=[],
+        remove_outliers=False,
+    )
+
+    assert list(pivot_df.index) == ["a", "b", MISSING_LEVEL]
+
+    all_metrics = session.metric_repository.get_all_metrics()
+    volume_columns, max_balance_columns = (
+        list(pivot_df[all_metrics[metric_id].pretty_name].columns)
+        for metric_id in (MetricID.VOLUME, max_balance_id)
+    )
+    assert volume_columns == max_balance_columns
+
+
+def test_band_edge_update_matches_recompute(tmp_path: pathlib.Path):
+    def metric_range(session: Session, iteration) -> pd.DataFrame:
+        filter_ids = list(session.filter_repository.filters)
+        metric_range, _, _ = session.iterations_repository.get_metric_range(
+            iteration_id=iteration.uid,
+            default=False,
+            filter_ids=filter_ids,
+            metric_ids=[MetricID.VOLUME, MetricID.UNT_BAD_RATE, MetricID.DLR_BAD_RATE],
+            scalars_enabled=False,
+            remove_outliers=False,
+            show_total_row=True,
+        )
+
+        return metric_range
+
+    def move_edges(session: Session, iteration) -> None:
+        repository = session.iterations_repository
+        controls = repository.get_controls(iteration.uid, default=False)
+
+        # Moves the first edge up, the sixth one down and empties the last group.
+        controls.iloc[0, 1] = controls.iloc[1, 0] = controls.iloc[1, 0] + 7
+        controls.iloc[4, 1] = controls.iloc[5, 0] = controls.iloc[5, 0] - 5
+        controls.iloc[9, 0] = controls.iloc[9, 1]
+
+        repository.set_controls(iteration.uid, controls)
+
+    incremental = create_session(tmp_path / "incremental")
+    incremental.filter_repository.create_filter("Balance", "`bal` > 100")
+    incremental_iteration = add_iteration(incremental)
+
+    # Builds the segment aggregates, which the edit then patches.
+    metric_range(incremental, incremental_iteration)
+    move_edges(incremental, incremental_iteration)
+
+    fresh = create_session(tmp_path / "fresh")
+    fresh.filter_repository.create_filter("Balance", "`bal` > 100")
+    fresh_iteration = add_iteration(fresh)
+    move_edges(fresh, fresh_iteration)
+
+    pd.testing.assert_frame_equal(
+        metric_range(incremental, incremental_iteration),
+        metric_range(fresh, fresh_iteration),
+    )
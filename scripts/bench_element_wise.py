@@ -0,0 +1,102 @@
+"""
+Micro-benchmark of the element-wise metric functions.
+
+Compares the previous implementation (`pd.concat(..., axis=1)` and scalar
+broadcasting through `pd.Series([arg] * n)`) with the NumPy implementation in
+`risc_tool.data.models.metric`. For every call it reports the time and the peak
+memory traced by `tracemalloc`, also expressed as the number of float64 column
+buffers (rows * 8 bytes) alive at the peak.
+
+Usage: uv run python scripts/bench_element_wise.py [rows] [repeats]
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from risc_tool.data.models.metric import (
+    element_wise_max,
+    element_wise_mean,
+    element_wise_median,
+    element_wise_min,
+    element_wise_std,
+    element_wise_sum,
+)
+
+
+def _concat_args(*args):
+    series_len = len(next(arg for arg in args if isinstance(arg, pd.Series)))
+    return pd.concat(
+        [
+            arg if isinstance(arg, pd.Series) else pd.Series([arg] * series_len)
+            for arg in args
+        ],
+        axis=1,
+    )
+
+
+LEGACY = {
+    "sum": lambda *args: _concat_args(*args).sum(axis=1),
+    "mean": lambda *args: _concat_args(*args).mean(axis=1),
+    "median": lambda *args: _concat_args(*args).median(axis=1),
+    "min": lambda *args: _concat_args(*args).min(axis=1),
+    "max": lambda *args: _concat_args(*args).max(axis=1),
+    "std": lambda *args: _concat_args(*args).std(axis=1),
+}
+
+NUMPY = {
+    "sum": element_wise_sum,
+    "mean": element_wise_mean,
+    "median": element_wise_median,
+    "min": element_wise_min,
+    "max": element_wise_max,
+    "std": element_wise_std,
+}
+
+
+def measure(function, args, repeats):
+    function(*args)  # warm-up
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(*args)
+    elapsed = (time.perf_counter() - start) / repeats
+
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    rng = np.random.default_rng(0)
+    bal = pd.Series(rng.random(rows) * 1000).astype("Float64")
+    bal[::11] = pd.NA
+    dlr = pd.Series(rng.random(rows) * 100)
+    args = (bal, dlr, 0)
+
+    print(f"rows={rows:,} repeats={repeats} args=(Float64 series, float series, 0)")
+    print(
+        f"{'function':<8} {'impl':<7} {'time (ms)':>10} "
+        f"{'peak (MiB)':>11} {'columns':>8}"
+    )
+
+    for name in NUMPY:
+        for impl, functions in (("concat", LEGACY), ("numpy", NUMPY)):
+            elapsed, peak = measure(functions[name], args, repeats)
+            print(
+                f"{name:<8} {impl:<7} {elapsed * 1000:>10.1f} "
+                f"{peak / 2**20:>11.1f} {peak / (rows * 8):>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()